@@ -1,34 +1,90 @@
+import atexit
 import os
 import sys
+import threading
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from flask import Flask, request, jsonify, render_template, session
+from flask import Flask, request, jsonify, render_template, session, g, Response
 from funciones.sistema_mesas import SistemaMesas
 from funciones.sistema_pedidos_clientes import SistemaPedidosClientes
 from funciones.sistema_pedidos_cocina import SistemaPedidosCocina
 from funciones.sistema_pedidos_mozos import SistemaPedidosMozos
+from funciones.sistema_reservas import SistemaReservas, DURACION_POR_DEFECTO
+from funciones.asignador_mesas import AsignadorMesas
+from funciones.archivo_tickets import ArchivoTickets
+from funciones.cierre_caja import cierre_caja_compartido
+from funciones.administracion_menu import AdministradorMenu
+from funciones.instrumentacion import registro_metricas
+from funciones.registro import configurar_registro, fijar_contexto, restaurar_contexto
+from funciones.perfilador import PerfiladorMuestreo, INTERVALO_POR_DEFECTO
 from flask_cors import CORS
 import json
-from datetime import datetime
+import logging
+import time
+from datetime import datetime, timedelta
 
 app = Flask(__name__)
 CORS(app)
 app.secret_key = 'definity_proyect_secret_key'  # Clave secreta para la sesión (Seguridad)
 
+configurar_registro()
+logger = logging.getLogger(__name__)
+
 # ------------------------------Inicializar sistemas------------------------------
 sistema_mesas = SistemaMesas()
-sistema_pedidos_clientes = SistemaPedidosClientes(sistema_mesas)
-sistema_pedidos_mozos = SistemaPedidosMozos(sistema_mesas)
-sistema_pedidos_cocina = SistemaPedidosCocina(sistema_mesas)
+cierre_caja = cierre_caja_compartido(sistema_mesas)
+sistema_pedidos_cocina = SistemaPedidosCocina(sistema_mesas, cierre_caja=cierre_caja)
+archivo_tickets = ArchivoTickets()
+sistema_pedidos_clientes = SistemaPedidosClientes(sistema_mesas, sistema_cocina=sistema_pedidos_cocina, archivo_tickets=archivo_tickets, cierre_caja=cierre_caja)
+sistema_pedidos_mozos = SistemaPedidosMozos(sistema_mesas, sistema_cocina=sistema_pedidos_cocina, archivo_tickets=archivo_tickets, cierre_caja=cierre_caja)
+sistema_reservas = SistemaReservas(sistema_mesas)
+asignador_mesas = AsignadorMesas(sistema_mesas)
+perfilador = PerfiladorMuestreo()
+administrador_menu = AdministradorMenu(sistema_mesas)
+
+# ------------------------------Servicios en segundo plano------------------------------
+_lock_servicios = threading.Lock()
+_servicios_iniciados = False
+
+def iniciar_servicios():
+    """Arranca los hilos de fondo (retrasos de cocina, reservas, cola de tareas) una sola vez por proceso."""
+    global _servicios_iniciados
+    with _lock_servicios:
+        if _servicios_iniciados:
+            return
+        sistema_pedidos_cocina.monitor_retrasos.iniciar()
+        sistema_reservas.iniciar()
+        # Al salir se terminan las tareas encoladas (lo que no termine queda en el diario)
+        sistema_pedidos_mozos.cola_tareas.iniciar()
+        atexit.register(sistema_pedidos_mozos.cola_tareas.detener)
+        _servicios_iniciados = True
+
+def detener_servicios():
+    """Detiene los hilos de fondo (por ejemplo, antes de borrar el directorio de datos)."""
+    global _servicios_iniciados
+    with _lock_servicios:
+        if not _servicios_iniciados:
+            return
+        sistema_pedidos_mozos.cola_tareas.detener()
+        sistema_reservas.detener()
+        sistema_pedidos_cocina.monitor_retrasos.detener()
+        _servicios_iniciados = False
+
+@app.before_request
+def iniciar_servicios_al_primer_pedido():
+    # Se arrancan en el proceso que atiende pedidos, con cualquier servidor (flask run, gunicorn,
+    # app.run). Con el recargador de Flask, el proceso que solo vigila los archivos nunca los arranca
+    if not _servicios_iniciados:
+        iniciar_servicios()
 
 # ------------------------------Rutas para vistas------------------------------
 @app.route('/')
 def index():
-    return render_template('clientes.html', mesas=sistema_mesas.obtener_mesas(), menu=sistema_mesas.mostrar_menu_completo())
+    return render_template('clientes.html', mesas=sistema_mesas.obtener_mesas(), menu=sistema_mesas.obtener_menu_disponible())
 
 @app.route('/clientes')
 def vista_clientes():
-    return render_template('clientes.html', mesas=sistema_mesas.obtener_mesas(), menu=sistema_mesas.mostrar_menu_completo())
+    return render_template('clientes.html', mesas=sistema_mesas.obtener_mesas(), menu=sistema_mesas.obtener_menu_disponible())
 
 @app.route('/cocina')
 def vista_cocina():
@@ -91,7 +147,7 @@ def acceder_mesa():
             mesa_id = int(mesa_id)
                 
         except Exception as e:
-            print(f"Error al procesar URL: {str(e)}")
+            logger.exception("Error al procesar URL: %s", e)
             return jsonify({"success": False, "error": "Error al procesar la URL del QR"}), 400
         
         # Verificar que la mesa existe
@@ -102,6 +158,10 @@ def acceder_mesa():
             
             mesa = mesa_data[0]
             
+            # Una mesa reservada se ocupa solo con la llegada de la reserva (la registra el mozo)
+            if mesa['estado'] == 'reservada':
+                return jsonify({"success": False, "error": "La mesa está reservada"}), 409
+
             # Si la mesa está libre, registrar al cliente
             if mesa['estado'] == 'libre':
                 cliente_key = sistema_mesas.registrar_cliente(str(mesa_id), nombre)
@@ -146,11 +206,11 @@ def acceder_mesa():
             })
             
         except Exception as e:
-            print(f"Error al acceder a la mesa: {str(e)}")
+            logger.exception("Error al acceder a la mesa: %s", e)
             return jsonify({"success": False, "error": "Error al acceder a la mesa"}), 500
         
     except Exception as e:
-        print(f"Error general en acceder_mesa: {str(e)}")
+        logger.exception("Error general en acceder_mesa: %s", e)
         return jsonify({"success": False, "error": "Error interno del servidor"}), 500
 
 # ------------------------------Obtiene el menú completo (Clientes)------------------------------
@@ -158,8 +218,8 @@ def acceder_mesa():
 def obtener_menu():
     """Obtiene el menú completo."""
     try:
-        menu = sistema_mesas.mostrar_menu_completo()
-        return jsonify({"success": True, "data": menu})
+        menu = sistema_mesas.obtener_menu_disponible()
+        return jsonify({"success": True, "data": menu, "version": sistema_mesas.instantanea_menu().version})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -176,7 +236,7 @@ def obtener_categorias():
 def _normalizar_categoria(categoria):
     """Normaliza el nombre de la categoría para comparación."""
     categoria_normalizada = categoria.lower().replace('/', ' ').strip()
-    print(f"Normalizando categoría: '{categoria}' -> '{categoria_normalizada}'")
+    logger.debug("Normalizando categoría: '%s' -> '%s'", categoria, categoria_normalizada)
     return categoria_normalizada
     
 # ------------------------------Obtiene los platos de una categoría específica (Clientes)------------------------------
@@ -184,34 +244,28 @@ def _normalizar_categoria(categoria):
 def obtener_platos_categoria(categoria):
     """Obtiene los platos de una categoría específica."""
     try:
-        menu = sistema_mesas.mostrar_menu_completo()
+        menu = sistema_mesas.obtener_menu_disponible()
         platos_categoria = []
         categoria_normalizada = _normalizar_categoria(categoria)
         
-        print(f"Buscando platos para categoría normalizada: '{categoria_normalizada}'")
+        logger.debug("Buscando platos para categoría normalizada: '%s'", categoria_normalizada)
         
         for item in menu:
-            plato = item['plato']
-            # Buscar en todas las etapas del menú
-            for etapa in sistema_mesas.menu['platos'].values():
-                for cat_nombre, platos in etapa.items():
-                    cat_nombre_normalizado = _normalizar_categoria(cat_nombre)
-                    print(f"Comparando con categoría del menú: '{cat_nombre}' -> '{cat_nombre_normalizado}'")
-                    if cat_nombre_normalizado == categoria_normalizada:
-                        for plato_cat in platos:
-                            if plato_cat['nombre'] == plato['nombre']:
-                                platos_categoria.append({
-                                    'id': item['index'],
-                                    'nombre': plato['nombre'],
-                                    'descripcion': plato.get('descripcion', ''),
-                                    'precio': plato['precio'],
-                                    'ingredientes': plato.get('ingredientes', []),
-                                    'dietas': plato.get('dietas', [])
-                                })
-                                break
+            # Cada entrada del menú ya trae su categoría
+            if _normalizar_categoria(item['categoria']) == categoria_normalizada:
+                plato = item['plato']
+                platos_categoria.append({
+                    'id': plato['id'],
+                    'index': item['index'],
+                    'nombre': plato['nombre'],
+                    'descripcion': plato.get('descripcion', ''),
+                    'precio': plato['precio'],
+                    'ingredientes': plato.get('ingredientes', []),
+                    'dietas': plato.get('dietas', [])
+                })
         
         if not platos_categoria:
-            print(f"No se encontraron platos para la categoría '{categoria_normalizada}'")
+            logger.debug("No se encontraron platos para la categoría '%s'", categoria_normalizada)
             return jsonify({
                 'success': False,
                 'error': f'No se encontraron platos en la categoría {categoria}'
@@ -223,7 +277,7 @@ def obtener_platos_categoria(categoria):
         })
         
     except Exception as e:
-        print(f"Error en obtener_platos_categoria: {str(e)}")
+        logger.exception("Error en obtener_platos_categoria: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -244,14 +298,15 @@ def obtener_dietas():
 def obtener_platos_dieta(dieta):
     """Obtiene los platos de una dieta específica."""
     try:
-        menu = sistema_mesas.mostrar_menu_completo()
+        menu = sistema_mesas.obtener_menu_disponible()
         platos_dieta = []
         
         for item in menu:
             plato = item['plato']
             if dieta.lower() in [d.lower() for d in plato.get('dietas', [])]:
                 platos_dieta.append({
-                    'id': item['index'],
+                    'id': plato['id'],
+                    'index': item['index'],
                     'nombre': plato['nombre'],
                     'descripcion': plato.get('descripcion', ''),
                     'precio': plato['precio'],
@@ -271,7 +326,7 @@ def obtener_platos_dieta(dieta):
         })
         
     except Exception as e:
-        print(f"Error en obtener_platos_dieta: {str(e)}")
+        logger.exception("Error en obtener_platos_dieta: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -283,9 +338,13 @@ def hacer_pedido(mesa_id, cliente_key):
     """Realiza un nuevo pedido para un cliente específico."""
     try:
         data = request.get_json()
-        plato_id = data.get('plato_id')
+        # Id estable del plato en menu.json
+        id_plato = data.get('id_plato')
+        # Número de posición en el menú (clientes anteriores, que lo mandan como plato_id o index):
+        # solo vale para la versión del menú con que se listó
+        posicion = data.get('index', data.get('plato_id'))
         
-        if not plato_id:
+        if not id_plato and not posicion:
             return jsonify({"success": False, "error": "Se requiere el ID del plato"}), 400
         
         # Obtener la mesa
@@ -300,23 +359,35 @@ def hacer_pedido(mesa_id, cliente_key):
         if not cliente or not cliente.get('nombre'):
             return jsonify({"success": False, "error": "Cliente no encontrado en la mesa"}), 404
 
-        # Obtener el menú completo para encontrar el plato
-        menu_completo = sistema_mesas.mostrar_menu_completo()
-        plato_encontrado = None
-        for item in menu_completo:
-            if str(item['index']) == str(plato_id):
-                plato_encontrado = item['plato']
-                break
+        # Buscar el plato por su id estable; la posición solo si la versión del menú coincide
+        instantanea = sistema_mesas.instantanea_menu()
+        if id_plato:
+            plato_encontrado = instantanea.platos_por_id.get(str(id_plato))
+        else:
+            if str(data.get('version_menu')) != str(instantanea.version):
+                return jsonify({
+                    "success": False,
+                    "error": "El menú cambió desde que se consultó, vuelva a cargarlo",
+                    "version": instantanea.version
+                }), 409
+            try:
+                posicion = int(posicion)
+            except (TypeError, ValueError):
+                return jsonify({"success": False, "error": "Posición de plato inválida"}), 400
+            plato_encontrado = instantanea.indexado[posicion - 1]['plato'] if 1 <= posicion <= len(instantanea.indexado) else None
 
         if not plato_encontrado:
             return jsonify({"success": False, "error": "Plato no encontrado en el menú"}), 404
 
+        if not sistema_mesas.plato_disponible(plato_encontrado):
+            return jsonify({"success": False, "error": "Plato no disponible por falta de stock"}), 400
+
         # Crear el nuevo pedido
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
         if 'contador_pedidos' not in cliente:
             cliente['contador_pedidos'] = 0
         cliente['contador_pedidos'] += 1
-        pedido_id = f"{timestamp}_{cliente['contador_pedidos']}"
+        pedido_id = f"{timestamp}_{cliente_key.split('_')[-1]}_{cliente['contador_pedidos']}"
 
         nuevo_pedido = {
             'id': pedido_id,
@@ -324,10 +395,12 @@ def hacer_pedido(mesa_id, cliente_key):
             'nombre': plato_encontrado['nombre'],
             'cantidad': 1,
             'precio': plato_encontrado['precio'],
+            'version_menu': instantanea.version,
             'hora': datetime.now().strftime("%H:%M hs"),
             'en_cocina': False,
             'estado_cocina': '🟡 Pendiente'
         }
+        sistema_pedidos_cocina.registrar_transicion(mesa_id, nuevo_pedido, 'creado')
 
         # Agregar el pedido al cliente
         if 'pedidos' not in cliente:
@@ -344,7 +417,7 @@ def hacer_pedido(mesa_id, cliente_key):
         })
 
     except Exception as e:
-        print(f"Error en hacer_pedido: {str(e)}")
+        logger.exception("Error en hacer_pedido: %s", e)
         return jsonify({"success": False, "error": str(e)}), 500
     
 # ------------------------------Obtiene los pedidos pendientes de una mesa para cancelar (Clientes)------------------------------
@@ -384,7 +457,7 @@ def obtener_pedidos_pendientes(mesa_id):
         })
 
     except Exception as e:
-        print(f"Error en obtener_pedidos_pendientes: {str(e)}")
+        logger.exception("Error en obtener_pedidos_pendientes: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -416,6 +489,7 @@ def cancelar_pedido(pedido_id):
                             
                             # Eliminar el pedido
                             cliente['pedidos'].remove(pedido)
+                            cierre_caja.registrar_cancelacion(mesa_id, pedido)
                             sistema_mesas.guardar_mesas()
                             return jsonify({
                                 "success": True,
@@ -428,7 +502,7 @@ def cancelar_pedido(pedido_id):
         }), 404
 
     except Exception as e:
-        print(f"Error en cancelar_pedido: {str(e)}")
+        logger.exception("Error en cancelar_pedido: %s", e)
         return jsonify({
             "success": False,
             "error": str(e)
@@ -468,7 +542,8 @@ def obtener_resumen_mesa(mesa_id):
                             'estado_cocina': pedido.get('estado_cocina', '🟡 Pendiente'),
                             'en_cocina': pedido.get('en_cocina', False),
                             'hora_envio': pedido.get('hora_envio', ''),
-                            'entregado': pedido.get('entregado', False)
+                            'entregado': pedido.get('entregado', False),
+                            'eta': sistema_pedidos_cocina.estimador_eta.estimar(mesa_id, pedido)
                         })
                         subtotal_cliente += pedido.get('precio', 0) * pedido.get('cantidad', 1)
                 
@@ -513,26 +588,7 @@ def enviar_pedidos_cocina(mesa_id):
                 'error': 'Mesa no encontrada'
             }), 404
 
-        mesa = mesa_data[0]
-        pedidos_enviados = []
-        timestamp = datetime.now().strftime("%H:%M hs")
-
-        # Procesar pedidos de cada cliente
-        for i in range(1, mesa.get('capacidad', 0) + 1):
-            cliente_key = f"cliente_{i}"
-            cliente = mesa.get(cliente_key)
-            if cliente and cliente.get('nombre'):
-                for pedido in cliente.get('pedidos', []):
-                    if not pedido.get('en_cocina', False) and not pedido.get('entregado', False):
-                        pedido['en_cocina'] = True
-                        pedido['hora_envio'] = timestamp
-                        pedido['estado_cocina'] = '🟡 Pendiente en cocina'
-                        pedidos_enviados.append({
-                            'id': pedido['id'],
-                            'cliente': cliente['nombre'],
-                            'nombre': pedido['nombre'],
-                            'cantidad': pedido['cantidad']
-                        })
+        pedidos_enviados, timestamp = sistema_pedidos_cocina.enviar_pedidos_mesa(mesa_id)
 
         if not pedidos_enviados:
             return jsonify({
@@ -540,9 +596,6 @@ def enviar_pedidos_cocina(mesa_id):
                 'error': 'No hay pedidos pendientes para enviar a cocina'
             }), 400
 
-        # Guardar los cambios
-        sistema_mesas.guardar_mesas()
-
         return jsonify({
             'success': True,
             'message': 'Pedidos enviados a cocina exitosamente',
@@ -553,7 +606,7 @@ def enviar_pedidos_cocina(mesa_id):
         })
 
     except Exception as e:
-        print(f"Error en enviar_pedidos_cocina: {str(e)}")
+        logger.exception("Error en enviar_pedidos_cocina: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -632,7 +685,7 @@ def llamar_camarero(mesa_id):
         })
 
     except Exception as e:
-        print(f"Error en llamar_camarero: {str(e)}")
+        logger.exception("Error en llamar_camarero: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -764,7 +817,7 @@ def marcar_comentario_realizado(mesa_id):
             }), 400
 
     except Exception as e:
-        print(f"Error en marcar_comentario_realizado: {str(e)}")
+        logger.exception("Error en marcar_comentario_realizado: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -799,7 +852,7 @@ def marcar_pedido_entregado(pedido_id):
             }), 400
 
     except Exception as e:
-        print(f"Error en marcar_pedido_entregado: {str(e)}")
+        logger.exception("Error en marcar_pedido_entregado: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -815,6 +868,43 @@ def obtener_mesas_ocupadas():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+# ------------------------------Sugiere mesas para un grupo (Mozos)------------------------------
+@app.route('/api/mozos/mesas/sugerencias', methods=['GET'])
+def sugerir_mesas():
+    """Sugiere mesas libres o combinaciones de mesas contiguas para un grupo (ej: ?personas=6)."""
+    try:
+        personas = request.args.get('personas', type=int)
+        if not personas:
+            return jsonify({"success": False, "error": "Se requiere el parámetro personas"}), 400
+        preferencias = {'combinar': request.args.get('combinar', 'true').lower() != 'false'}
+        if request.args.get('zona'):
+            preferencias['zona'] = request.args.get('zona')
+        if request.args.get('mesas'):
+            preferencias['mesas'] = request.args.get('mesas').split(',')
+        return jsonify({"success": True, "data": asignador_mesas.sugerir(personas, preferencias)})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# ------------------------------Asigna mesa a un grupo (Mozos)------------------------------
+@app.route('/api/mozos/mesas/asignar', methods=['POST'])
+def asignar_mesas():
+    """Sienta a un grupo en la mesa (o mesas contiguas) que mejor se ajusta a su tamaño."""
+    try:
+        data = request.get_json() or {}
+        personas = data.get('personas')
+        if not isinstance(personas, int):
+            return jsonify({"success": False, "error": "Se requiere la cantidad de personas"}), 400
+        exito, resultado = asignador_mesas.asignar(personas, data.get('nombre'), data.get('preferencias'))
+        if not exito:
+            return jsonify({"success": False, "error": resultado}), 409
+        return jsonify({"success": True, "data": resultado})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
 # ------------------------------Reiniciar una mesa (Mozos)------------------------------
 @app.route('/api/mozos/mesas/<mesa_id>/reiniciar', methods=['POST'])
 def reiniciar_mesa(mesa_id):
@@ -845,17 +935,20 @@ def reiniciar_mesa(mesa_id):
             mesa['notificaciones'] = []
             
         # Reiniciar estado de la mesa
-        mesa['estado'] = 'libre'
+        sistema_mesas.cambiar_estado_mesa(mesa_id, 'libre')
         
         # Guardar los cambios
         sistema_mesas.guardar_mesas()
+
+        # Registrar el reinicio en el registro de eventos del día y en el cierre de caja
+        sistema_pedidos_mozos.registrar_reinicio(mesa)
         
         return jsonify({
             "success": True,
             "message": "Mesa reiniciada exitosamente"
         })
     except Exception as e:
-        print(f"Error en reiniciar_mesa: {str(e)}")
+        logger.exception("Error en reiniciar_mesa: %s", e)
         return jsonify({
             "success": False,
             "error": str(e)
@@ -956,7 +1049,7 @@ def obtener_detalles_mesa_cocina(mesa_id):
             'data': detalles
         })
     except Exception as e:
-        print(f"Error en obtener_detalles_mesa_cocina: {str(e)}")
+        logger.exception("Error en obtener_detalles_mesa_cocina: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
@@ -982,6 +1075,11 @@ def actualizar_estado_pedido_cocina(pedido_id):
             'success': success,
             'message': 'Estado del pedido actualizado'
         })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -1005,41 +1103,173 @@ def obtener_pedidos_activos_cocina():
             'error': str(e)
         }), 500
 
+# ------------------------------Obtiene la cantidad de pedidos por estación (Cocina)------------------------------
+@app.route('/api/cocina/estaciones')
+def obtener_estaciones_cocina():
+    """Obtiene la cantidad de pedidos pendientes en cada estación de preparación."""
+    try:
+        return jsonify({
+            'success': True,
+            'data': sistema_pedidos_cocina.estaciones.resumen()
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# ------------------------------Obtiene el tablero de una estación (Cocina)------------------------------
+@app.route('/api/cocina/estaciones/<estacion>/pedidos')
+def obtener_tablero_estacion(estacion):
+    """Obtiene los pedidos pendientes de una estación, en orden de llegada."""
+    try:
+        return jsonify({
+            'success': True,
+            'data': sistema_pedidos_cocina.estaciones.obtener_tablero(estacion)
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# ------------------------------Obtiene los pedidos activos agrupados por plato (Cocina)------------------------------
+@app.route('/api/cocina/lotes')
+def obtener_lotes_cocina():
+    """Obtiene los pedidos activos agrupados por plato entre todas las mesas."""
+    try:
+        return jsonify({
+            'success': True,
+            'data': sistema_pedidos_cocina.lotes.obtener_lotes()
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# ------------------------------Actualiza el estado de todo un lote (Cocina)------------------------------
+@app.route('/api/cocina/lotes/<plato_id>/estado', methods=['PUT'])
+def actualizar_estado_lote_cocina(plato_id):
+    """Actualiza el estado de todos los pedidos activos de un plato."""
+    try:
+        data = request.get_json() or {}
+        nuevo_estado = data.get('estado')
+        if not nuevo_estado:
+            return jsonify({
+                'success': False,
+                'error': 'Se requiere estado'
+            }), 400
+
+        actualizados = sistema_pedidos_cocina.actualizar_estado_lote(plato_id, nuevo_estado)
+        if actualizados is None:
+            return jsonify({
+                'success': False,
+                'error': 'No se pudieron guardar los cambios del lote'
+            }), 500
+        if not actualizados:
+            return jsonify({
+                'success': False,
+                'error': 'No hay pedidos para actualizar en el lote'
+            }), 404
+        return jsonify({
+            'success': True,
+            'message': f'{len(actualizados)} pedido(s) actualizados',
+            'data': actualizados
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# ------------------------------Política de prioridad de la cola de cocina (Cocina)------------------------------
+@app.route('/api/cocina/planificacion', methods=['GET', 'PUT'])
+def politica_planificacion_cocina():
+    """Obtiene o actualiza la política con la que se ordena la cola de cocina."""
+    try:
+        if request.method == 'PUT':
+            data = request.get_json() or {}
+            politica = sistema_pedidos_cocina.planificador.configurar_politica(data)
+        else:
+            politica = sistema_pedidos_cocina.planificador.politica
+        return jsonify({
+            'success': True,
+            'data': politica
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 # ------------------------------Obtiene los detalles de un pedido específico (Cocina)------------------------------
 @app.route('/api/cocina/pedidos/<pedido_id>')
 def obtener_detalles_pedido_cocina(pedido_id):
     """Obtiene los detalles de un pedido específico."""
     try:
-        # Buscar el pedido en todas las mesas
-        for mesa_id, mesa_data in sistema_mesas.mesas.items():
-            mesa = mesa_data[0]
-            for i in range(1, mesa.get('capacidad', 0) + 1):
-                cliente_key = f"cliente_{i}"
-                cliente = mesa.get(cliente_key)
-                if cliente and cliente.get('nombre'):
-                    for pedido in cliente.get('pedidos', []):
-                        if pedido.get('id') == pedido_id:
-                            detalles = {
-                                'id': pedido.get('id'),
-                                'mesa_id': mesa_id,
-                                'cliente': cliente['nombre'],
-                                'nombre': pedido.get('nombre', 'Desconocido'),
-                                'cantidad': pedido.get('cantidad', 1),
-                                'estado_cocina': pedido.get('estado_cocina', '🟡 Pendiente en cocina'),
-                                'hora_envio': pedido.get('hora_envio', ''),
-                                'notas': pedido.get('notas', []),
-                                'retraso_minutos': pedido.get('retraso_minutos', 0),
-                                'historial_estados': pedido.get('historial_estados', [])
-                            }
-                            return jsonify({
-                                'success': True,
-                                'data': detalles
-                            })
-        
+        encontrado = sistema_pedidos_cocina.buscar_pedido(pedido_id)
+        if not encontrado:
+            return jsonify({
+                'success': False,
+                'error': 'Pedido no encontrado'
+            }), 404
+
+        mesa_id, cliente, pedido = encontrado
+        detalles = {
+            'id': pedido.get('id'),
+            'mesa_id': mesa_id,
+            'cliente': cliente['nombre'],
+            'nombre': pedido.get('nombre', 'Desconocido'),
+            'cantidad': pedido.get('cantidad', 1),
+            'estado_cocina': pedido.get('estado_cocina', '🟡 Pendiente en cocina'),
+            'hora_envio': pedido.get('hora_envio', ''),
+            'notas': pedido.get('notas', []),
+            'retraso_minutos': pedido.get('retraso_minutos', 0),
+            'historial_estados': pedido.get('historial_estados', []),
+            'eta': sistema_pedidos_cocina.estimador_eta.estimar(mesa_id, pedido)
+        }
+        return jsonify({
+            'success': True,
+            'data': detalles
+        })
+    except Exception as e:
         return jsonify({
             'success': False,
-            'error': 'Pedido no encontrado'
-        }), 404
+            'error': str(e)
+        }), 500
+
+# ------------------------------Obtiene las métricas de latencia de la cocina (Cocina)------------------------------
+@app.route('/api/cocina/metricas')
+def obtener_metricas_cocina():
+    """Obtiene p50/p95/p99 del tiempo en cada estado, agrupado por plato, categoría u hora."""
+    try:
+        dimension = request.args.get('dimension', 'plato')
+        return jsonify({
+            'success': True,
+            'data': sistema_pedidos_cocina.metricas.percentiles(dimension),
+            'unidad': 'segundos'
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -1132,7 +1362,7 @@ def obtener_cuenta():
         })
 
     except Exception as e:
-        print(f"Error en obtener_cuenta: {str(e)}")  # Agregamos log para debug
+        logger.exception("Error en obtener_cuenta: %s", e)
         return jsonify({'success': False, 'error': str(e)})
 
 # ------------------------------Procesa el pago (Clientes)------------------------------
@@ -1202,37 +1432,6 @@ def procesar_pago():
                 'pedidos_pendientes': pedidos_pendientes
             }), 400
 
-        # Crear el ticket con la información básica
-        ticket = {
-            'mesa_id': mesa_id,
-            'mesa_nombre': mesa['nombre'],
-            'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'tipo_pago': data['tipo_pago'],
-            'metodo_pago': data['metodo_pago'],
-            'total': data['total'],
-            'pedidos': []
-        }
-
-        # Agregar los pedidos al ticket
-        for i in range(1, mesa.get('capacidad', 0) + 1):
-            cliente_key = f"cliente_{i}"
-            cliente = mesa.get(cliente_key)
-            if cliente and cliente.get('nombre'):
-                for pedido in cliente.get('pedidos', []):
-                    if pedido.get('entregado'):
-                        ticket['pedidos'].append({
-                            'cliente': cliente['nombre'],
-                            'nombre': pedido['nombre'],
-                            'cantidad': pedido['cantidad'],
-                            'precio': pedido['precio'],
-                            'subtotal': pedido['precio'] * pedido['cantidad']
-                        })
-
-        # Guardar el ticket en el historial
-        if not hasattr(sistema_pedidos_mozos, 'historial_tickets'):
-            sistema_pedidos_mozos.historial_tickets = []
-        sistema_pedidos_mozos.historial_tickets.append(ticket)
-
         # Notificar a los mozos
         if not hasattr(sistema_pedidos_mozos, 'pagos_pendientes'):
             sistema_pedidos_mozos.pagos_pendientes = []
@@ -1262,7 +1461,7 @@ def procesar_pago():
         })
 
     except Exception as e:
-        print(f"Error en procesar_pago: {str(e)}")  # Agregamos log para debug
+        logger.exception("Error en procesar_pago: %s", e)
         return jsonify({'success': False, 'error': str(e)})
     
 # ------------------------------Procesar pago (Clientes)------------------------------
@@ -1389,13 +1588,530 @@ def confirmar_pago(mesa_id):
             }), 400
 
     except Exception as e:
-        print(f"Error en confirmar_pago: {str(e)}")
+        logger.exception("Error en confirmar_pago: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+# ------------------------------Inventario de ingredientes------------------------------
+@app.route('/api/inventario', methods=['GET'])
+def obtener_inventario():
+    """Obtiene el stock de cada ingrediente y los platos que lo usan."""
+    try:
+        return jsonify({"success": True, "data": sistema_pedidos_cocina.inventario.obtener_stock()})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/inventario/<ingrediente>/reponer', methods=['POST'])
+def reponer_ingrediente(ingrediente):
+    """Suma stock a un ingrediente y vuelve a habilitar los platos que correspondan."""
+    try:
+        data = request.get_json() or {}
+        cantidad = data.get('cantidad')
+        if not isinstance(cantidad, (int, float)) or isinstance(cantidad, bool):
+            return jsonify({"success": False, "error": "Se requiere una cantidad numérica"}), 400
+        stock = sistema_pedidos_cocina.inventario.reponer(ingrediente, cantidad)
+        return jsonify({"success": True, "data": {"ingrediente": ingrediente, "stock": stock}})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# ------------------------------Reservas de mesas------------------------------
+@app.route('/api/reservas', methods=['GET'])
+def obtener_reservas():
+    """Obtiene las reservas, opcionalmente filtradas por fecha (YYYY-MM-DD)."""
+    try:
+        return jsonify({"success": True, "data": sistema_reservas.obtener_reservas(request.args.get('fecha'))})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/reservas', methods=['POST'])
+def crear_reserva():
+    """Crea una reserva para una mesa en una franja horaria."""
+    try:
+        data = request.get_json() or {}
+        mesa_id = data.get('mesa_id')
+        nombre = data.get('nombre')
+        personas = data.get('personas')
+        inicio = data.get('inicio')
+        if not mesa_id or personas is None or not inicio:
+            return jsonify({"success": False, "error": "Se requieren mesa_id, personas e inicio (YYYY-MM-DD HH:MM)"}), 400
+
+        duracion = data.get('duracion_minutos', DURACION_POR_DEFECTO)
+        exito, resultado = sistema_reservas.crear_reserva(str(mesa_id), nombre, personas, inicio, duracion)
+        if not exito:
+            return jsonify({"success": False, "error": resultado}), 409
+        return jsonify({"success": True, "data": resultado})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/reservas/<reserva_id>', methods=['DELETE'])
+def cancelar_reserva(reserva_id):
+    """Cancela una reserva y libera la mesa si estaba marcada como reservada."""
+    try:
+        if not sistema_reservas.cancelar_reserva(reserva_id):
+            return jsonify({"success": False, "error": "Reserva no encontrada o ya finalizada"}), 404
+        return jsonify({"success": True, "message": "Reserva cancelada"})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/reservas/<reserva_id>/llegada', methods=['POST'])
+def registrar_llegada_reserva(reserva_id):
+    """Registra la llegada de una reserva: sienta al cliente y la da por cumplida."""
+    try:
+        data = request.get_json(silent=True) or {}
+        exito, resultado = sistema_reservas.registrar_llegada(reserva_id, data.get('nombre'))
+        if not exito:
+            return jsonify({"success": False, "error": resultado}), 409
+        return jsonify({"success": True, "data": resultado})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/api/reservas/disponibilidad', methods=['GET'])
+def buscar_disponibilidad():
+    """Busca mesas libres para una cantidad de personas en un horario (ej: ?personas=4&hora=21:00)."""
+    try:
+        personas = request.args.get('personas', type=int)
+        hora = request.args.get('hora')
+        if not personas or not hora:
+            return jsonify({"success": False, "error": "Se requieren los parámetros personas y hora (HH:MM)"}), 400
+        fecha = request.args.get('fecha') or datetime.now().strftime('%Y-%m-%d')
+        duracion = request.args.get('duracion_minutos', DURACION_POR_DEFECTO, type=int)
+        mesas = sistema_reservas.buscar_disponibilidad(personas, f"{fecha} {hora}", duracion)
+        return jsonify({"success": True, "data": mesas})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# ------------------------------Analítica de ventas------------------------------
+def _obtener_rango_fechas(por_defecto_mes_actual=False):
+    """Lee y valida los parámetros 'desde' y 'hasta' (YYYY-MM-DD) de la consulta."""
+    desde = request.args.get('desde')
+    hasta = request.args.get('hasta')
+    for fecha in (desde, hasta):
+        if fecha:
+            datetime.strptime(fecha, '%Y-%m-%d')
+    if por_defecto_mes_actual and not desde and not hasta:
+        hoy = datetime.now()
+        desde = hoy.strftime('%Y-%m-01')
+        hasta = hoy.strftime('%Y-%m-%d')
+    return desde, hasta
+
+@app.route('/api/analitica/resumen')
+def obtener_resumen_analitica():
+    """Obtiene el tablero de ventas (por defecto, el mes en curso)."""
+    try:
+        desde, hasta = _obtener_rango_fechas(por_defecto_mes_actual=True)
+        return jsonify({'success': True, 'data': sistema_pedidos_mozos.analitica.resumen(desde, hasta)})
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Formato de fecha inválido, use YYYY-MM-DD'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/analitica/ventas-dia')
+def obtener_ventas_por_dia():
+    """Obtiene la facturación por día."""
+    try:
+        desde, hasta = _obtener_rango_fechas()
+        return jsonify({'success': True, 'data': sistema_pedidos_mozos.analitica.ingresos_por_dia(desde, hasta)})
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Formato de fecha inválido, use YYYY-MM-DD'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/analitica/ventas-hora')
+def obtener_ventas_por_hora():
+    """Obtiene la facturación por hora del día."""
+    try:
+        desde, hasta = _obtener_rango_fechas()
+        return jsonify({'success': True, 'data': sistema_pedidos_mozos.analitica.ingresos_por_hora(desde, hasta)})
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Formato de fecha inválido, use YYYY-MM-DD'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/analitica/platos')
+def obtener_ventas_por_plato():
+    """Obtiene las ventas por plato."""
+    try:
+        desde, hasta = _obtener_rango_fechas()
+        return jsonify({'success': True, 'data': sistema_pedidos_mozos.analitica.ventas_por_plato(desde, hasta)})
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Formato de fecha inválido, use YYYY-MM-DD'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/analitica/categorias')
+def obtener_ventas_por_categoria():
+    """Obtiene las ventas por categoría del menú."""
+    try:
+        desde, hasta = _obtener_rango_fechas()
+        return jsonify({'success': True, 'data': sistema_pedidos_mozos.analitica.ventas_por_categoria(desde, hasta)})
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Formato de fecha inválido, use YYYY-MM-DD'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/analitica/ticket-promedio')
+def obtener_ticket_promedio():
+    """Obtiene el importe promedio por ticket."""
+    try:
+        desde, hasta = _obtener_rango_fechas()
+        return jsonify({'success': True, 'data': sistema_pedidos_mozos.analitica.ticket_promedio(desde, hasta)})
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Formato de fecha inválido, use YYYY-MM-DD'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/analitica/metodos-pago')
+def obtener_mix_metodos_pago():
+    """Obtiene la distribución de ventas por método de pago."""
+    try:
+        desde, hasta = _obtener_rango_fechas()
+        return jsonify({'success': True, 'data': sistema_pedidos_mozos.analitica.mix_metodos_pago(desde, hasta)})
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Formato de fecha inválido, use YYYY-MM-DD'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/analitica/reporte')
+def obtener_reporte_lineas():
+    """Agrupa las líneas de ticket por una columna y suma una medida."""
+    try:
+        agrupar = request.args.get('agrupar', 'plato')
+        medida = request.args.get('medida', 'subtotal')
+        try:
+            desde, hasta = _obtener_rango_fechas()
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Formato de fecha inválido, use YYYY-MM-DD'}), 400
+
+        # 'hasta' es inclusivo: se toma hasta el inicio del día siguiente
+        ts_desde = datetime.strptime(desde, '%Y-%m-%d').timestamp() if desde else None
+        ts_hasta = (datetime.strptime(hasta, '%Y-%m-%d') + timedelta(days=1)).timestamp() if hasta else None
+
+        try:
+            datos, filas = sistema_pedidos_mozos.reporte_lineas(agrupar, medida, ts_desde, ts_hasta)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        return jsonify({
+            'success': True,
+            'data': datos,
+            'agrupar': agrupar,
+            'medida': medida,
+            'filas': filas
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ------------------------------Archivo de tickets (Mozos)------------------------------
+@app.route('/api/tickets', methods=['GET'])
+def buscar_tickets():
+    """Lista los tickets de una mesa y/o de un día (solo el índice, sin el texto)."""
+    try:
+        mesa_id = request.args.get('mesa_id')
+        fecha = request.args.get('fecha')
+        limite = int(request.args.get('limite', 100))
+        return jsonify({'success': True, 'data': archivo_tickets.buscar(mesa_id=mesa_id, fecha=fecha, limite=limite)})
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Parámetros inválidos (fecha YYYY-MM-DD, limite entero)'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/tickets/<int:numero>', methods=['GET'])
+def obtener_ticket(numero):
+    """Obtiene un ticket por número, con su texto."""
+    try:
+        ticket = archivo_tickets.obtener(numero)
+        if not ticket:
+            return jsonify({'success': False, 'error': 'Ticket no encontrado'}), 404
+        return jsonify({'success': True, 'data': ticket})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/tickets/<int:numero>/reimprimir', methods=['GET'])
+def reimprimir_ticket(numero):
+    """Devuelve el texto del ticket listo para imprimir."""
+    try:
+        ticket = archivo_tickets.obtener(numero)
+        if not ticket:
+            return jsonify({'success': False, 'error': 'Ticket no encontrado'}), 404
+        return Response(ticket['texto'], mimetype='text/plain')
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ------------------------------Historial de pagos------------------------------
+@app.route('/api/historial/tickets')
+def exportar_historial_tickets():
+    """Devuelve los tickets del rango en JSON Lines, leídos del historial a medida que se envían."""
+    try:
+        desde, hasta = _obtener_rango_fechas()
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Formato de fecha inválido, use YYYY-MM-DD'}), 400
+
+    # 'hasta' es inclusivo: se toma hasta el inicio del día siguiente
+    ts_desde = datetime.strptime(desde, '%Y-%m-%d').timestamp() if desde else None
+    ts_hasta = (datetime.strptime(hasta, '%Y-%m-%d') + timedelta(days=1)).timestamp() if hasta else None
+    tickets = sistema_pedidos_mozos.historial.iterar(ts_desde, ts_hasta)
+    return Response((json.dumps(ticket, ensure_ascii=False) + '\n' for ticket in tickets),
+                    mimetype='application/x-ndjson')
+
+# ------------------------------Registro de eventos del día (Mozos)------------------------------
+@app.route('/api/eventos/resumen', methods=['GET'])
+def resumen_eventos():
+    """Resume los eventos de un día (por defecto hoy) leyendo el registro en streaming."""
+    try:
+        fecha = request.args.get('fecha') or datetime.now().strftime('%Y-%m-%d')
+        datetime.strptime(fecha, '%Y-%m-%d')
+        return jsonify({'success': True, 'data': sistema_pedidos_mozos.registro_eventos.resumen_dia(fecha)})
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Formato de fecha inválido, use YYYY-MM-DD'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ------------------------------Cierre de caja (Administración)------------------------------
+@app.route('/api/caja/parcial', methods=['GET'])
+def reporte_parcial_caja():
+    """Reporte X: acumulados del turno en curso, sin cerrarlo."""
+    try:
+        return jsonify({'success': True, 'data': cierre_caja.parcial()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/caja/cierre', methods=['POST'])
+def cerrar_caja():
+    """Reporte Z: cierra el turno, archiva los acumulados y empieza un turno nuevo."""
+    try:
+        return jsonify({'success': True, 'data': sistema_pedidos_mozos.cerrar_caja()})
+    except Exception as e:
+        logger.exception("Error en cerrar_caja: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/caja/cierres/<int:numero>', methods=['GET'])
+def obtener_cierre_caja(numero):
+    """Obtiene un reporte Z archivado por número."""
+    try:
+        reporte = cierre_caja.obtener_cierre(numero)
+        if not reporte:
+            return jsonify({'success': False, 'error': 'Cierre no encontrado'}), 404
+        return jsonify({'success': True, 'data': reporte})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ------------------------------Contexto del registro------------------------------
+@app.before_request
+def fijar_contexto_registro():
+    # Los eventos registrados durante el pedido llevan la ruta y, si vienen en la URL, la mesa y el pedido
+    argumentos = request.view_args or {}
+    g.token_registro = fijar_contexto(
+        route=request.url_rule.rule if request.url_rule else request.path,
+        method=request.method,
+        mesa_id=argumentos.get('mesa_id') or request.args.get('mesa_id') or session.get('mesa_id'),
+        pedido_id=argumentos.get('pedido_id')
+    )
+
+@app.teardown_request
+def restaurar_contexto_registro(error=None):
+    token = g.pop('token_registro', None)
+    if token is not None:
+        restaurar_contexto(token)
+
+# ------------------------------Administración del menú (Administración)------------------------------
+@app.route('/api/admin/menu/platos', methods=['POST'])
+def crear_plato_menu():
+    """Agrega un plato a una categoría del menú."""
+    try:
+        data = request.get_json() or {}
+        etapa = data.pop('etapa', None)
+        categoria = data.pop('categoria', None)
+        return jsonify({'success': True, 'data': administrador_menu.crear_plato(etapa, categoria, data)}), 201
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.exception("Error en crear_plato_menu: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/menu/platos/<plato_id>', methods=['PATCH'])
+def actualizar_plato_menu(plato_id):
+    """Modifica los campos indicados de un plato."""
+    try:
+        return jsonify({'success': True, 'data': administrador_menu.actualizar_plato(plato_id, request.get_json() or {})})
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Plato no encontrado'}), 404
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.exception("Error en actualizar_plato_menu: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/menu/platos/<plato_id>/precio', methods=['PUT'])
+def cambiar_precio_plato(plato_id):
+    """Cambia el precio de un plato."""
+    try:
+        data = request.get_json() or {}
+        return jsonify({'success': True, 'data': administrador_menu.cambiar_precio(plato_id, data.get('precio'))})
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Plato no encontrado'}), 404
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.exception("Error en cambiar_precio_plato: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/menu/platos/<plato_id>/disponible', methods=['PUT'])
+def cambiar_disponibilidad_plato(plato_id):
+    """Habilita o deshabilita un plato en el menú."""
+    try:
+        data = request.get_json() or {}
+        return jsonify({'success': True, 'data': administrador_menu.cambiar_disponibilidad(plato_id, data.get('disponible'))})
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Plato no encontrado'}), 404
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.exception("Error en cambiar_disponibilidad_plato: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/menu/platos/<plato_id>', methods=['DELETE'])
+def eliminar_plato_menu(plato_id):
+    """Quita un plato del menú."""
+    try:
+        return jsonify({'success': True, 'data': administrador_menu.eliminar_plato(plato_id)})
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Plato no encontrado'}), 404
+    except Exception as e:
+        logger.exception("Error en eliminar_plato_menu: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/menu/categorias', methods=['POST'])
+def crear_categoria_menu():
+    """Agrega una categoría vacía a una etapa del menú."""
+    try:
+        data = request.get_json() or {}
+        return jsonify({'success': True, 'data': administrador_menu.crear_categoria(data.get('etapa'), data.get('categoria'))}), 201
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.exception("Error en crear_categoria_menu: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/menu/categorias/<etapa>/<categoria>', methods=['DELETE'])
+def eliminar_categoria_menu(etapa, categoria):
+    """Quita una categoría sin platos."""
+    try:
+        return jsonify({'success': True, 'data': administrador_menu.eliminar_categoria(etapa, categoria)})
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Categoría no encontrada'}), 404
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.exception("Error en eliminar_categoria_menu: %s", e)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ------------------------------Métricas HTTP (Prometheus)------------------------------
+def _ruta_actual():
+    """Plantilla de la ruta atendida (sin los ids), para no crear una serie por cada mesa o pedido."""
+    return request.url_rule.rule if request.url_rule else 'sin_ruta'
+
+# Se registran antes que el lock de las mesas: la medición incluye la espera por el lock (y el
+# teardown, que corre en orden inverso, termina después de soltarlo), como la ve el cliente
+@app.before_request
+def iniciar_medicion():
+    g.inicio_medicion = time.perf_counter()
+    g.ruta_medida = _ruta_actual()
+    registro_metricas.incrementar('definity_http_requests_in_flight', 1, route=g.ruta_medida)
+
+@app.after_request
+def registrar_medicion(response):
+    inicio = g.get('inicio_medicion')
+    if inicio is not None:
+        ruta = g.ruta_medida
+        registro_metricas.observar('definity_http_request_duration_seconds', time.perf_counter() - inicio,
+                                   route=ruta, method=request.method)
+        registro_metricas.incrementar('definity_http_requests_total', route=ruta, method=request.method,
+                                      status=str(response.status_code))
+        if response.content_length:
+            registro_metricas.incrementar('definity_http_response_bytes_total', response.content_length, route=ruta)
+    return response
+
+@app.teardown_request
+def finalizar_medicion(error=None):
+    # Se ejecuta siempre, aunque la vista lance una excepción, para que el gauge no quede inflado
+    if g.get('inicio_medicion') is not None:
+        registro_metricas.incrementar('definity_http_requests_in_flight', -1, route=g.ruta_medida)
+
+@app.route('/metrics')
+def exportar_metricas():
+    """Expone las métricas en el formato de texto de Prometheus."""
+    return Response(registro_metricas.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# ------------------------------Acceso a las mesas------------------------------
+# Rutas que no leen las mesas: responden aunque otro pedido tenga el lock (para diagnosticar una espera)
+RUTAS_SIN_LOCK_MESAS = {'static', 'exportar_metricas', 'obtener_perfilador'}
+
+@app.before_request
+def tomar_lock_mesas():
+    # Los pedidos se atienden de a uno, incluidas las lecturas: las vistas serializan las mismas
+    # mesas que modifican los demás pedidos. guardar_mesas escribe mesas.json con este lock tomado
+    if request.method != 'OPTIONS' and request.endpoint not in RUTAS_SIN_LOCK_MESAS:
+        sistema_mesas.lock_mesas.acquire()
+        g.lock_mesas = True
+
+@app.teardown_request
+def soltar_lock_mesas(error=None):
+    if g.pop('lock_mesas', False):
+        sistema_mesas.lock_mesas.release()
+
+# ------------------------------Versión del menú por pedido------------------------------
+@app.before_request
+def fijar_instantanea_menu():
+    # Todo el pedido usa la misma versión del menú aunque se recargue mientras se atiende
+    g.token_menu = sistema_mesas.fijar_instantanea_menu()
+
+@app.teardown_request
+def liberar_instantanea_menu(error=None):
+    token = g.pop('token_menu', None)
+    if token is not None:
+        sistema_mesas.liberar_instantanea_menu(token)
+
+# ------------------------------Perfilador por muestreo (Administración)------------------------------
+@app.before_request
+def registrar_hilo_perfilador():
+    ruta = request.url_rule.rule if request.url_rule else 'sin_ruta'
+    perfilador.registrar_hilo(f"{request.method} {ruta}")
+
+@app.teardown_request
+def liberar_hilo_perfilador(error=None):
+    perfilador.liberar_hilo()
+
+@app.route('/api/admin/perfilador', methods=['POST'])
+def iniciar_perfilador():
+    """Muestrea las pilas de los hilos que atienden pedidos durante una ventana acotada."""
+    try:
+        data = request.get_json(silent=True) or {}
+        duracion = float(data.get('duracion_segundos', 30))
+        intervalo = float(data.get('intervalo_ms', INTERVALO_POR_DEFECTO * 1000)) / 1000
+        iniciado, resultado = perfilador.iniciar(duracion, intervalo)
+        if not iniciado:
+            return jsonify({'success': False, 'error': resultado}), 409
+        return jsonify({'success': True, 'data': resultado})
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/admin/perfilador', methods=['GET'])
+def obtener_perfilador():
+    """Estado de la ventana en curso o resumen de la última (archivo, muestras por ruta, funciones)."""
+    try:
+        return jsonify({'success': True, 'data': perfilador.estado()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -1469,7 +2185,7 @@ def agregar_cliente_mesa(mesa_id):
             return jsonify({"success": True, "message": "Cliente agregado exitosamente"})
         return jsonify({"success": False, "error": "No se pudo agregar el cliente"}), 400
     except Exception as e:
-        print(f"Error al agregar cliente: {str(e)}")  # Para logging
+        logger.exception("Error al agregar cliente: %s", e)
         return jsonify({
             "success": False, 
             "error": "Ocurrió un error inesperado al agregar el cliente. Por favor, intente nuevamente."
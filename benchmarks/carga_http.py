@@ -0,0 +1,326 @@
+"""Benchmark de carga de la API HTTP.
+
+Simula un restaurante de N mesas con M comensales cada una recorriendo el flujo completo
+(acceso por QR, menú, pedidos, envío a cocina, estados de cocina, entrega, llamado al
+camarero y pago) mientras las tres vistas (clientes, mozos y cocina) consultan la API
+cada 3 segundos como lo hacen las plantillas. Informa throughput y percentiles de
+latencia por ruta.
+
+Uso:
+    python benchmarks/carga_http.py --mesas 20 --comensales 4
+    python benchmarks/carga_http.py --url http://localhost:5000 --mesas 5
+
+Con el cliente de pruebas de Flask (por defecto) la app corre sobre un directorio de
+datos temporal, así que no toca data/. Con --url se usa un servidor ya levantado; en ese
+caso el pago queda afuera porque depende de la sesión del cliente. Termina con código 1
+si algún guardado de mesas.json falló durante la carga.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MENU_JSON = os.path.join(RAIZ, 'data', 'menu.json')
+
+class Registro:
+    """Latencias y errores por ruta, compartido entre hilos."""
+
+    def __init__(self):
+        self.latencias = {}
+        self.errores = {}
+        self.rechazos = {}
+        self._lock = threading.Lock()
+
+    def anotar(self, ruta, segundos, estado):
+        with self._lock:
+            self.latencias.setdefault(ruta, []).append(segundos * 1000)
+            if estado is None or estado >= 500:
+                self.errores[ruta] = self.errores.get(ruta, 0) + 1
+            elif estado >= 400:
+                self.rechazos[ruta] = self.rechazos.get(ruta, 0) + 1
+
+    def resumen(self, duracion):
+        """Devuelve las estadísticas por ruta, de la más pedida a la menos pedida."""
+        filas = []
+        for ruta, valores in self.latencias.items():
+            valores = sorted(valores)
+            filas.append({
+                'ruta': ruta,
+                'pedidos': len(valores),
+                'por_segundo': round(len(valores) / duracion, 2) if duracion else 0,
+                'p50_ms': round(percentil(valores, 50), 2),
+                'p95_ms': round(percentil(valores, 95), 2),
+                'p99_ms': round(percentil(valores, 99), 2),
+                'max_ms': round(valores[-1], 2),
+                'errores': self.errores.get(ruta, 0),
+                'rechazos': self.rechazos.get(ruta, 0)
+            })
+        return sorted(filas, key=lambda f: -f['pedidos'])
+
+def percentil(valores_ordenados, p):
+    """Percentil por interpolación lineal sobre una lista ordenada."""
+    if not valores_ordenados:
+        return 0.0
+    posicion = (len(valores_ordenados) - 1) * p / 100
+    inferior = int(posicion)
+    superior = min(inferior + 1, len(valores_ordenados) - 1)
+    return valores_ordenados[inferior] + (valores_ordenados[superior] - valores_ordenados[inferior]) * (posicion - inferior)
+
+class ClienteFlask:
+    """Hace pedidos con el cliente de pruebas de Flask (cada instancia tiene su propia sesión)."""
+
+    soporta_sesion = True
+
+    def __init__(self, app, registro):
+        self.cliente = app.test_client()
+        self.registro = registro
+
+    def pedir(self, metodo, url, ruta, cuerpo=None):
+        inicio = time.perf_counter()
+        try:
+            respuesta = self.cliente.open(url, method=metodo, json=cuerpo)
+            estado, datos = respuesta.status_code, respuesta.get_json(silent=True)
+        except Exception:
+            estado, datos = None, None
+        self.registro.anotar(ruta, time.perf_counter() - inicio, estado)
+        return datos or {}
+
+    def fijar_sesion(self, **valores):
+        with self.cliente.session_transaction() as sesion:
+            sesion.update(valores)
+
+class ClienteRemoto:
+    """Hace pedidos HTTP a un servidor ya levantado."""
+
+    soporta_sesion = False
+
+    def __init__(self, base, registro):
+        self.base = base.rstrip('/')
+        self.registro = registro
+
+    def pedir(self, metodo, url, ruta, cuerpo=None):
+        datos = json.dumps(cuerpo).encode('utf-8') if cuerpo is not None else None
+        solicitud = urllib.request.Request(self.base + url, data=datos, method=metodo,
+                                           headers={'Content-Type': 'application/json'})
+        inicio = time.perf_counter()
+        try:
+            with urllib.request.urlopen(solicitud, timeout=30) as respuesta:
+                estado, contenido = respuesta.status, respuesta.read()
+        except urllib.error.HTTPError as e:
+            estado, contenido = e.code, e.read()
+        except Exception:
+            estado, contenido = None, b''
+        self.registro.anotar(ruta, time.perf_counter() - inicio, estado)
+        try:
+            return json.loads(contenido)
+        except ValueError:
+            return {}
+
+def preparar_datos(directorio, mesas, comensales):
+    """Crea un directorio de datos con N mesas libres de M lugares y el menú del repositorio."""
+    os.makedirs(os.path.join(directorio, 'historial_pagos'), exist_ok=True)
+    os.makedirs(os.path.join(directorio, 'tickets'), exist_ok=True)
+    shutil.copy(MENU_JSON, os.path.join(directorio, 'menu.json'))
+
+    datos = {}
+    for numero in range(1, mesas + 1):
+        mesa = {
+            'nombre': f'Mesa {numero}',
+            'qr_url': f'https://turestaurante.com/menu/mesa-{numero}',
+            'capacidad': comensales,
+            'estado': 'libre',
+            'comentarios_camarero': [],
+            'notificaciones': []
+        }
+        for i in range(1, comensales + 1):
+            mesa[f'cliente_{i}'] = {'nombre': '', 'pedidos': [], 'contador_pedidos': 0}
+        datos[str(numero)] = [mesa]
+    with open(os.path.join(directorio, 'mesas.json'), 'w', encoding='utf-8') as f:
+        json.dump(datos, f, ensure_ascii=False)
+
+def recorrer_mesa(cliente, mesa_id, comensales, platos_por_comensal, rondas, aleatorio):
+    """Flujo completo de una mesa, repetido la cantidad de rondas indicada."""
+    for ronda in range(rondas):
+        nombres = {}
+        for i in range(1, comensales + 1):
+            nombre = f'Comensal {mesa_id}-{ronda}-{i}'
+            respuesta = cliente.pedir('POST', '/api/mesas/acceder', '/api/mesas/acceder',
+                                      {'qr_url': f'https://turestaurante.com/menu/mesa-{mesa_id}', 'nombre': nombre})
+            if respuesta.get('cliente_key'):
+                nombres[respuesta['cliente_key']] = nombre
+        if not nombres:
+            return
+
+        menu = cliente.pedir('GET', '/api/menu', '/api/menu').get('data', [])
+        categorias = cliente.pedir('GET', '/api/menu/categorias', '/api/menu/categorias').get('data', [])
+        if categorias:
+            cliente.pedir('GET', f'/api/menu/categorias/{aleatorio.choice(categorias)}',
+                          '/api/menu/categorias/<categoria>')
+        if not menu:
+            return
+
+        for cliente_key in nombres:
+            for _ in range(platos_por_comensal):
+                cliente.pedir('POST', f'/api/mesas/{mesa_id}/clientes/{cliente_key}/pedidos',
+                              '/api/mesas/<mesa_id>/clientes/<cliente_key>/pedidos',
+                              {'id_plato': aleatorio.choice(menu)['plato']['id']})
+
+        enviados = cliente.pedir('POST', f'/api/mesas/{mesa_id}/enviar-cocina', '/api/mesas/<mesa_id>/enviar-cocina')
+        pedidos = enviados.get('data', {}).get('pedidos', [])
+
+        # Cocina: cada pedido pasa por preparación y queda listo
+        for pedido in pedidos:
+            for estado in ('en_preparacion', 'listo'):
+                cliente.pedir('PUT', f"/api/cocina/pedidos/{pedido['id']}/estado",
+                              '/api/cocina/pedidos/<pedido_id>/estado', {'estado': estado, 'mesa_id': mesa_id})
+
+        # Mozos: entregan los pedidos listos de la mesa
+        listos = cliente.pedir('GET', '/api/mozos/pedidos-listos', '/api/mozos/pedidos-listos').get('pedidos', [])
+        for pedido in listos:
+            if str(pedido.get('mesa_id')) == mesa_id:
+                cliente.pedir('PUT', f"/api/mozos/pedidos/{pedido['id']}/entregar",
+                              '/api/mozos/pedidos/<pedido_id>/entregar',
+                              {'mesa_id': mesa_id, 'cliente': pedido.get('cliente')})
+
+        primer_cliente = next(iter(nombres))
+        cliente.pedir('POST', f'/api/mesas/{mesa_id}/llamar-camarero', '/api/mesas/<mesa_id>/llamar-camarero',
+                      {'mensaje': 'Más servilletas por favor', 'cliente_key': primer_cliente})
+
+        if not cliente.soporta_sesion:
+            continue
+
+        # Pago grupal: el cliente lo pide y el mozo lo confirma (la mesa queda libre)
+        cliente.fijar_sesion(mesa_id=mesa_id, cliente_key=primer_cliente)
+        cuenta = cliente.pedir('GET', '/api/clientes/cuenta', '/api/clientes/cuenta')
+        total = cuenta.get('total_grupal', 0)
+        pago = {'tipo_pago': 'grupal', 'metodo_pago': aleatorio.choice(['efectivo', 'tarjeta']), 'total': total}
+        cliente.pedir('POST', '/api/clientes/pagar', '/api/clientes/pagar', pago)
+        cliente.pedir('POST', f'/api/mozos/pagos/{mesa_id}/confirmar', '/api/mozos/pagos/<mesa_id>/confirmar',
+                      dict(pago, cliente='Grupal'))
+
+def sondear_vistas(crear_cliente, mesas, comensales, intervalo, detener):
+    """Consultas periódicas de las tres plantillas hasta que terminen las mesas."""
+    def clientes():
+        cliente = crear_cliente()
+        while not detener.is_set():
+            # Cada comensal tiene su propia pestaña abierta en el resumen de la mesa
+            for mesa_id in mesas:
+                for _ in range(comensales):
+                    cliente.pedir('GET', f'/api/mesas/{mesa_id}/resumen', '/api/mesas/<mesa_id>/resumen')
+            detener.wait(intervalo)
+
+    def mozos():
+        cliente = crear_cliente()
+        while not detener.is_set():
+            cliente.pedir('GET', '/api/mozos/pedidos-listos', '/api/mozos/pedidos-listos')
+            cliente.pedir('GET', '/api/mozos/comentarios-pendientes', '/api/mozos/comentarios-pendientes')
+            cliente.pedir('GET', '/api/mozos/pagos-pendientes', '/api/mozos/pagos-pendientes')
+            detener.wait(intervalo)
+
+    def cocina():
+        cliente = crear_cliente()
+        while not detener.is_set():
+            cliente.pedir('GET', '/api/cocina/pedidos-activos', '/api/cocina/pedidos-activos')
+            detener.wait(intervalo)
+
+    hilos = [threading.Thread(target=f, name=f'sondeo-{f.__name__}', daemon=True) for f in (clientes, mozos, cocina)]
+    for hilo in hilos:
+        hilo.start()
+    return hilos
+
+def leer_metricas(args, aplicacion):
+    """Texto de /metrics del servidor levantado o de la app en proceso."""
+    if args.url:
+        with urllib.request.urlopen(args.url.rstrip('/') + '/metrics', timeout=30) as respuesta:
+            return respuesta.read().decode('utf-8')
+    return aplicacion.app.test_client().get('/metrics').get_data(as_text=True)
+
+def guardados_fallidos(texto_metricas):
+    """Guardados de mesas.json que fallaron según /metrics (0 si el contador no figura)."""
+    total = 0
+    for linea in texto_metricas.splitlines():
+        if linea.startswith('definity_guardar_mesas_errores_total'):
+            total += float(linea.split()[-1])
+    return int(total)
+
+def imprimir_resumen(filas, duracion):
+    total = sum(f['pedidos'] for f in filas)
+    print(f"\nDuración: {duracion:.2f} s | Pedidos HTTP: {total} | Throughput: {total / duracion:.1f} req/s\n")
+    ancho = max([len(f['ruta']) for f in filas] + [4])
+    print(f"{'Ruta':<{ancho}} {'n':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'err':>5} {'4xx':>5}")
+    for f in filas:
+        print(f"{f['ruta']:<{ancho}} {f['pedidos']:>7} {f['por_segundo']:>8} {f['p50_ms']:>8} "
+              f"{f['p95_ms']:>8} {f['p99_ms']:>8} {f['max_ms']:>8} {f['errores']:>5} {f['rechazos']:>5}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de carga de la API HTTP.')
+    parser.add_argument('--mesas', type=int, default=10, help='Cantidad de mesas')
+    parser.add_argument('--comensales', type=int, default=4, help='Comensales por mesa')
+    parser.add_argument('--platos', type=int, default=2, help='Platos que pide cada comensal')
+    parser.add_argument('--rondas', type=int, default=1, help='Veces que se ocupa cada mesa')
+    parser.add_argument('--intervalo-sondeo', type=float, default=3.0, help='Segundos entre consultas de las vistas')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--url', help='URL de un servidor levantado (por defecto, cliente de pruebas de Flask)')
+    parser.add_argument('--json', help='Archivo donde guardar los resultados')
+    args = parser.parse_args()
+
+    registro = Registro()
+    directorio = None
+    aplicacion = None
+    if args.url:
+        crear_cliente = lambda: ClienteRemoto(args.url, registro)
+    else:
+        directorio = tempfile.mkdtemp(prefix='definity_bench_')
+        preparar_datos(directorio, args.mesas, args.comensales)
+        os.environ['DEFINITY_DATA_DIR'] = directorio
+        sys.path.insert(0, RAIZ)
+        import app as aplicacion
+        crear_cliente = lambda: ClienteFlask(aplicacion.app, registro)
+
+    # Un guardado de mesas.json que falla no devuelve error HTTP: se cuenta aparte y hace fallar el benchmark
+    fallidos_previos = guardados_fallidos(leer_metricas(args, aplicacion))
+    mesas = [str(n) for n in range(1, args.mesas + 1)]
+    detener = threading.Event()
+    inicio = time.perf_counter()
+    sondeos = sondear_vistas(crear_cliente, mesas, args.comensales, args.intervalo_sondeo, detener)
+
+    hilos = []
+    for mesa_id in mesas:
+        aleatorio = random.Random(f'{args.semilla}-{mesa_id}')
+        hilo = threading.Thread(target=recorrer_mesa, name=f'mesa-{mesa_id}',
+                                args=(crear_cliente(), mesa_id, args.comensales, args.platos, args.rondas, aleatorio))
+        hilo.start()
+        hilos.append(hilo)
+    for hilo in hilos:
+        hilo.join()
+    detener.set()
+    for hilo in sondeos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+
+    filas = registro.resumen(duracion)
+    fallidos = guardados_fallidos(leer_metricas(args, aplicacion)) - fallidos_previos
+    imprimir_resumen(filas, duracion)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'parametros': vars(args), 'duracion_s': round(duracion, 3), 'guardados_fallidos': fallidos,
+                       'rutas': filas}, f, indent=2, ensure_ascii=False)
+    if directorio:
+        # Los hilos de fondo escriben en el directorio de datos (diario de la cola, mesas.json)
+        aplicacion.detener_servicios()
+        shutil.rmtree(directorio, ignore_errors=True)
+    if fallidos:
+        print(f"\nERROR: {fallidos} guardados de mesas.json fallaron durante la carga")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,297 @@
+"""Generador de datos sintéticos: menú, mesas e historial de pagos.
+
+Produce un directorio de datos con el mismo formato que data/ (menu.json, mesas.json e
+historial_pagos/historial.jsonl) en el tamaño que se necesite. Con la misma semilla y los
+mismos parámetros genera siempre los mismos archivos. Cada archivo se escribe a medida
+que se genera, así que el tamaño del resultado no está limitado por la memoria.
+
+Los horarios de los pedidos en curso se calculan respecto de una fecha de referencia
+(por defecto, el momento de ejecución); para obtener archivos idénticos entre corridas
+hay que fijarla con --referencia.
+
+Uso:
+    python benchmarks/generador_datos.py --salida /tmp/datos --platos 5000 --mesas 500 --meses 6
+    DEFINITY_DATA_DIR=/tmp/datos python app.py
+
+Desde otros scripts:
+    from generador_datos import GeneradorDatos
+    generador = GeneradorDatos(semilla=7, platos=2000)
+    for mesa_id, mesa_data in generador.iter_mesas(100, comensales=4, pedidos_por_cliente=10):
+        ...
+"""
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+# Etapas y categorías del menú real
+CATEGORIAS_POR_ETAPA = {
+    'entrada': ['ensaladas', 'dips', 'sopas', 'fritos', 'otros'],
+    'principal': ['carnes rojas', 'pollo', 'pescados', 'pastas', 'vegetarianos/veganos'],
+    'postre': ['tartas', 'chocolate', 'cremas', 'helados'],
+    'bebida': ['refrescos', 'cafés', 'tés', 'chocolates']
+}
+RANGO_PRECIOS_POR_ETAPA = {
+    'entrada': (5000, 12000),
+    'principal': (12000, 28000),
+    'postre': (4000, 9000),
+    'bebida': (2000, 6000)
+}
+DIETAS = ['vegano', 'vegetariano', 'sin gluten', 'sin lactosa', 'nut-free']
+INGREDIENTES_BASE = [
+    'aceite de oliva', 'ajo', 'albahaca', 'almendras', 'arroz', 'atún', 'berenjena', 'cacao',
+    'calabacín', 'canela', 'cebolla', 'champiñones', 'chocolate', 'comino', 'cordero', 'espinacas',
+    'garbanzos', 'hierbabuena', 'huevo', 'jengibre', 'leche de coco', 'lentejas', 'limón', 'lomo',
+    'maíz', 'manzana', 'merluza', 'miel', 'nueces', 'papas', 'pasta', 'pimiento', 'pollo',
+    'queso', 'quinoa', 'romero', 'salmón', 'tofu', 'tomate', 'vainilla', 'zanahoria'
+]
+NOMBRES_POR_ETAPA = {
+    'entrada': ['Ensalada', 'Tabla', 'Crema', 'Bruschetta', 'Empanada', 'Dip'],
+    'principal': ['Guiso', 'Filete', 'Risotto', 'Salteado', 'Lasaña', 'Curry'],
+    'postre': ['Tarta', 'Mousse', 'Flan', 'Helado', 'Crumble', 'Brownie'],
+    'bebida': ['Limonada', 'Café', 'Té', 'Licuado', 'Jugo', 'Chocolate']
+}
+
+# Recorrido de transiciones de cada estado del ciclo de vida de un pedido
+RECORRIDOS_PEDIDO = {
+    'creado': ['creado'],
+    'pendiente': ['creado', 'enviado'],
+    'en_preparacion': ['creado', 'enviado', 'en_preparacion'],
+    'listo': ['creado', 'enviado', 'en_preparacion', 'listo'],
+    'entregado': ['creado', 'enviado', 'en_preparacion', 'listo', 'entregado'],
+    'cancelado': ['creado', 'enviado', 'cancelado']
+}
+ETIQUETAS_COCINA = {
+    'creado': '🟡 Pendiente',
+    'pendiente': '🟡 Pendiente en cocina',
+    'en_preparacion': '👨‍🍳 EN PREPARACIÓN',
+    'listo': '✅ LISTO PARA ENTREGAR',
+    'entregado': '✅ LISTO PARA ENTREGAR',
+    'cancelado': '🔴 CANCELADO'
+}
+# Peso de cada hora del día en la cantidad de tickets (almuerzo y cena)
+PESOS_HORA = {12: 3, 13: 5, 14: 4, 15: 2, 16: 1, 17: 1, 19: 1, 20: 3, 21: 5, 22: 4, 23: 2}
+
+class GeneradorDatos:
+    """Genera menú, mesas y tickets de forma determinística a partir de una semilla."""
+
+    def __init__(self, semilla=42, platos=500, ingredientes=200, referencia=None):
+        self.semilla = semilla
+        self.referencia = referencia or datetime.now()
+        self.cantidad_platos = platos
+        self.categorias = [(etapa, categoria) for etapa, categorias in CATEGORIAS_POR_ETAPA.items()
+                           for categoria in categorias]
+        self.ingredientes = self._generar_ingredientes(ingredientes)
+
+    def _aleatorio(self, *clave):
+        """Generador aleatorio propio de cada elemento: el resultado no depende del orden de generación."""
+        return random.Random('-'.join(str(parte) for parte in (self.semilla,) + clave))
+
+    def _generar_ingredientes(self, cantidad):
+        ingredientes = list(INGREDIENTES_BASE[:cantidad])
+        variante = 2
+        while len(ingredientes) < cantidad:
+            ingredientes.extend(f'{base} {variante}' for base in INGREDIENTES_BASE[:cantidad - len(ingredientes)])
+            variante += 1
+        return ingredientes
+
+    def plato(self, plato_id):
+        """Devuelve el plato de un id (de 1 a la cantidad de platos); siempre el mismo para la misma semilla."""
+        etapa, categoria = self.categorias[(plato_id - 1) % len(self.categorias)]
+        aleatorio = self._aleatorio('plato', plato_id)
+        minimo, maximo = RANGO_PRECIOS_POR_ETAPA[etapa]
+        ingredientes = aleatorio.sample(self.ingredientes, min(len(self.ingredientes), aleatorio.randint(2, 5)))
+        return {
+            'id': plato_id,
+            'nombre': f'{aleatorio.choice(NOMBRES_POR_ETAPA[etapa])} de {ingredientes[0]} #{plato_id}',
+            'descripcion': f'{categoria.capitalize()} con {", ".join(ingredientes[1:]) or ingredientes[0]}',
+            'dietas': sorted(aleatorio.sample(DIETAS, aleatorio.choice([0, 0, 1, 1, 2]))),
+            'ingredientes': ingredientes,
+            'precio': aleatorio.randrange(minimo, maximo, 100),
+            'disponible': True
+        }
+
+    def iter_menu(self):
+        """Recorre (etapa, categoria, plato) agrupados como en menu.json."""
+        for indice, (etapa, categoria) in enumerate(self.categorias, 1):
+            for plato_id in range(indice, self.cantidad_platos + 1, len(self.categorias)):
+                yield etapa, categoria, self.plato(plato_id)
+
+    def iter_mesas(self, cantidad, comensales=4, pedidos_por_cliente=5, ocupacion=0.7, platos=None):
+        """Recorre (mesa_id, [mesa]) con mesas ocupadas y pedidos en todos los estados del ciclo de vida.
+
+        Si se pasa `platos` (lista de platos del menú), los pedidos se toman de ahí en lugar del menú generado.
+        """
+        ahora = self.referencia.timestamp()
+        estados = list(RECORRIDOS_PEDIDO)
+        for numero in range(1, cantidad + 1):
+            aleatorio = self._aleatorio('mesa', numero)
+            ocupada = aleatorio.random() < ocupacion
+            mesa = {
+                'nombre': f'Mesa {numero}',
+                'qr_url': f'https://turestaurante.com/menu/mesa-{numero}',
+                'capacidad': comensales,
+                'estado': 'ocupada' if ocupada else 'libre',
+                'comentarios_camarero': [],
+                'notificaciones': []
+            }
+            for i in range(1, comensales + 1):
+                cliente = {'nombre': '', 'pedidos': [], 'contador_pedidos': 0}
+                if ocupada:
+                    cliente['nombre'] = f'Cliente {numero}-{i}'
+                    for n in range(1, pedidos_por_cliente + 1):
+                        plato = aleatorio.choice(platos) if platos else self.plato(aleatorio.randint(1, self.cantidad_platos))
+                        cliente['pedidos'].append(self._pedido(f'{numero:06d}_{i}_{n}', plato, aleatorio.choice(estados),
+                                                               ahora, aleatorio))
+                    cliente['contador_pedidos'] = pedidos_por_cliente
+                mesa[f'cliente_{i}'] = cliente
+            yield str(numero), [mesa]
+
+    def _pedido(self, pedido_id, plato, estado, ahora, aleatorio):
+        """Pedido con el historial de transiciones que corresponde a su estado."""
+        ts = ahora - aleatorio.uniform(600, 3600)
+        historial = []
+        for clave in RECORRIDOS_PEDIDO[estado]:
+            ts += aleatorio.uniform(30, 600)
+            historial.append({'estado': clave, 'clave': clave,
+                              'hora': datetime.fromtimestamp(ts).strftime('%H:%M hs'), 'ts': ts})
+        return {
+            'id': pedido_id,
+            'plato_id': plato['id'],
+            'nombre': plato['nombre'],
+            'cantidad': 1,
+            'precio': plato['precio'],
+            'hora': historial[0]['hora'],
+            'en_cocina': estado != 'creado',
+            'entregado': estado == 'entregado',
+            'estado_cocina': ETIQUETAS_COCINA[estado],
+            'hora_envio': historial[1]['hora'] if len(historial) > 1 else '',
+            'historial_estados': historial
+        }
+
+    def iter_tickets(self, desde, dias, tickets_por_dia=100, cantidad_mesas=20):
+        """Recorre los tickets de `dias` días a partir de `desde` (date), en orden cronológico."""
+        horas = list(PESOS_HORA)
+        pesos = list(PESOS_HORA.values())
+        for dia in range(dias):
+            fecha = desde + timedelta(days=dia)
+            aleatorio = self._aleatorio('dia', fecha.isoformat())
+            # Los fines de semana se vende más
+            cantidad = int(tickets_por_dia * (1.4 if fecha.weekday() >= 4 else 1) * aleatorio.uniform(0.8, 1.2))
+            momentos = sorted(
+                datetime(fecha.year, fecha.month, fecha.day, aleatorio.choices(horas, pesos)[0],
+                         aleatorio.randrange(60), aleatorio.randrange(60))
+                for _ in range(cantidad)
+            )
+            for momento in momentos:
+                yield self._ticket(momento, aleatorio, cantidad_mesas)
+
+    def _ticket(self, momento, aleatorio, cantidad_mesas):
+        mesa = aleatorio.randint(1, cantidad_mesas)
+        tipo_pago = aleatorio.choice(['individual', 'grupal'])
+        clientes = [f'Cliente {mesa}-{i}' for i in range(1, aleatorio.randint(1, 4) + 1)]
+        pedidos = []
+        for cliente in clientes:
+            for _ in range(aleatorio.randint(1, 4)):
+                plato = self.plato(aleatorio.randint(1, self.cantidad_platos))
+                cantidad = aleatorio.choice([1, 1, 1, 2])
+                pedidos.append({
+                    'cliente': cliente,
+                    'nombre': plato['nombre'],
+                    'cantidad': cantidad,
+                    'precio': plato['precio'],
+                    'subtotal': plato['precio'] * cantidad
+                })
+        return {
+            'mesa_id': str(mesa),
+            'mesa_nombre': f'Mesa {mesa}',
+            'fecha': momento.strftime('%Y-%m-%d %H:%M:%S'),
+            'tipo_pago': tipo_pago,
+            'metodo_pago': aleatorio.choice(['efectivo', 'tarjeta']),
+            'total': sum(p['subtotal'] for p in pedidos),
+            'cliente': clientes[0] if tipo_pago == 'individual' else 'Grupal',
+            'pedidos': pedidos
+        }
+
+    def escribir_menu(self, archivo):
+        """Escribe menu.json plato por plato."""
+        with open(archivo, 'w', encoding='utf-8') as f:
+            f.write('{"platos": {')
+            etapa_actual = categoria_actual = None
+            primero_en_categoria = True
+            for etapa, categoria, plato in self.iter_menu():
+                if etapa != etapa_actual:
+                    if etapa_actual is not None:
+                        f.write(']}, ')
+                    f.write(f'{json.dumps(etapa)}: {{')
+                    etapa_actual, categoria_actual = etapa, None
+                if categoria != categoria_actual:
+                    if categoria_actual is not None:
+                        f.write('], ')
+                    f.write(f'{json.dumps(categoria, ensure_ascii=False)}: [')
+                    categoria_actual, primero_en_categoria = categoria, True
+                f.write(('' if primero_en_categoria else ', ') + json.dumps(plato, ensure_ascii=False))
+                primero_en_categoria = False
+            if etapa_actual is not None:
+                f.write(']}')
+            f.write('}}')
+
+    def escribir_mesas(self, archivo, cantidad, **opciones):
+        """Escribe mesas.json mesa por mesa."""
+        with open(archivo, 'w', encoding='utf-8') as f:
+            f.write('{')
+            for indice, (mesa_id, mesa_data) in enumerate(self.iter_mesas(cantidad, **opciones)):
+                f.write(('\n' if indice == 0 else ',\n') + f'{json.dumps(mesa_id)}: {json.dumps(mesa_data, ensure_ascii=False)}')
+            f.write('\n}')
+
+    def escribir_historial(self, archivo, desde, dias, **opciones):
+        """Escribe historial.jsonl ticket por ticket y devuelve la cantidad escrita.
+
+        El índice (historial-v2.idx) lo arma la aplicación al iniciar.
+        """
+        cantidad = 0
+        with open(archivo, 'w', encoding='utf-8') as f:
+            for ticket in self.iter_tickets(desde, dias, **opciones):
+                f.write(json.dumps(ticket, ensure_ascii=False) + '\n')
+                cantidad += 1
+        return cantidad
+
+    def escribir_directorio(self, salida, mesas, comensales, pedidos_por_cliente, ocupacion,
+                            desde, dias, tickets_por_dia):
+        """Genera un directorio de datos completo, listo para usar con DEFINITY_DATA_DIR."""
+        os.makedirs(os.path.join(salida, 'historial_pagos'), exist_ok=True)
+        os.makedirs(os.path.join(salida, 'tickets'), exist_ok=True)
+        self.escribir_menu(os.path.join(salida, 'menu.json'))
+        self.escribir_mesas(os.path.join(salida, 'mesas.json'), mesas, comensales=comensales,
+                            pedidos_por_cliente=pedidos_por_cliente, ocupacion=ocupacion)
+        return self.escribir_historial(os.path.join(salida, 'historial_pagos', 'historial.jsonl'), desde, dias,
+                                       tickets_por_dia=tickets_por_dia, cantidad_mesas=mesas)
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera datos sintéticos con el formato de data/.')
+    parser.add_argument('--salida', required=True, help='Directorio donde escribir los archivos')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--platos', type=int, default=2000)
+    parser.add_argument('--ingredientes', type=int, default=300)
+    parser.add_argument('--mesas', type=int, default=100)
+    parser.add_argument('--comensales', type=int, default=4, help='Capacidad de cada mesa')
+    parser.add_argument('--pedidos', type=int, default=5, help='Pedidos por comensal en las mesas ocupadas')
+    parser.add_argument('--ocupacion', type=float, default=0.7, help='Fracción de mesas ocupadas')
+    parser.add_argument('--referencia', default=None, help='Fecha de referencia (YYYY-MM-DD HH:MM); por defecto, ahora')
+    parser.add_argument('--desde', default=None, help='Primer día del historial (YYYY-MM-DD); por defecto, --meses meses antes de la referencia')
+    parser.add_argument('--meses', type=int, default=3, help='Meses de historial de pagos')
+    parser.add_argument('--tickets-por-dia', type=int, default=100)
+    args = parser.parse_args()
+
+    dias = args.meses * 30
+    referencia = datetime.strptime(args.referencia, '%Y-%m-%d %H:%M') if args.referencia else datetime.now()
+    desde = (datetime.strptime(args.desde, '%Y-%m-%d') if args.desde else referencia - timedelta(days=dias)).date()
+    generador = GeneradorDatos(args.semilla, args.platos, args.ingredientes, referencia)
+    tickets = generador.escribir_directorio(args.salida, args.mesas, args.comensales, args.pedidos,
+                                            args.ocupacion, desde, dias, args.tickets_por_dia)
+    print(f"✅ Datos generados en {args.salida}: {args.platos} platos, {args.mesas} mesas, {tickets} tickets "
+          f"desde {desde.isoformat()}")
+
+if __name__ == '__main__':
+    main()
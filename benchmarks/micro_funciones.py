@@ -0,0 +1,247 @@
+"""Microbenchmarks de escalado del núcleo (funciones/).
+
+Llama directamente a métodos de SistemaMesas, SistemaPedidosCocina y SistemaPedidosMozos
+sobre estados sintéticos de 10, 100, 1.000 y 10.000 mesas con historiales de pedidos
+largos, guarda los resultados en JSON y los compara con una línea base.
+
+Uso:
+    python benchmarks/micro_funciones.py
+    python benchmarks/micro_funciones.py --tamanos 10 100 --json resultados.json
+    python benchmarks/micro_funciones.py --guardar-linea-base
+
+Sale con código 1 si alguna medición supera la línea base más la tolerancia.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from generador_datos import GeneradorDatos
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MENU_JSON = os.path.join(RAIZ, 'data', 'menu.json')
+LINEA_BASE_JSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'linea_base_micro.json')
+
+TAMANOS_POR_DEFECTO = [10, 100, 1000, 10000]
+TOLERANCIA_POR_DEFECTO = 0.25
+REINTENTOS_POR_DEFECTO = 2
+# Duración mínima de cada medición: por debajo, el reloj y la caché pesan más que la operación
+MINIMO_MEDICION_MS = 20
+
+def platos_del_menu(menu):
+    return [plato for etapa in menu['platos'].values() for platos in etapa.values() for plato in platos]
+
+def medir(funcion, repeticiones, tiempo_maximo):
+    """Ejecuta la función hasta `repeticiones` veces (o hasta agotar el tiempo) y devuelve los tiempos en ms.
+
+    Las operaciones muy cortas se llaman varias veces por medición (hasta sumar MINIMO_MEDICION_MS)
+    y se informa el tiempo por llamada, como hace timeit.
+    """
+    llamadas = 1
+    while True:
+        inicio = time.perf_counter()
+        for _ in range(llamadas):
+            funcion()
+        transcurrido = (time.perf_counter() - inicio) * 1000
+        if transcurrido >= MINIMO_MEDICION_MS:
+            break
+        llamadas *= 10
+    tiempos = [transcurrido / llamadas]
+    limite = time.perf_counter() + tiempo_maximo
+    while len(tiempos) < repeticiones and time.perf_counter() < limite:
+        inicio = time.perf_counter()
+        for _ in range(llamadas):
+            funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000 / llamadas)
+    return {
+        'mediana_ms': round(statistics.median(tiempos), 4),
+        'min_ms': round(min(tiempos), 4),
+        'repeticiones': len(tiempos)
+    }
+
+def calibrar():
+    """Carga fija de Python puro (diccionarios, cadenas y JSON) para medir la velocidad de la máquina."""
+    filas = [{'id': f'pedido_{i}', 'nombre': f'plato_{i % 50}', 'cantidad': i % 7, 'precio': i * 1.5}
+             for i in range(5000)]
+    agrupado = {}
+    for fila in filas:
+        agrupado[fila['nombre']] = agrupado.get(fila['nombre'], 0) + fila['cantidad'] * fila['precio']
+    json.dumps(filas)
+    return agrupado
+
+def medir_tamano(tamano, args, directorio, menu, modulos):
+    """Genera el estado para un tamaño, levanta los sistemas y mide cada operación."""
+    sistema_mesas_mod, cocina_mod, mozos_mod = modulos
+    # Los pedidos se arman con los platos del menú real, que es el que cargan los sistemas
+    generador = GeneradorDatos(semilla=args.semilla)
+    generador.escribir_mesas(os.path.join(directorio, 'mesas.json'), tamano, comensales=args.comensales,
+                             pedidos_por_cliente=args.pedidos, ocupacion=0.8, platos=platos_del_menu(menu))
+
+    silencio = io.StringIO()
+    with contextlib.redirect_stdout(silencio):
+        sistema_mesas = sistema_mesas_mod.SistemaMesas()
+        cocina = cocina_mod.SistemaPedidosCocina(sistema_mesas)
+        mozos = mozos_mod.SistemaPedidosMozos(sistema_mesas, sistema_cocina=cocina)
+
+    ids = [pedido['id'] for mesa_data in sistema_mesas.mesas.values()
+           for i in range(1, args.comensales + 1) for pedido in mesa_data[0][f'cliente_{i}']['pedidos']]
+    aleatorio = random.Random(f'{args.semilla}-{tamano}')
+    buscados = [aleatorio.choice(ids) for _ in range(args.busquedas)] if ids else []
+
+    def buscar_pedidos():
+        for pedido_id in buscados:
+            cocina.buscar_pedido(pedido_id)
+
+    operaciones = {
+        'guardar_mesas': sistema_mesas.guardar_mesas,
+        'mostrar_pedidos_activos': cocina.mostrar_pedidos_activos,
+        '_obtener_pedidos_listos_para_entregar': mozos._obtener_pedidos_listos_para_entregar,
+        'mostrar_menu_completo': sistema_mesas.mostrar_menu_completo,
+        'buscar_pedido': buscar_pedidos
+    }
+    resultados = {}
+    for nombre, funcion in operaciones.items():
+        # La calibración se mide antes y después de cada operación para seguir los cambios de carga
+        # de la máquina; se toma la más lenta de las dos
+        calibracion = medir(calibrar, args.repeticiones, args.tiempo_maximo)['min_ms']
+        with contextlib.redirect_stdout(silencio):
+            resultados[nombre] = medir(funcion, args.repeticiones, args.tiempo_maximo)
+        calibracion = max(calibracion, medir(calibrar, args.repeticiones, args.tiempo_maximo)['min_ms'])
+        resultados[nombre]['calibracion_ms'] = calibracion
+        silencio.seek(0)
+        silencio.truncate()
+    # La búsqueda se informa por pedido buscado
+    if buscados:
+        for clave in ('mediana_ms', 'min_ms'):
+            resultados['buscar_pedido'][clave] = round(resultados['buscar_pedido'][clave] / len(buscados), 6)
+    resultados['_pedidos_totales'] = len(ids)
+    return resultados
+
+def comparar(resultados, linea_base, tolerancia):
+    """Compara los mínimos con la línea base y devuelve las regresiones encontradas.
+
+    Se compara el mínimo y no la mediana, y cada relación se divide por la de la calibración:
+    en una máquina compartida la misma versión puede tardar el doble de una corrida a otra.
+    """
+    regresiones = []
+    for tamano, operaciones in resultados.items():
+        base_tamano = linea_base.get('resultados', {}).get(tamano, {})
+        for nombre, medicion in operaciones.items():
+            base = base_tamano.get(nombre)
+            if not isinstance(medicion, dict) or not base or not base.get('min_ms'):
+                continue
+            # Solo se descuenta una máquina más lenta que en la línea base: una calibración más rápida
+            # es ruido de la propia calibración y no debe hacer parecer más lenta a la operación
+            velocidad = 1
+            if base.get('calibracion_ms') and medicion.get('calibracion_ms'):
+                velocidad = max(1, medicion['calibracion_ms'] / base['calibracion_ms'])
+            relacion = medicion['min_ms'] / base['min_ms'] / velocidad
+            medicion['relacion_linea_base'] = round(relacion, 3)
+            if relacion > 1 + tolerancia:
+                regresiones.append((tamano, nombre, base['min_ms'], medicion['min_ms'], relacion))
+    return regresiones
+
+def combinar_mejores(operaciones, nuevas):
+    """Se queda, por operación, con la medición más rápida en relación con su calibración."""
+    for nombre, medicion in nuevas.items():
+        anterior = operaciones.get(nombre)
+        if not isinstance(medicion, dict) or not isinstance(anterior, dict):
+            continue
+        if medicion['min_ms'] / medicion['calibracion_ms'] < anterior['min_ms'] / anterior['calibracion_ms']:
+            operaciones[nombre] = medicion
+
+def imprimir_resultados(resultados):
+    print(f"\n{'Mesas':>7} {'Operación':<40} {'mediana ms':>12} {'min ms':>10} {'reps':>5} {'vs base':>8}")
+    for tamano, operaciones in resultados.items():
+        for nombre, medicion in operaciones.items():
+            if not isinstance(medicion, dict):
+                continue
+            relacion = medicion.get('relacion_linea_base')
+            print(f"{tamano:>7} {nombre:<40} {medicion['mediana_ms']:>12} {medicion['min_ms']:>10} "
+                  f"{medicion['repeticiones']:>5} {(f'x{relacion}' if relacion else '-'):>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmarks de escalado de funciones/.')
+    parser.add_argument('--tamanos', type=int, nargs='+', default=TAMANOS_POR_DEFECTO, help='Cantidades de mesas')
+    parser.add_argument('--comensales', type=int, default=4, help='Comensales por mesa')
+    parser.add_argument('--pedidos', type=int, default=10, help='Pedidos en el historial de cada comensal')
+    parser.add_argument('--busquedas', type=int, default=50, help='Pedidos buscados por id en cada repetición')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--tiempo-maximo', type=float, default=5.0, help='Segundos máximos por operación y tamaño')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--json', help='Archivo donde guardar los resultados')
+    parser.add_argument('--linea-base', default=LINEA_BASE_JSON, help='Archivo de línea base')
+    parser.add_argument('--guardar-linea-base', action='store_true', help='Guarda los resultados como nueva línea base')
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_POR_DEFECTO,
+                        help='Aumento relativo permitido sobre la línea base (0.25 = 25%%)')
+    parser.add_argument('--reintentos', type=int, default=REINTENTOS_POR_DEFECTO,
+                        help='Veces que se vuelve a medir un tamaño con regresiones antes de informarlas')
+    args = parser.parse_args()
+
+    directorio = tempfile.mkdtemp(prefix='definity_micro_')
+    os.makedirs(os.path.join(directorio, 'historial_pagos'), exist_ok=True)
+    shutil.copy(MENU_JSON, os.path.join(directorio, 'menu.json'))
+    os.environ['DEFINITY_DATA_DIR'] = directorio
+    sys.path.insert(0, RAIZ)
+    from funciones import sistema_mesas, sistema_pedidos_cocina, sistema_pedidos_mozos
+    with open(MENU_JSON, 'r', encoding='utf-8') as f:
+        menu = json.load(f)
+
+    linea_base = None
+    if not args.guardar_linea_base and os.path.exists(args.linea_base):
+        with open(args.linea_base, 'r', encoding='utf-8') as f:
+            linea_base = json.load(f)
+
+    modulos = (sistema_mesas, sistema_pedidos_cocina, sistema_pedidos_mozos)
+    resultados = {}
+    regresiones = []
+    try:
+        for tamano in args.tamanos:
+            print(f"Midiendo {tamano} mesas...", file=sys.stderr)
+            resultados[str(tamano)] = medir_tamano(tamano, args, directorio, menu, modulos)
+        if linea_base is not None:
+            regresiones = comparar(resultados, linea_base, args.tolerancia)
+            for _ in range(args.reintentos):
+                if not regresiones:
+                    break
+                # Una regresión real se repite; un pico de carga de la máquina no
+                for tamano in sorted({r[0] for r in regresiones}, key=int):
+                    print(f"Volviendo a medir {tamano} mesas...", file=sys.stderr)
+                    nuevos = medir_tamano(int(tamano), args, directorio, menu, modulos)
+                    combinar_mejores(resultados[tamano], nuevos)
+                regresiones = comparar(resultados, linea_base, args.tolerancia)
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    salida = {
+        'parametros': {k: v for k, v in vars(args).items() if k not in ('json', 'linea_base', 'guardar_linea_base')},
+        'entorno': {'python': platform.python_version(), 'plataforma': platform.platform()},
+        'resultados': resultados
+    }
+
+    if args.guardar_linea_base:
+        with open(args.linea_base, 'w', encoding='utf-8') as f:
+            json.dump(salida, f, indent=2, ensure_ascii=False)
+        print(f"Línea base guardada en {args.linea_base}", file=sys.stderr)
+
+    imprimir_resultados(resultados)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(salida, f, indent=2, ensure_ascii=False)
+
+    if regresiones:
+        print(f"\n⚠️ Regresiones (más de {args.tolerancia:.0%} sobre la línea base):")
+        for tamano, nombre, base, actual, relacion in regresiones:
+            print(f"  {tamano} mesas - {nombre}: {base} ms -> {actual} ms (x{relacion:.2f})")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+import atexit
 import os
 import sys
 import json
@@ -8,6 +9,8 @@ from .sistema_mesas import SistemaMesas
 from .sistema_pedidos_clientes import SistemaPedidosClientes
 from .sistema_pedidos_cocina import SistemaPedidosCocina
 from .sistema_pedidos_mozos import SistemaPedidosMozos
+from .archivo_tickets import ArchivoTickets
+from .cierre_caja import cierre_caja_compartido
 
 def exportar_datos(sistema):
     """Exporta los datos del sistema a un archivo JSON"""
@@ -53,9 +56,14 @@ def importar_datos(sistema):
 
 def iniciar_sistema():
     sistema = SistemaMesas()
-    sistema_pedidos_clientes = SistemaPedidosClientes(sistema)
-    sistema_pedidos_cocina = SistemaPedidosCocina(sistema)
-    sistema_pedidos_mozos = SistemaPedidosMozos(sistema)
+    cierre_caja = cierre_caja_compartido(sistema)
+    sistema_pedidos_cocina = SistemaPedidosCocina(sistema, cierre_caja=cierre_caja)
+    archivo_tickets = ArchivoTickets()
+    sistema_pedidos_clientes = SistemaPedidosClientes(sistema, sistema_cocina=sistema_pedidos_cocina, archivo_tickets=archivo_tickets, cierre_caja=cierre_caja)
+    sistema_pedidos_mozos = SistemaPedidosMozos(sistema, sistema_cocina=sistema_pedidos_cocina, archivo_tickets=archivo_tickets, cierre_caja=cierre_caja)
+    sistema_pedidos_cocina.monitor_retrasos.iniciar()
+    sistema_pedidos_mozos.cola_tareas.iniciar()
+    atexit.register(sistema_pedidos_mozos.cola_tareas.detener)
     
     while True:
         try:
@@ -0,0 +1,152 @@
+import copy
+import math
+import numbers
+
+ETAPAS_MENU = ('entrada', 'principal', 'postre', 'bebida')
+
+# Campos de un plato que se pueden cargar o modificar y el tipo que deben tener
+CAMPOS_PLATO = {
+    'nombre': str,
+    'descripcion': str,
+    'precio': numbers.Real,
+    'dietas': list,
+    'ingredientes': list,
+    'disponible': bool
+}
+
+def _validar_texto(valor, campo):
+    if not isinstance(valor, str) or not valor.strip():
+        raise ValueError(f"El campo '{campo}' debe ser un texto no vacío")
+    return valor.strip()
+
+def validar_cambios_plato(cambios, completo=False):
+    """Valida los campos de un plato y devuelve una copia normalizada. Con completo=True exige nombre y precio."""
+    desconocidos = set(cambios) - set(CAMPOS_PLATO)
+    if desconocidos:
+        raise ValueError(f"Campos desconocidos: {', '.join(sorted(desconocidos))}")
+    if completo and not {'nombre', 'precio'} <= set(cambios):
+        raise ValueError("El plato necesita 'nombre' y 'precio'")
+    validados = {}
+    for campo, valor in cambios.items():
+        tipo = CAMPOS_PLATO[campo]
+        # bool es un int para Python: un precio True no es válido
+        if not isinstance(valor, tipo) or (tipo is not bool and isinstance(valor, bool)):
+            raise ValueError(f"Tipo inválido para '{campo}'")
+        if campo == 'nombre':
+            valor = _validar_texto(valor, campo)
+        elif campo == 'precio' and not math.isfinite(valor):
+            # NaN e Infinity no son JSON válido para el navegador
+            raise ValueError("El precio debe ser un número finito")
+        elif campo == 'precio' and valor < 0:
+            raise ValueError("El precio no puede ser negativo")
+        elif tipo is list:
+            valor = [_validar_texto(elemento, campo) for elemento in valor]
+        validados[campo] = valor
+    return validados
+
+class AdministradorMenu:
+    """Altas, bajas y cambios de platos y categorías del menú.
+
+    Cada operación valida los datos, modifica una sola categoría a través de
+    SistemaMesas.modificar_categoria_menu (escritura atómica de menu.json y versión nueva)
+    y devuelve lo modificado junto con la versión del menú.
+    """
+
+    def __init__(self, sistema_mesas):
+        self.sistema_mesas = sistema_mesas
+
+    def _ubicar(self, instantanea, plato_id):
+        """Devuelve (id, etapa, categoría) del plato; acepta el id como texto aunque en el menú sea numérico."""
+        plato = instantanea.platos_por_id.get(str(plato_id))
+        if plato is None:
+            raise KeyError(plato_id)
+        return plato['id'], instantanea.etapas[plato['id']], instantanea.categorias[plato['id']]
+
+    def _validar_ubicacion(self, etapa, categoria):
+        if etapa not in ETAPAS_MENU:
+            raise ValueError(f"Etapa inválida: {etapa} (use {', '.join(ETAPAS_MENU)})")
+        return _validar_texto(categoria, 'categoria')
+
+    def crear_plato(self, etapa, categoria, datos):
+        """Agrega un plato a una categoría existente y le asigna el siguiente id numérico (nunca uno ya usado)."""
+        categoria = self._validar_ubicacion(etapa, categoria)
+        plato = validar_cambios_plato(datos, completo=True)
+        plato.setdefault('descripcion', '')
+        plato.setdefault('dietas', [])
+        plato.setdefault('ingredientes', [])
+        plato.setdefault('disponible', True)
+
+        def agregar(platos, instantanea):
+            if categoria not in instantanea.menu['platos'].get(etapa, {}):
+                raise ValueError(f"No existe la categoría {categoria} en {etapa}")
+            plato['id'] = instantanea.siguiente_id
+            return platos + [plato]
+
+        instantanea = self.sistema_mesas.modificar_categoria_menu(etapa, categoria, agregar)
+        return {'plato': plato, 'etapa': etapa, 'categoria': categoria, 'version': instantanea.version}
+
+    def actualizar_plato(self, plato_id, cambios):
+        """Modifica los campos indicados de un plato (precio, disponibilidad, nombre, etc.)."""
+        if not cambios:
+            raise ValueError("No se indicaron cambios")
+        cambios = validar_cambios_plato(cambios)
+        plato_id, etapa, categoria = self._ubicar(self.sistema_mesas.instantanea_menu(), plato_id)
+        modificado = {}
+
+        def actualizar(platos, instantanea):
+            for posicion, plato in enumerate(platos):
+                if plato.get('id') == plato_id:
+                    # Copia: la instantánea anterior sigue viendo el plato como estaba
+                    nuevo = copy.deepcopy(plato)
+                    nuevo.update(cambios)
+                    platos[posicion] = nuevo
+                    modificado['plato'] = nuevo
+                    return platos
+            raise KeyError(plato_id)
+
+        instantanea = self.sistema_mesas.modificar_categoria_menu(etapa, categoria, actualizar)
+        return {'plato': modificado['plato'], 'etapa': etapa, 'categoria': categoria, 'version': instantanea.version}
+
+    def cambiar_precio(self, plato_id, precio):
+        return self.actualizar_plato(plato_id, {'precio': precio})
+
+    def cambiar_disponibilidad(self, plato_id, disponible):
+        return self.actualizar_plato(plato_id, {'disponible': disponible})
+
+    def eliminar_plato(self, plato_id):
+        """Quita un plato del menú."""
+        plato_id, etapa, categoria = self._ubicar(self.sistema_mesas.instantanea_menu(), plato_id)
+
+        def quitar(platos, instantanea):
+            restantes = [plato for plato in platos if plato.get('id') != plato_id]
+            if len(restantes) == len(platos):
+                raise KeyError(plato_id)
+            return restantes
+
+        instantanea = self.sistema_mesas.modificar_categoria_menu(etapa, categoria, quitar)
+        return {'id': plato_id, 'version': instantanea.version}
+
+    def crear_categoria(self, etapa, categoria):
+        """Agrega una categoría vacía a una etapa."""
+        categoria = self._validar_ubicacion(etapa, categoria)
+
+        def crear(platos, instantanea):
+            if categoria in instantanea.menu['platos'].get(etapa, {}):
+                raise ValueError(f"Ya existe la categoría {categoria} en {etapa}")
+            return []
+
+        instantanea = self.sistema_mesas.modificar_categoria_menu(etapa, categoria, crear)
+        return {'etapa': etapa, 'categoria': categoria, 'version': instantanea.version}
+
+    def eliminar_categoria(self, etapa, categoria):
+        """Quita una categoría; solo si no tiene platos."""
+
+        def eliminar(platos, instantanea):
+            if categoria not in instantanea.menu['platos'].get(etapa, {}):
+                raise KeyError(categoria)
+            if platos:
+                raise ValueError(f"La categoría {categoria} tiene {len(platos)} platos; elimínelos primero")
+            return None
+
+        instantanea = self.sistema_mesas.modificar_categoria_menu(etapa, categoria, eliminar)
+        return {'etapa': etapa, 'categoria': categoria, 'version': instantanea.version}
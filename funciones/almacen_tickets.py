@@ -0,0 +1,189 @@
+import bisect
+import logging
+from array import array
+from datetime import datetime, date
+
+logger = logging.getLogger(__name__)
+
+LIMITE_FILAS_POR_DEFECTO = 1_000_000
+# Días del historial que se cargan en memoria; los rangos anteriores se suman leyendo el historial
+DIAS_EN_MEMORIA = 90
+# Tickets por bloque al sumar un rango leyendo el historial (la memoria no depende del largo del rango)
+TICKETS_POR_BLOQUE = 10_000
+
+class AlmacenColumnarTickets:
+    """Almacén en memoria de líneas de ticket guardadas en columnas tipadas."""
+
+    COLUMNAS_AGRUPABLES = ('plato', 'cliente', 'metodo_pago', 'dia', 'hora')
+    MEDIDAS = ('subtotal', 'cantidad', 'lineas')
+
+    def __init__(self, tickets=None, limite_filas=LIMITE_FILAS_POR_DEFECTO, desde=None):
+        """Inicializa las columnas vacías y carga los tickets recibidos.
+
+        `desde` es el timestamp desde el que los tickets cargados están completos (None: todos).
+        """
+        self.limite_filas = limite_filas
+        self.desde_ts = desde
+
+        # Columnas paralelas: la fila i de cada arreglo corresponde a la misma línea de ticket
+        self.ts = array('d')
+        self.dia = array('l')
+        self.hora = array('b')
+        self.plato = array('l')
+        self.cliente = array('l')
+        self.metodo_pago = array('l')
+        self.cantidad = array('l')
+        self.precio = array('d')
+        self.subtotal = array('d')
+
+        # Diccionarios de codificación (valor -> código y código -> valor)
+        self.diccionarios = {'plato': [], 'cliente': [], 'metodo_pago': []}
+        self._codigos = {'plato': {}, 'cliente': {}, 'metodo_pago': {}}
+        self._ordenado = True
+
+        for ticket in tickets or []:
+            self.agregar_ticket(ticket)
+
+    def __len__(self):
+        return len(self.ts)
+
+    def cubre(self, desde):
+        """Indica si las filas en memoria alcanzan para un rango que empieza en `desde` (None: todo el historial)."""
+        return self.desde_ts is None or (desde is not None and desde >= self.desde_ts)
+
+    def _codificar(self, columna, valor):
+        """Devuelve el código entero de un valor, registrándolo si es nuevo."""
+        codigos = self._codigos[columna]
+        codigo = codigos.get(valor)
+        if codigo is None:
+            codigo = len(self.diccionarios[columna])
+            codigos[valor] = codigo
+            self.diccionarios[columna].append(valor)
+        return codigo
+
+    def agregar_ticket(self, ticket):
+        """Agrega las líneas de un ticket al final de las columnas."""
+        try:
+            fecha = datetime.strptime(ticket['fecha'], '%Y-%m-%d %H:%M:%S')
+        except (KeyError, TypeError, ValueError):
+            logger.warning("Ticket sin fecha válida, no se agrega al almacén columnar")
+            return False
+
+        ts = fecha.timestamp()
+        metodo = self._codificar('metodo_pago', str(ticket.get('metodo_pago', 'desconocido')).lower())
+        dia = fecha.toordinal()
+
+        # Las líneas se convierten primero a columnas propias del ticket: si una no se puede
+        # convertir, el ticket se descarta entero y las columnas del almacén siguen alineadas
+        nuevas = [array(columna.typecode) for columna in self._columnas()]
+        try:
+            for pedido in ticket.get('pedidos', []):
+                cantidad = pedido.get('cantidad', 1)
+                precio = pedido.get('precio', 0)
+                fila = (ts, dia, fecha.hour,
+                        self._codificar('plato', pedido.get('nombre', 'Desconocido')),
+                        self._codificar('cliente', pedido.get('cliente', ticket.get('cliente', ''))),
+                        metodo, cantidad, precio, pedido.get('subtotal', precio * cantidad))
+                for columna, valor in zip(nuevas, fila):
+                    columna.append(valor)
+        except (AttributeError, TypeError, ValueError, OverflowError) as e:
+            logger.warning("Ticket %s con líneas inválidas, no se agrega al almacén columnar: %s", ticket.get('numero'), e)
+            return False
+
+        if nuevas[0] and self.ts and ts < self.ts[-1]:
+            self._ordenado = False
+        for columna, nueva in zip(self._columnas(), nuevas):
+            columna.extend(nueva)
+
+        if self.limite_filas is not None and len(self.ts) > self.limite_filas:
+            self._descartar_mas_antiguas(len(self.ts) - self.limite_filas)
+        return True
+
+    def _columnas(self):
+        return (self.ts, self.dia, self.hora, self.plato, self.cliente,
+                self.metodo_pago, self.cantidad, self.precio, self.subtotal)
+
+    def _descartar_mas_antiguas(self, cantidad):
+        """Descarta las filas más antiguas para respetar el límite de memoria."""
+        if not self._ordenado:
+            self._ordenar()
+        # Se descarta al menos un 10% para no desplazar los arreglos en cada alta, sin cortar un mismo instante
+        cantidad = max(cantidad, self.limite_filas // 10)
+        while cantidad < len(self.ts) and self.ts[cantidad] == self.ts[cantidad - 1]:
+            cantidad += 1
+        for columna in self._columnas():
+            del columna[:cantidad]
+        # Lo anterior a la primera fila que queda ya no está completo en memoria
+        self.desde_ts = self.ts[0] if self.ts else float('inf')
+
+    def _ordenar(self):
+        """Reordena todas las columnas por fecha (solo si llegaron tickets desordenados)."""
+        orden = sorted(range(len(self.ts)), key=self.ts.__getitem__)
+        for columna in self._columnas():
+            reordenada = array(columna.typecode, (columna[i] for i in orden))
+            columna[:] = reordenada
+        self._ordenado = True
+
+    def _rango_filas(self, desde=None, hasta=None):
+        """Obtiene el rango [inicio, fin) de filas entre dos timestamps."""
+        if not self._ordenado:
+            self._ordenar()
+        inicio = bisect.bisect_left(self.ts, desde) if desde is not None else 0
+        fin = bisect.bisect_left(self.ts, hasta) if hasta is not None else len(self.ts)
+        return inicio, fin
+
+    def sumar_por(self, columna, medida='subtotal', desde=None, hasta=None):
+        """Agrupa las filas del rango por una columna y suma la medida indicada."""
+        if columna not in self.COLUMNAS_AGRUPABLES:
+            raise ValueError(f"Columna de agrupación inválida: {columna}")
+        if medida not in self.MEDIDAS:
+            raise ValueError(f"Medida inválida: {medida}")
+
+        inicio, fin = self._rango_filas(desde, hasta)
+        claves = getattr(self, columna)[inicio:fin]
+        valores = [1] * (fin - inicio) if medida == 'lineas' else getattr(self, medida)[inicio:fin]
+
+        if columna in self.diccionarios:
+            # Acumulación sobre una lista indexada por código, sin hashing por fila
+            acumulado = [0] * len(self.diccionarios[columna])
+            for codigo, valor in zip(claves, valores):
+                acumulado[codigo] += valor
+            nombres = self.diccionarios[columna]
+            return {nombres[codigo]: total for codigo, total in enumerate(acumulado) if total}
+
+        if columna == 'hora':
+            acumulado = [0] * 24
+            for hora, valor in zip(claves, valores):
+                acumulado[hora] += valor
+            return {f"{hora:02d}:00": total for hora, total in enumerate(acumulado) if total}
+
+        acumulado = {}
+        for dia, valor in zip(claves, valores):
+            acumulado[dia] = acumulado.get(dia, 0) + valor
+        return {date.fromordinal(dia).isoformat(): total for dia, total in sorted(acumulado.items())}
+
+    @classmethod
+    def sumar_por_bloques(cls, tickets, columna, medida='subtotal', desde=None, hasta=None):
+        """Como sumar_por, pero sobre tickets leídos en streaming, de a TICKETS_POR_BLOQUE por vez."""
+        total = cls().sumar_por(columna, medida)
+        bloque = cls(limite_filas=None)
+        cantidad = 0
+        for ticket in tickets:
+            bloque.agregar_ticket(ticket)
+            cantidad += 1
+            if cantidad == TICKETS_POR_BLOQUE:
+                cls._acumular(total, bloque.sumar_por(columna, medida, desde, hasta))
+                bloque, cantidad = cls(limite_filas=None), 0
+        cls._acumular(total, bloque.sumar_por(columna, medida, desde, hasta))
+        if columna in ('dia', 'hora'):
+            return dict(sorted(total.items()))
+        return total
+
+    @staticmethod
+    def _acumular(total, parcial):
+        for clave, valor in parcial.items():
+            total[clave] = total.get(clave, 0) + valor
+
+    def memoria_bytes(self):
+        """Estima la memoria ocupada por las columnas."""
+        return sum(columna.itemsize * len(columna) for columna in self._columnas())
@@ -0,0 +1,373 @@
+import gzip
+import logging
+import os
+import shutil
+import struct
+import threading
+from array import array
+from datetime import datetime
+from .sistema_mesas import TICKETS_DIR
+
+logger = logging.getLogger(__name__)
+
+INDICE_TICKETS = 'indice_tickets.idx'
+FORMATO_FECHA = '%Y-%m-%d %H:%M:%S'
+
+# Una entrada por ticket, en orden de número: fecha (timestamp), día (AAAAMMDD), posición y largo
+# dentro del segmento del día, si el segmento ya está comprimido y la mesa
+REGISTRO_TICKET = struct.Struct('<dIqIB16s')
+REGISTROS_POR_LECTURA = 4096
+# Números de los tickets de cada segmento (tickets_AAAAMMDD.num), en el orden en que llegaron
+TIPO_NUMERO = 'I'
+# Números de los tickets de cada mesa (mesas/<mesa>.num), en orden creciente
+DIRECTORIO_MESAS = 'mesas'
+# Línea del texto con la clave del pago: un ticket con clave ya archivada no se vuelve a archivar
+PREFIJO_CLAVE = 'Referencia: '
+
+def formatear_ticket(ticket):
+    """Texto imprimible del ticket (mismo formato para clientes y mozos)."""
+    fecha = datetime.strptime(ticket['fecha'], FORMATO_FECHA)
+    contenido = [
+        "=" * 40,
+        "           TICKET DE PAGO",
+        "=" * 40,
+        f"Ticket N°: {ticket['numero']:08d}" if ticket.get('numero') else None,
+        f"{PREFIJO_CLAVE}{ticket['clave']}" if ticket.get('clave') else None,
+        f"\nMesa: {ticket['mesa_nombre']}",
+        f"Fecha: {fecha.strftime('%d/%m/%Y %H:%M')}",
+        "-" * 40,
+        "\nClientes:"
+    ]
+    clientes = ticket.get('clientes') or sorted({pedido['cliente'] for pedido in ticket['pedidos']})
+    for cliente in clientes:
+        contenido.append(f"- {cliente}")
+
+    contenido.extend([
+        "\nDETALLE DE PEDIDOS:",
+        "-" * 40
+    ])
+    # Agrupar pedidos por cliente
+    pedidos_por_cliente = {}
+    for pedido in ticket['pedidos']:
+        pedidos_por_cliente.setdefault(pedido['cliente'], []).append(pedido)
+    for pedidos in pedidos_por_cliente.values():
+        for pedido in pedidos:
+            if pedido['cantidad'] > 1:
+                contenido.extend([
+                    f"{pedido['cantidad']}x {pedido['nombre']}",
+                    f"   Precio unitario: ${pedido['precio']}",
+                    f"   Subtotal: ${pedido['subtotal']}\n"
+                ])
+            else:
+                contenido.append(f"{pedido['cantidad']}x {pedido['nombre']} - ${pedido['precio']}\n")
+
+    contenido.extend([
+        "-" * 40,
+        f"TOTAL A PAGAR: ${ticket['total']}",
+        f"Método de pago: {str(ticket['metodo_pago']).capitalize()}",
+        "=" * 40,
+        "¡Gracias por su visita!",
+        "=" * 40
+    ])
+    return '\n'.join(linea for linea in contenido if linea is not None) + '\n'
+
+class ArchivoTickets:
+    """Archivo de tickets numerados: un segmento de texto por día, comprimido al rotar, y un índice por número.
+
+    El índice tiene un registro de tamaño fijo por ticket, así que un ticket se lee por número
+    sin recorrer el directorio. Cada segmento tiene además la lista de números de sus tickets
+    (tickets_AAAAMMDD.num): la rotación y la búsqueda por día usan esa lista, así que un ticket
+    que llega tarde (con fecha de un día ya rotado) se agrega a su día y se comprime igual.
+    La búsqueda por mesa usa otra lista de números por mesa (mesas/<mesa>.num).
+    Los segmentos se comprimen ticket por ticket (cada ticket es un miembro gzip independiente),
+    lo que permite seguir leyendo uno solo.
+    """
+
+    def __init__(self, directorio=TICKETS_DIR):
+        self.directorio = directorio
+        self.archivo_indice = os.path.join(directorio, INDICE_TICKETS)
+        self._lock = threading.Lock()
+        # Claves de pago -> número, por día (se arman al archivar el primer ticket con clave del día)
+        self._claves = {}
+        self.directorio_mesas = os.path.join(directorio, DIRECTORIO_MESAS)
+        os.makedirs(directorio, exist_ok=True)
+        with self._lock:
+            self._reparar_indice()
+            if not os.path.isdir(self.directorio_mesas):
+                self._indexar_mesas()
+            # Día más reciente con tickets: los segmentos anteriores ya no reciben tickets del día
+            dias = [int(nombre[len('tickets_'):-len('.num')]) for nombre in os.listdir(directorio)
+                    if nombre.startswith('tickets_') and nombre.endswith('.num')
+                    and nombre[len('tickets_'):-len('.num')].isdigit()]
+            self._dia_activo = max(dias, default=None)
+            self._rotar_pendientes()
+
+    def __len__(self):
+        try:
+            return os.path.getsize(self.archivo_indice) // REGISTRO_TICKET.size
+        except OSError:
+            return 0
+
+    def _segmento(self, dia, comprimido):
+        return os.path.join(self.directorio, f"tickets_{dia}.txt" + ('.gz' if comprimido else ''))
+
+    def _archivo_numeros(self, dia):
+        return os.path.join(self.directorio, f"tickets_{dia}.num")
+
+    def _archivo_mesa(self, mesa):
+        """Lista de números de una mesa (mesa: los bytes guardados en el índice)."""
+        nombre = mesa.rstrip(b'\0').decode('utf-8')
+        if not (nombre.isascii() and nombre.replace('_', '').replace('-', '').isalnum()):
+            # Un id que no sirve como nombre de archivo se guarda en hexadecimal
+            nombre = 'x' + mesa.rstrip(b'\0').hex()
+        return os.path.join(self.directorio_mesas, f"{nombre}.num")
+
+    def _leer_numeros(self, archivo):
+        """Números guardados en una lista (.num); descarta un número cortado al final."""
+        numeros = array(TIPO_NUMERO)
+        if os.path.exists(archivo):
+            with open(archivo, 'rb') as f:
+                datos = f.read()
+            numeros.frombytes(datos[:len(datos) - len(datos) % numeros.itemsize])
+        return numeros
+
+    def _indexar_mesas(self):
+        """Arma las listas por mesa a partir del índice (archivo de una versión que no las tenía)."""
+        temporal = self.directorio_mesas + '.temp'
+        shutil.rmtree(temporal, ignore_errors=True)
+        os.makedirs(temporal)
+        por_mesa = {}
+        total = len(self)
+        for desde in range(0, total, REGISTROS_POR_LECTURA):
+            for desplazamiento, registro in enumerate(self._leer_rango(desde, min(total, desde + REGISTROS_POR_LECTURA))):
+                por_mesa.setdefault(registro[5], array(TIPO_NUMERO)).append(desde + desplazamiento + 1)
+        for mesa, numeros in por_mesa.items():
+            archivo = os.path.join(temporal, os.path.basename(self._archivo_mesa(mesa)))
+            with open(archivo, 'ab') as f:
+                f.write(numeros.tobytes())
+        os.replace(temporal, self.directorio_mesas)
+        if total:
+            logger.info("Listas de tickets por mesa armadas (%s mesas, %s tickets)", len(por_mesa), total)
+
+    def _leer(self, posicion):
+        """Registro del índice en la posición dada (el ticket número posicion + 1)."""
+        with open(self.archivo_indice, 'rb') as f:
+            f.seek(posicion * REGISTRO_TICKET.size)
+            return REGISTRO_TICKET.unpack(f.read(REGISTRO_TICKET.size))
+
+    def _leer_rango(self, inicio, fin):
+        with open(self.archivo_indice, 'rb') as f:
+            f.seek(inicio * REGISTRO_TICKET.size)
+            return list(REGISTRO_TICKET.iter_unpack(f.read((fin - inicio) * REGISTRO_TICKET.size)))
+
+    def _reparar_indice(self):
+        """Descarta un registro cortado al final del índice (corte durante una escritura)."""
+        if not os.path.exists(self.archivo_indice):
+            return
+        tamano = os.path.getsize(self.archivo_indice)
+        if tamano % REGISTRO_TICKET.size:
+            logger.warning("Índice de tickets con un registro incompleto, se descarta")
+            with open(self.archivo_indice, 'r+b') as f:
+                f.truncate(tamano - tamano % REGISTRO_TICKET.size)
+
+    def _registros_dia(self, dia):
+        """Lista de (número, registro) de los tickets del segmento de un día, en orden de llegada.
+
+        Los números se escriben antes que el índice: un número sin registro, o cuyo registro es
+        de otro día (corte entre las dos escrituras), se ignora.
+        """
+        numeros = self._leer_numeros(self._archivo_numeros(dia))
+        total = len(self)
+        registros = []
+        if not numeros:
+            return registros
+        with open(self.archivo_indice, 'rb') as f:
+            for numero in numeros:
+                if not 1 <= numero <= total:
+                    continue
+                f.seek((numero - 1) * REGISTRO_TICKET.size)
+                registro = REGISTRO_TICKET.unpack(f.read(REGISTRO_TICKET.size))
+                if registro[1] == dia:
+                    registros.append((numero, registro))
+        return registros
+
+    def _texto(self, registro):
+        _, dia, posicion, largo, comprimido, _ = registro
+        with open(self._segmento(dia, comprimido), 'rb') as f:
+            f.seek(posicion)
+            datos = f.read(largo)
+        if comprimido:
+            datos = gzip.decompress(datos)
+        return datos.decode('utf-8')
+
+    def _claves_dia(self, dia):
+        """Claves de pago de los tickets de un día, leídas del texto la primera vez que se piden."""
+        if dia not in self._claves:
+            claves = {}
+            for numero, registro in self._registros_dia(dia):
+                for linea in self._texto(registro).splitlines():
+                    if linea.startswith(PREFIJO_CLAVE):
+                        claves[linea[len(PREFIJO_CLAVE):]] = numero
+                        break
+            self._claves[dia] = claves
+        return self._claves[dia]
+
+    def _rotar_pendientes(self):
+        """Comprime los segmentos de días anteriores que quedaron sin comprimir."""
+        hoy = int(datetime.now().strftime('%Y%m%d'))
+        for nombre in sorted(os.listdir(self.directorio)):
+            if nombre.startswith('tickets_') and nombre.endswith('.txt'):
+                dia = nombre[len('tickets_'):-len('.txt')]
+                if dia.isdigit() and int(dia) < hoy:
+                    self._rotar(int(dia))
+
+    def _rotar(self, dia):
+        """Comprime los tickets del segmento de un día que siguen sin comprimir y actualiza el índice.
+
+        El segmento de texto se borra solo si todos sus tickets quedaron comprimidos.
+        """
+        plano = self._segmento(dia, False)
+        if not os.path.exists(plano):
+            return
+        try:
+            registros = [(numero, registro) for numero, registro in self._registros_dia(dia) if not registro[4]]
+            if registros:
+                comprimido = self._segmento(dia, True)
+                temporal = comprimido + '.temp'
+                nuevos = []
+                # Si ya había una parte comprimida (día ya rotado o rotación interrumpida), se agrega a continuación
+                with open(plano, 'rb') as f_plano, open(temporal, 'wb') as f_gz:
+                    if os.path.exists(comprimido):
+                        with open(comprimido, 'rb') as f_previo:
+                            f_gz.write(f_previo.read())
+                    for numero, (ts, _, posicion, largo, _, mesa) in registros:
+                        f_plano.seek(posicion)
+                        bloque = gzip.compress(f_plano.read(largo))
+                        nuevos.append((numero, REGISTRO_TICKET.pack(ts, dia, f_gz.tell(), len(bloque), 1, mesa)))
+                        f_gz.write(bloque)
+                os.replace(temporal, comprimido)
+                # Recién con el segmento comprimido en su lugar se actualiza el índice
+                with open(self.archivo_indice, 'r+b') as f_indice:
+                    for numero, registro in nuevos:
+                        f_indice.seek((numero - 1) * REGISTRO_TICKET.size)
+                        f_indice.write(registro)
+            pendientes = [numero for numero, registro in self._registros_dia(dia) if not registro[4]]
+            if pendientes:
+                logger.error("Segmento de tickets %s: %s tickets siguen sin comprimir, no se borra", dia, len(pendientes))
+                return
+            os.remove(plano)
+            logger.info("Segmento de tickets %s comprimido (%s tickets)", dia, len(registros))
+        except Exception as e:
+            logger.error("Error al comprimir el segmento de tickets %s: %s", dia, e)
+
+    def agregar(self, ticket):
+        """Numera el ticket (ticket['numero']), lo agrega al segmento de su día y devuelve el número.
+
+        Un ticket con fecha de un día anterior al último (llegó tarde, por ejemplo desde la cola
+        de tareas) va al segmento de su día, que se vuelve a comprimir enseguida. Un ticket con
+        clave de pago ya archivada (la cola de tareas repite una tarea cortada) no se vuelve a
+        agregar: se devuelve el número que ya tenía.
+        """
+        with self._lock:
+            fecha = datetime.strptime(ticket['fecha'], FORMATO_FECHA)
+            dia = int(fecha.strftime('%Y%m%d'))
+            clave = ticket.get('clave')
+            if clave:
+                numero = self._claves_dia(dia).get(clave)
+                if numero:
+                    ticket['numero'] = numero
+                    return numero
+
+            numero = len(self) + 1
+            ticket['numero'] = numero
+            datos = formatear_ticket(ticket).encode('utf-8')
+            # Orden de escritura: segmento, números del día y de la mesa, e índice. Si se corta en el
+            # medio, el texto o los números quedan sin registro en el índice y nunca se devuelven
+            with open(self._segmento(dia, False), 'ab') as f:
+                posicion = f.seek(0, os.SEEK_END)
+                f.write(datos)
+            mesa = str(ticket.get('mesa_id', '')).encode('utf-8')[:16]
+            for archivo in (self._archivo_numeros(dia), self._archivo_mesa(mesa)):
+                with open(archivo, 'ab') as f_numeros:
+                    f_numeros.write(array(TIPO_NUMERO, [numero]).tobytes())
+            with open(self.archivo_indice, 'ab') as f_indice:
+                f_indice.write(REGISTRO_TICKET.pack(fecha.timestamp(), dia, posicion, len(datos), 0, mesa))
+            if clave:
+                self._claves[dia][clave] = numero
+
+            # Solo se guardan las claves del día activo: las de un día rotado se vuelven a leer si hacen falta
+            if self._dia_activo is None or dia > self._dia_activo:
+                anterior, self._dia_activo = self._dia_activo, dia
+                if anterior is not None:
+                    self._rotar(anterior)
+                    self._claves.pop(anterior, None)
+            elif dia < self._dia_activo:
+                self._rotar(dia)
+                self._claves.pop(dia, None)
+            return numero
+
+    def _entrada(self, numero, registro):
+        ts, dia, _, _, comprimido, mesa = registro
+        return {
+            'numero': numero,
+            'mesa_id': mesa.rstrip(b'\0').decode('utf-8'),
+            'fecha': datetime.fromtimestamp(ts).strftime(FORMATO_FECHA),
+            'comprimido': bool(comprimido)
+        }
+
+    def obtener(self, numero):
+        """Devuelve la entrada del ticket con su texto, o None si el número no existe."""
+        with self._lock:
+            if not 1 <= numero <= len(self):
+                return None
+            registro = self._leer(numero - 1)
+            return {**self._entrada(numero, registro), 'texto': self._texto(registro)}
+
+    def buscar(self, mesa_id=None, fecha=None, limite=100):
+        """Lista los tickets (sin texto) de una mesa y/o de un día (YYYY-MM-DD), del más nuevo al más viejo.
+
+        Solo lee el índice: con fecha, los registros de los números del día; con mesa, los de
+        los números de la mesa; sin ninguna de las dos, por bloques desde el final.
+        """
+        resultado = []
+
+        def agregar(numero, registro):
+            if mesa_id is not None and registro[5].rstrip(b'\0').decode('utf-8') != str(mesa_id):
+                return
+            resultado.append(self._entrada(numero, registro))
+
+        with self._lock:
+            if fecha:
+                dia = int(datetime.strptime(fecha, '%Y-%m-%d').strftime('%Y%m%d'))
+                for numero, registro in sorted(self._registros_dia(dia), reverse=True):
+                    agregar(numero, registro)
+                    if len(resultado) >= limite:
+                        break
+                return resultado
+            if mesa_id is not None:
+                mesa = str(mesa_id).encode('utf-8')[:16]
+                total = len(self)
+                # Un número que quedó sin registro (corte al agregar) puede repetirse más adelante
+                # con otro ticket: se recorre hacia atrás aceptando solo números decrecientes
+                anterior = total + 1
+                with open(self.archivo_indice, 'rb') as f:
+                    for numero in reversed(self._leer_numeros(self._archivo_mesa(mesa))):
+                        if not 1 <= numero < anterior:
+                            continue
+                        f.seek((numero - 1) * REGISTRO_TICKET.size)
+                        registro = REGISTRO_TICKET.unpack(f.read(REGISTRO_TICKET.size))
+                        anterior = numero
+                        agregar(numero, registro)
+                        if len(resultado) >= limite:
+                            break
+                return resultado
+            fin = len(self)
+            while fin > 0 and len(resultado) < limite:
+                desde = max(0, fin - REGISTROS_POR_LECTURA)
+                registros = self._leer_rango(desde, fin)
+                for desplazamiento in range(len(registros) - 1, -1, -1):
+                    agregar(desde + desplazamiento + 1, registros[desplazamiento])
+                    if len(resultado) >= limite:
+                        break
+                fin = desde
+        return resultado
@@ -0,0 +1,170 @@
+import bisect
+import threading
+
+MAX_MESAS_COMBINADAS = 3
+SUGERENCIAS_POR_DEFECTO = 3
+
+def mesas_adyacentes(mesas):
+    """Arma el grafo de adyacencia: usa 'adyacentes' de cada mesa o, si no está, las mesas de número contiguo."""
+    adyacencia = {}
+    for mesa_id, mesa_data in mesas.items():
+        vecinas = mesa_data[0].get('adyacentes')
+        if vecinas is None:
+            vecinas = []
+            if str(mesa_id).isdigit():
+                numero = int(mesa_id)
+                vecinas = [str(n) for n in (numero - 1, numero + 1) if str(n) in mesas]
+        adyacencia[mesa_id] = set(str(v) for v in vecinas if str(v) in mesas)
+    # La adyacencia es simétrica aunque se haya declarado de un solo lado
+    for mesa_id, vecinas in list(adyacencia.items()):
+        for vecina in vecinas:
+            adyacencia[vecina].add(mesa_id)
+    return adyacencia
+
+class AsignadorMesas:
+    """Sugiere y asigna mesas libres (o combinaciones de mesas contiguas) a grupos que llegan al salón."""
+
+    def __init__(self, sistema_mesas):
+        """Arma el índice de mesas libres por capacidad y se suscribe a los cambios de estado."""
+        self.sistema_mesas = sistema_mesas
+        self.adyacencia = mesas_adyacentes(sistema_mesas.mesas)
+        self.libres_por_capacidad = {}
+        self.capacidades = []
+        self._lock = threading.Lock()
+        for mesa_id, mesa_data in sistema_mesas.mesas.items():
+            if mesa_data[0].get('estado') == 'libre':
+                self._agregar_libre(mesa_id)
+        sistema_mesas.agregar_observador_estado(self._al_cambiar_estado_mesa)
+
+    def _capacidad(self, mesa_id):
+        return self.sistema_mesas.mesas[mesa_id][0].get('capacidad', 0)
+
+    def _agregar_libre(self, mesa_id):
+        capacidad = self._capacidad(mesa_id)
+        if capacidad not in self.libres_por_capacidad:
+            self.libres_por_capacidad[capacidad] = set()
+            bisect.insort(self.capacidades, capacidad)
+        self.libres_por_capacidad[capacidad].add(mesa_id)
+
+    def _quitar_libre(self, mesa_id):
+        capacidad = self._capacidad(mesa_id)
+        libres = self.libres_por_capacidad.get(capacidad)
+        if libres is None:
+            return
+        libres.discard(mesa_id)
+        if not libres:
+            del self.libres_por_capacidad[capacidad]
+            self.capacidades.remove(capacidad)
+
+    def _al_cambiar_estado_mesa(self, mesa_id, anterior, nuevo):
+        """Mantiene el índice al día con cada mesa que se ocupa o se libera."""
+        with self._lock:
+            if nuevo == 'libre':
+                self._agregar_libre(mesa_id)
+            elif anterior == 'libre':
+                self._quitar_libre(mesa_id)
+
+    def _cumple_zona(self, mesa_id, zona):
+        return not zona or self.sistema_mesas.mesas[mesa_id][0].get('zona') == zona
+
+    def _opcion(self, mesas, personas, preferidas):
+        mesas = sorted(mesas, key=lambda m: (len(m), m))
+        capacidad = sum(self._capacidad(m) for m in mesas)
+        return {
+            'mesas': mesas,
+            'nombres': [self.sistema_mesas.mesas[m][0].get('nombre') for m in mesas],
+            'capacidad': capacidad,
+            'sobrante': capacidad - personas,
+            'preferida': bool(preferidas & set(mesas))
+        }
+
+    def _combinaciones(self, personas, zona, max_mesas):
+        """Busca grupos de mesas libres contiguas que sumen la capacidad pedida."""
+        candidatas = {m for libres in self.libres_por_capacidad.values() for m in libres if self._cumple_zona(m, zona)}
+        encontradas = set()
+        visitadas = set()
+        frontera = [frozenset([m]) for m in candidatas]
+        for _ in range(max_mesas - 1):
+            siguiente = []
+            for grupo in frontera:
+                vecinas = set().union(*(self.adyacencia[m] for m in grupo)) & candidatas
+                for vecina in vecinas - grupo:
+                    nuevo = grupo | {vecina}
+                    if nuevo in visitadas:
+                        continue
+                    visitadas.add(nuevo)
+                    if sum(self._capacidad(m) for m in nuevo) >= personas:
+                        # Agregar más mesas a un grupo que ya alcanza solo aumenta el sobrante
+                        encontradas.add(nuevo)
+                    else:
+                        siguiente.append(nuevo)
+            frontera = siguiente
+        return encontradas
+
+    def sugerir(self, personas, preferencias=None, limite=SUGERENCIAS_POR_DEFECTO):
+        """Sugiere las mejores opciones para un grupo, de la que mejor se ajusta a la que menos."""
+        if isinstance(personas, bool) or not isinstance(personas, int) or personas < 1:
+            raise ValueError("La cantidad de personas debe ser un entero mayor a cero")
+        preferencias = preferencias or {}
+        if not isinstance(preferencias, dict):
+            raise ValueError("Las preferencias deben ser un objeto")
+        zona = preferencias.get('zona')
+        if not isinstance(preferencias.get('mesas', []), list):
+            raise ValueError("'mesas' debe ser una lista de mesas")
+        preferidas = set(str(m) for m in preferencias.get('mesas', []))
+        combinar = preferencias.get('combinar', True)
+        max_mesas = preferencias.get('max_mesas', MAX_MESAS_COMBINADAS)
+        # La búsqueda de combinaciones crece rápido con la cantidad de mesas: se limita
+        if isinstance(max_mesas, bool) or not isinstance(max_mesas, int) or not 1 <= max_mesas <= MAX_MESAS_COMBINADAS:
+            raise ValueError(f"'max_mesas' debe ser un entero entre 1 y {MAX_MESAS_COMBINADAS}")
+
+        with self._lock:
+            # Primero una sola mesa: se recorren solo las capacidades que alcanzan, de menor a mayor
+            opciones = []
+            for capacidad in self.capacidades[bisect.bisect_left(self.capacidades, personas):]:
+                for mesa_id in self.libres_por_capacidad[capacidad]:
+                    if self._cumple_zona(mesa_id, zona):
+                        opciones.append(self._opcion([mesa_id], personas, preferidas))
+                if len(opciones) >= limite and not preferidas:
+                    break
+
+            # Si ninguna mesa alcanza, se juntan mesas contiguas
+            if not opciones and combinar:
+                opciones = [self._opcion(grupo, personas, preferidas)
+                            for grupo in self._combinaciones(personas, zona, max_mesas)]
+
+        opciones.sort(key=lambda o: (not o['preferida'], o['sobrante'], len(o['mesas']), o['mesas']))
+        return opciones[:limite]
+
+    def asignar(self, personas, nombre, preferencias=None):
+        """Sienta al grupo en la mejor opción disponible y devuelve (exito, opcion o mensaje).
+
+        Elige y sienta con el lock de las mesas tomado, así que dos grupos no pueden quedar en la
+        misma mesa. Si una mesa de la opción no se puede ocupar, se liberan las ya ocupadas.
+        """
+        if not nombre:
+            return False, "Se requiere el nombre del grupo"
+        with self.sistema_mesas.lock_mesas:
+            opciones = self.sugerir(personas, preferencias, limite=1)
+            if not opciones:
+                return False, f"No hay mesas libres para {personas} personas"
+
+            opcion = opciones[0]
+            sentados = []
+            for mesa_id in opcion['mesas']:
+                cliente_key = None
+                if self.sistema_mesas.mesas[mesa_id][0].get('estado') == 'libre':
+                    cliente_key = self.sistema_mesas.registrar_cliente(mesa_id, nombre)
+                if not cliente_key:
+                    self._liberar(sentados)
+                    return False, f"No se pudo registrar al grupo en la mesa {mesa_id}"
+                sentados.append((mesa_id, cliente_key))
+        return True, opcion
+
+    def _liberar(self, sentados):
+        """Deshace una asignación a medias: vacía los lugares ocupados y libera sus mesas."""
+        for mesa_id, cliente_key in sentados:
+            self.sistema_mesas.mesas[mesa_id][0][cliente_key]['nombre'] = ''
+            self.sistema_mesas.cambiar_estado_mesa(mesa_id, 'libre')
+        if sentados:
+            self.sistema_mesas.guardar_mesas()
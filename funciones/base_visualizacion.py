@@ -1,5 +1,8 @@
+import logging
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 class BaseVisualizador:
     """Clase base para la visualización común de mesas y pedidos"""
 
@@ -157,7 +160,7 @@ class BaseVisualizador:
     def _validar_mesa(self, mesa_id):
         """Valida que la mesa exista y devuelve la lista asociada"""
         if mesa_id not in self.sistema_mesas.mesas:
-            print(f"⚠️ Error: Mesa {mesa_id} no encontrada")
+            logger.warning("Mesa %s no encontrada", mesa_id)
             return None
         return self.sistema_mesas.mesas[mesa_id]
 
@@ -186,7 +189,7 @@ class BaseVisualizador:
                         'notas': pedido.get('notas', []),
                         'estado_cocina': pedido.get('estado_cocina'),
                         'entregado': pedido.get('entregado', False),
-                        'es_bebida': 'bebida' in pedido.get('nombre', '').lower()
+                        'es_bebida': self.sistema_mesas.es_bebida(pedido)
                     }
                     pedidos_procesados.append(pedido_info)
         return pedidos_procesados 
\ No newline at end of file
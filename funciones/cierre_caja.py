@@ -0,0 +1,212 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from .sistema_mesas import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+CIERRES_DIR = os.path.normpath(os.path.join(DATA_DIR, 'cierres'))
+TURNO_ACTUAL = 'turno_actual.json'
+# Pedidos cuya cancelación ya se sumó en el turno: una línea [mesa_id, pedido_id] por cancelación
+CANCELADOS_TURNO = 'cancelados_{:06d}.jsonl'
+
+def _turno_vacio(numero):
+    return {
+        'numero': numero,
+        'apertura': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'tickets': 0,
+        'total': 0,
+        'cubiertos': 0,
+        'por_metodo': {},
+        'por_mesa': {},
+        'por_categoria': {},
+        'cancelaciones': {'cantidad': 0, 'importe': 0, 'por_plato': {}},
+        'reinicios': {'cantidad': 0, 'por_mesa': {}}
+    }
+
+class CierreCaja:
+    """Acumulados del turno para el cierre de caja (reporte Z).
+
+    Cada pago, cancelación y reinicio suma a los acumulados en el momento, así que el reporte
+    parcial y el cierre no recorren tickets: el cierre archiva los acumulados tal como están
+    (cierre_NNNNNN.json) y empieza un turno nuevo. Los acumulados se guardan en
+    turno_actual.json después de cada cambio para no perderlos si la aplicación se reinicia.
+    Los pedidos cancelados del turno van aparte, en cancelados_NNNNNN.jsonl (solo se agregan
+    líneas), para que turno_actual.json no crezca con cada cancelación.
+    """
+
+    def __init__(self, sistema_mesas, directorio=CIERRES_DIR):
+        self.sistema_mesas = sistema_mesas
+        self.directorio = directorio
+        self.archivo_turno = os.path.join(directorio, TURNO_ACTUAL)
+        self._lock = threading.Lock()
+        # Categoría por nombre de plato, armada a partir del menú indexado vigente
+        self._menu_base = None
+        self._categorias = {}
+        os.makedirs(directorio, exist_ok=True)
+        self._turno = self._cargar_turno()
+        # (mesa_id, pedido_id) cuya cancelación ya se sumó en el turno (una cancelación repetida no vuelve a sumar).
+        # El id del pedido solo es único dentro de su mesa
+        self._cancelados = self._cargar_cancelados()
+        # Formato anterior: la lista dentro de turno_actual.json (los ids sueltos no se pueden asociar a una mesa)
+        legado = self._turno['cancelaciones'].pop('pedidos', None)
+        if legado is not None:
+            for par in legado:
+                if isinstance(par, list) and len(par) == 2 and tuple(par) not in self._cancelados:
+                    self._agregar_cancelado(tuple(par))
+            self._guardar_turno()
+
+    def _archivo_cancelados(self):
+        return os.path.join(self.directorio, CANCELADOS_TURNO.format(self._turno['numero']))
+
+    def _cargar_cancelados(self):
+        cancelados = set()
+        if os.path.exists(self._archivo_cancelados()):
+            with open(self._archivo_cancelados(), 'r', encoding='utf-8') as f:
+                for linea in f:
+                    try:
+                        cancelados.add(tuple(json.loads(linea)))
+                    except (ValueError, TypeError):
+                        # Línea cortada al final (corte durante una escritura)
+                        continue
+        return cancelados
+
+    def _agregar_cancelado(self, clave):
+        self._cancelados.add(clave)
+        try:
+            with open(self._archivo_cancelados(), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(list(clave), ensure_ascii=False) + '\n')
+        except Exception as e:
+            logger.error("Error al registrar el pedido cancelado %s: %s", clave, e)
+
+    def _cargar_turno(self):
+        if os.path.exists(self.archivo_turno):
+            try:
+                with open(self.archivo_turno, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.error("Error al cargar los acumulados del turno: %s", e)
+        return _turno_vacio(self._ultimo_numero() + 1)
+
+    def _ultimo_numero(self):
+        numeros = [int(nombre[len('cierre_'):-len('.json')]) for nombre in os.listdir(self.directorio)
+                   if nombre.startswith('cierre_') and nombre.endswith('.json')
+                   and nombre[len('cierre_'):-len('.json')].isdigit()]
+        return max(numeros, default=0)
+
+    def _escribir(self, archivo, datos):
+        """Escritura atómica: archivo temporal y reemplazo."""
+        temporal = archivo + '.temp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(datos, f, indent=2, ensure_ascii=False)
+        os.replace(temporal, archivo)
+
+    def _guardar_turno(self):
+        try:
+            self._escribir(self.archivo_turno, self._turno)
+        except Exception as e:
+            logger.error("Error al guardar los acumulados del turno: %s", e)
+
+    def _categoria(self, nombre):
+        menu_indexado = self.sistema_mesas.obtener_menu_indexado()
+        if menu_indexado is not self._menu_base:
+            self._categorias = {item['plato']['nombre']: item['categoria'] for item in menu_indexado}
+            self._menu_base = menu_indexado
+        return self._categorias.get(nombre, 'sin categoría')
+
+    def registrar_pago(self, ticket):
+        """Suma un ticket pagado a los acumulados por método, mesa y categoría."""
+        total = ticket.get('total', 0) or 0
+        metodo = str(ticket.get('metodo_pago', '')).capitalize() or 'Sin método'
+        mesa = ticket.get('mesa_nombre') or str(ticket.get('mesa_id', ''))
+        if ticket.get('tipo_pago') == 'individual':
+            cubiertos = 1
+        else:
+            cubiertos = len(ticket.get('clientes') or {pedido['cliente'] for pedido in ticket['pedidos']})
+        with self._lock:
+            turno = self._turno
+            turno['tickets'] += 1
+            turno['total'] += total
+            turno['cubiertos'] += cubiertos
+            por_metodo = turno['por_metodo'].setdefault(metodo, {'tickets': 0, 'total': 0})
+            por_metodo['tickets'] += 1
+            por_metodo['total'] += total
+            por_mesa = turno['por_mesa'].setdefault(mesa, {'tickets': 0, 'total': 0, 'cubiertos': 0})
+            por_mesa['tickets'] += 1
+            por_mesa['total'] += total
+            por_mesa['cubiertos'] += cubiertos
+            for pedido in ticket['pedidos']:
+                por_categoria = turno['por_categoria'].setdefault(self._categoria(pedido['nombre']),
+                                                                  {'cantidad': 0, 'total': 0})
+                por_categoria['cantidad'] += pedido['cantidad']
+                por_categoria['total'] += pedido['subtotal']
+            self._guardar_turno()
+
+    def registrar_cancelacion(self, mesa_id, pedido):
+        """Suma un pedido cancelado (cantidad e importe) a los acumulados, una sola vez por pedido de cada mesa."""
+        cantidad = pedido.get('cantidad', 1)
+        clave = (mesa_id, pedido.get('id'))
+        with self._lock:
+            if clave in self._cancelados:
+                return False
+            cancelaciones = self._turno['cancelaciones']
+            cancelaciones['cantidad'] += cantidad
+            cancelaciones['importe'] += pedido.get('precio', 0) * cantidad
+            cancelaciones['por_plato'][pedido['nombre']] = cancelaciones['por_plato'].get(pedido['nombre'], 0) + cantidad
+            self._guardar_turno()
+            self._agregar_cancelado(clave)
+        return True
+
+    def registrar_reinicio(self, mesa_nombre):
+        """Suma el reinicio de una mesa (anulación de su consumo) a los acumulados."""
+        with self._lock:
+            reinicios = self._turno['reinicios']
+            reinicios['cantidad'] += 1
+            reinicios['por_mesa'][mesa_nombre] = reinicios['por_mesa'].get(mesa_nombre, 0) + 1
+            self._guardar_turno()
+
+    def parcial(self):
+        """Reporte X: los acumulados del turno en curso, sin cerrarlo."""
+        with self._lock:
+            return json.loads(json.dumps(self._turno))
+
+    def cerrar(self):
+        """Reporte Z: archiva los acumulados del turno, empieza uno nuevo y devuelve el reporte."""
+        with self._lock:
+            reporte = self._turno
+            archivo_cancelados = self._archivo_cancelados()
+            reporte['cierre'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            # Primero el archivo del cierre: si se corta antes de reiniciar, el número ya figura como cerrado
+            self._escribir(os.path.join(self.directorio, f"cierre_{reporte['numero']:06d}.json"), reporte)
+            self._turno = _turno_vacio(reporte['numero'] + 1)
+            self._cancelados = set()
+            self._guardar_turno()
+            if os.path.exists(archivo_cancelados):
+                os.remove(archivo_cancelados)
+        logger.info("Cierre de caja Z%s: %s tickets, total %s", reporte['numero'], reporte['tickets'], reporte['total'])
+        return reporte
+
+    def obtener_cierre(self, numero):
+        """Devuelve un reporte Z archivado, o None si no existe."""
+        archivo = os.path.join(self.directorio, f"cierre_{numero:06d}.json")
+        if not os.path.exists(archivo):
+            return None
+        with open(archivo, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+_compartidos = {}
+_lock_compartidos = threading.Lock()
+
+def cierre_caja_compartido(sistema_mesas, directorio=CIERRES_DIR):
+    """Devuelve la instancia de CierreCaja del proceso para un directorio.
+
+    turno_actual.json tiene un solo dueño: los sistemas que no reciben un cierre de caja usan
+    este en lugar de armar uno propio que pisaría los acumulados de los demás.
+    """
+    clave = os.path.abspath(directorio)
+    with _lock_compartidos:
+        if clave not in _compartidos:
+            _compartidos[clave] = CierreCaja(sistema_mesas, directorio)
+        return _compartidos[clave]
@@ -0,0 +1,223 @@
+import heapq
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from .sistema_mesas import DATA_DIR
+from .instrumentacion import registro_metricas
+
+logger = logging.getLogger(__name__)
+
+COLA_TAREAS_JSONL = os.path.join(DATA_DIR, 'cola_tareas.jsonl')
+
+CAPACIDAD_POR_DEFECTO = 1000
+MAX_INTENTOS = 5               # intentos antes de avisar que la tarea está atascada (se sigue reintentando)
+ESPERA_BASE_REINTENTO = 0.5   # segundos; se duplica en cada intento
+ESPERA_MAXIMA_REINTENTO = 60  # segundos entre reintentos de una tarea atascada
+TAMANO_COMPACTAR = 1024 * 1024  # bytes del diario a partir de los que se compacta cuando la cola se vacía
+
+class ColaLlena(Exception):
+    """La cola está en su capacidad máxima."""
+
+class ColaTareas:
+    """Cola acotada de tareas en segundo plano con diario en disco.
+
+    encolar() vuelve cuando la tarea quedó escrita (y sincronizada) en el diario; un hilo aparte
+    la ejecuta, reintentando con espera exponencial (con tope) hasta que salga bien: una tarea que
+    falla nunca se descarta. Al iniciar se vuelven a encolar las tareas del diario que no terminaron,
+    así que cada tarea se ejecuta al menos una vez (puede repetirse si el proceso se corta durante
+    la ejecución o justo después). Por eso quien encola pone una 'clave' en
+    los datos y el manejador no repite lo que ya quedó escrito con esa clave.
+    """
+
+    def __init__(self, archivo=COLA_TAREAS_JSONL, capacidad=CAPACIDAD_POR_DEFECTO, max_intentos=MAX_INTENTOS):
+        self.archivo = archivo
+        self.max_intentos = max_intentos
+        self._manejadores = {}
+        self._cola = queue.Queue(maxsize=capacidad)
+        # Reintentos en espera: (momento, orden, tarea)
+        self._reintentos = []
+        self._orden = itertools.count()
+        self._lock = threading.Lock()
+        self._lock_diario = threading.Lock()
+        self._pendientes = 0
+        self._hilo = None
+        self._detener = threading.Event()
+
+    def registrar(self, tipo, funcion):
+        """Asocia un tipo de tarea con la función que la ejecuta (recibe los datos de la tarea)."""
+        self._manejadores[tipo] = funcion
+
+    def __len__(self):
+        """Tareas encoladas, en ejecución o esperando un reintento."""
+        return self._pendientes
+
+    def _escribir_diario(self, entrada):
+        linea = json.dumps(entrada, ensure_ascii=False) + '\n'
+        with self._lock_diario:
+            with open(self.archivo, 'a', encoding='utf-8') as f:
+                f.write(linea)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _cambiar_pendientes(self, delta):
+        with self._lock:
+            self._pendientes += delta
+        registro_metricas.incrementar('definity_cola_tareas_pendientes', delta)
+
+    def encolar(self, tipo, datos):
+        """Registra la tarea en el diario y la pone en la cola. Devuelve el id de la tarea.
+
+        Si el hilo de la cola no está iniciado (consola, pruebas), la tarea se ejecuta en el momento.
+        Si la cola está llena falla enseguida con ColaLlena: quien encola suele tener tomado lock_mesas.
+        """
+        if tipo not in self._manejadores:
+            raise ValueError(f"Tipo de tarea desconocido: {tipo}")
+        tarea = {'id': uuid.uuid4().hex, 'tipo': tipo, 'datos': datos, 'intentos': 0}
+        self._escribir_diario({'id': tarea['id'], 'tipo': tipo, 'datos': datos, 'estado': 'pendiente'})
+        self._cambiar_pendientes(1)
+        if self._hilo is None:
+            self._ejecutar(tarea, en_linea=True)
+            return tarea['id']
+        try:
+            self._cola.put_nowait(tarea)
+        except queue.Full:
+            # Se marca en el diario para que no se ejecute al reiniciar: quien encoló recibe el error
+            self._escribir_diario({'id': tarea['id'], 'estado': 'rechazada'})
+            self._cambiar_pendientes(-1)
+            raise ColaLlena("La cola de tareas está llena")
+        return tarea['id']
+
+    def _ejecutar(self, tarea, en_linea=False):
+        """Ejecuta la tarea; si falla la programa para reintentar.
+
+        En línea el error se propaga y la tarea queda pendiente en el diario: se vuelve a ejecutar
+        la próxima vez que se inicie la cola.
+        """
+        tarea['intentos'] += 1
+        try:
+            self._manejadores[tarea['tipo']](tarea['datos'])
+        except Exception as e:
+            if en_linea:
+                self._cambiar_pendientes(-1)
+                registro_metricas.incrementar('definity_cola_tareas_total', tipo=tarea['tipo'], resultado='fallida')
+                raise
+            espera = min(ESPERA_BASE_REINTENTO * 2 ** (tarea['intentos'] - 1), ESPERA_MAXIMA_REINTENTO)
+            if tarea['intentos'] == self.max_intentos:
+                logger.error("Tarea %s (%s) sigue fallando tras %s intentos, se reintenta cada %.0fs: %s",
+                             tarea['id'], tarea['tipo'], tarea['intentos'], ESPERA_MAXIMA_REINTENTO, e)
+                registro_metricas.incrementar('definity_cola_tareas_atascadas', 1)
+            else:
+                logger.warning("Tarea %s (%s) falló, reintento en %.1fs: %s", tarea['id'], tarea['tipo'], espera, e)
+            with self._lock:
+                heapq.heappush(self._reintentos, (time.monotonic() + espera, next(self._orden), tarea))
+            registro_metricas.incrementar('definity_cola_tareas_total', tipo=tarea['tipo'], resultado='reintento')
+            return
+        else:
+            if tarea['intentos'] > self.max_intentos:
+                registro_metricas.incrementar('definity_cola_tareas_atascadas', -1)
+            self._escribir_diario({'id': tarea['id'], 'estado': 'hecha'})
+            registro_metricas.incrementar('definity_cola_tareas_total', tipo=tarea['tipo'], resultado='hecha')
+        self._cambiar_pendientes(-1)
+        if not self._pendientes and os.path.getsize(self.archivo) > TAMANO_COMPACTAR:
+            self._compactar()
+
+    def _siguiente_reintento(self):
+        """Saca el próximo reintento vencido, si hay, y devuelve (tarea, segundos hasta el siguiente)."""
+        with self._lock:
+            if not self._reintentos:
+                return None, None
+            momento, _, tarea = self._reintentos[0]
+            restante = momento - time.monotonic()
+            if restante > 0:
+                return None, restante
+            heapq.heappop(self._reintentos)
+            return tarea, 0
+
+    def _trabajar(self):
+        while True:
+            tarea, restante = self._siguiente_reintento()
+            if tarea is None:
+                # Al detener no se esperan los reintentos: siguen pendientes en el diario
+                if self._detener.is_set() and self._cola.empty():
+                    break
+                try:
+                    tarea = self._cola.get(timeout=min(restante, 0.5) if restante is not None else 0.5)
+                except queue.Empty:
+                    continue
+            self._ejecutar(tarea)
+        self._compactar()
+
+    def _recuperar(self):
+        """Tareas del diario que no terminaron (ni hechas ni rechazadas al encolar), en orden."""
+        if not os.path.exists(self.archivo):
+            return []
+        tareas = {}
+        with open(self.archivo, 'r', encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    entrada = json.loads(linea)
+                except ValueError:
+                    # Línea cortada al final del diario: la tarea no llegó a confirmarse
+                    continue
+                if entrada.get('estado') == 'pendiente':
+                    tareas[entrada['id']] = {'id': entrada['id'], 'tipo': entrada['tipo'],
+                                             'datos': entrada['datos'], 'intentos': 0}
+                else:
+                    tareas.pop(entrada.get('id'), None)
+        return list(tareas.values())
+
+    def _compactar(self):
+        """Reescribe el diario dejando solo las tareas que siguen pendientes."""
+        if not os.path.isdir(os.path.dirname(os.path.abspath(self.archivo))):
+            logger.warning("Cola de tareas: no existe el directorio del diario %s, no se compacta", self.archivo)
+            return
+        with self._lock_diario:
+            pendientes = self._recuperar()
+            temporal = self.archivo + '.temp'
+            with open(temporal, 'w', encoding='utf-8') as f:
+                for tarea in pendientes:
+                    f.write(json.dumps({'id': tarea['id'], 'tipo': tarea['tipo'], 'datos': tarea['datos'],
+                                        'estado': 'pendiente'}, ensure_ascii=False) + '\n')
+            os.replace(temporal, self.archivo)
+
+    def iniciar(self):
+        """Vuelve a encolar lo que quedó en el diario y arranca el hilo de la cola."""
+        if self._hilo is not None:
+            return
+        self._compactar()
+        recuperadas = self._recuperar()
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._trabajar, name='cola-tareas', daemon=True)
+        self._hilo.start()
+        for tarea in recuperadas:
+            self._cambiar_pendientes(1)
+            self._cola.put(tarea)
+        if recuperadas:
+            logger.info("Cola de tareas: %s tareas recuperadas del diario", len(recuperadas))
+
+    def detener(self, timeout=30):
+        """Termina las tareas encoladas y detiene el hilo; los reintentos quedan en el diario."""
+        if self._hilo is None:
+            return
+        self._detener.set()
+        self._hilo.join(timeout)
+        if self._hilo.is_alive():
+            logger.warning("Cola de tareas detenida con %s tareas sin terminar (quedan en el diario)", len(self))
+            self._hilo = None
+            return
+        self._hilo = None
+        # Los reintentos en espera se recuperan del diario en el próximo iniciar()
+        with self._lock:
+            reintentos = [tarea for _, _, tarea in self._reintentos]
+            self._reintentos.clear()
+        if reintentos:
+            logger.warning("Cola de tareas detenida con %s reintentos pendientes (quedan en el diario)", len(reintentos))
+            self._cambiar_pendientes(-len(reintentos))
+            atascadas = sum(1 for tarea in reintentos if tarea['intentos'] >= self.max_intentos)
+            if atascadas:
+                registro_metricas.incrementar('definity_cola_tareas_atascadas', -atascadas)
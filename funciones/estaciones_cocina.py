@@ -0,0 +1,105 @@
+import threading
+
+# Estación que prepara cada etapa del menú
+ESTACIONES_POR_ETAPA = {
+    'bebida': 'barra',
+    'entrada': 'cocina_caliente',
+    'principal': 'cocina_caliente',
+    'postre': 'postres'
+}
+# Excepciones por categoría (tienen prioridad sobre la etapa)
+ESTACIONES_POR_CATEGORIA = {
+    'ensaladas': 'cocina_fria',
+    'dips': 'cocina_fria',
+    'helados': 'postres'
+}
+ESTACION_POR_DEFECTO = 'cocina_caliente'
+ESTACIONES = ('barra', 'cocina_caliente', 'cocina_fria', 'postres')
+
+def construir_rutas_estaciones(menu):
+    """Asigna a cada plato del menú la estación que lo prepara."""
+    rutas = {}
+    for etapa, categorias in menu.get('platos', {}).items():
+        for categoria, platos in categorias.items():
+            estacion = ESTACIONES_POR_CATEGORIA.get(categoria, ESTACIONES_POR_ETAPA.get(etapa, ESTACION_POR_DEFECTO))
+            for plato in platos:
+                rutas[plato.get('id')] = estacion
+    return rutas
+
+class ColasEstaciones:
+    """Colas de pedidos por estación de preparación, en orden de llegada."""
+
+    def __init__(self, sistema_mesas):
+        """Inicializa una cola por estación con los pedidos que ya están en cocina."""
+        self.sistema_mesas = sistema_mesas
+        self.colas = {estacion: {} for estacion in ESTACIONES}
+        # Estación a la que se despachó cada pedido: si el menú cambia la ruta del plato, se saca de la misma cola
+        self._estaciones = {}
+        # Las transiciones (POST/PUT) modifican las colas mientras los GET del tablero las recorren
+        self._lock = threading.Lock()
+        self._cargar_pedidos_activos()
+
+    def _cargar_pedidos_activos(self):
+        """Despacha los pedidos que estaban en cocina al iniciar el sistema."""
+        for mesa_id, mesa_data in self.sistema_mesas.mesas.items():
+            mesa = mesa_data[0]
+            for i in range(1, mesa.get('capacidad', 0) + 1):
+                cliente = mesa.get(f"cliente_{i}")
+                if cliente and cliente.get('nombre'):
+                    for pedido in cliente.get('pedidos', []):
+                        if self._en_preparacion(pedido):
+                            self.despachar(mesa_id, pedido)
+
+    def _en_preparacion(self, pedido):
+        """Indica si el pedido todavía debe prepararse."""
+        return (pedido.get('en_cocina', False)
+                and not pedido.get('entregado', False)
+                and pedido.get('estado_cocina') not in ('✅ LISTO PARA ENTREGAR', '🔴 CANCELADO'))
+
+    def despachar(self, mesa_id, pedido):
+        """Agrega el pedido a la cola de su estación."""
+        clave = (mesa_id, pedido.get('id'))
+        estacion = self.sistema_mesas.obtener_estacion(pedido)
+        with self._lock:
+            self._quitar_clave(clave)
+            self.colas.setdefault(estacion, {})[clave] = pedido
+            self._estaciones[clave] = estacion
+
+    def quitar(self, mesa_id, pedido):
+        """Saca el pedido de la cola de su estación."""
+        with self._lock:
+            self._quitar_clave((mesa_id, pedido.get('id')))
+
+    def quitar_mesa(self, mesa_id):
+        """Saca de las colas todos los pedidos de una mesa (pago o reinicio)."""
+        with self._lock:
+            for clave in [clave for clave in self._estaciones if clave[0] == mesa_id]:
+                self._quitar_clave(clave)
+
+    def _quitar_clave(self, clave):
+        """Saca una clave de su cola (con el lock tomado)."""
+        estacion = self._estaciones.pop(clave, None)
+        if estacion is not None:
+            self.colas[estacion].pop(clave, None)
+
+    def obtener_tablero(self, estacion):
+        """Obtiene los pedidos pendientes de una estación, del más antiguo al más nuevo."""
+        if estacion not in self.colas:
+            raise ValueError(f"Estación inválida: {estacion}")
+
+        with self._lock:
+            cola = list(self.colas[estacion].items())
+        return [{
+            'id': pedido_id,
+            'mesa_id': mesa_id,
+            'nombre': pedido.get('nombre', 'Desconocido'),
+            'cantidad': pedido.get('cantidad', 1),
+            'estado_cocina': pedido.get('estado_cocina'),
+            'hora_envio': pedido.get('hora_envio', ''),
+            'notas': pedido.get('notas', [])
+        } for (mesa_id, pedido_id), pedido in cola]
+
+    def resumen(self):
+        """Obtiene la cantidad de pedidos pendientes por estación."""
+        with self._lock:
+            return {estacion: len(cola) for estacion, cola in self.colas.items()}
@@ -0,0 +1,175 @@
+import bisect
+import time
+from datetime import datetime
+from itertools import count
+from .monitor_retrasos import OBJETIVOS_PREPARACION, OBJETIVO_POR_DEFECTO
+from .metricas_cocina import duracion_entre
+
+class PromedioMovil:
+    """Promedio móvil exponencial que se actualiza en O(1) por muestra."""
+
+    def __init__(self, alfa):
+        self.alfa = alfa
+        self.valor = None
+        self.muestras = 0
+
+    def agregar(self, muestra):
+        """Incorpora una muestra nueva al promedio."""
+        self.muestras += 1
+        if self.valor is None:
+            self.valor = muestra
+        else:
+            self.valor += self.alfa * (muestra - self.valor)
+
+class EstimadorETA:
+    """Estima a qué hora estará listo cada pedido según lo aprendido de los pedidos terminados."""
+
+    def __init__(self, sistema_mesas, alfa=0.2):
+        """Inicializa los promedios y aprende de los pedidos que ya están en las mesas."""
+        self.sistema_mesas = sistema_mesas
+        self.alfa = alfa
+        self._categorias = sistema_mesas.instantanea_menu().categorias
+        sistema_mesas.agregar_observador_menu(self._al_cambiar_menu)
+
+        # Tiempo de cocción (en_preparacion -> listo) por plato y por categoría, en segundos
+        self.coccion_por_plato = {}
+        self.coccion_por_categoria = {}
+        # Espera en la cola (enviado -> en_preparacion) por cada pedido que había adelante
+        self.espera_por_pedido = PromedioMovil(alfa)
+
+        # Pedidos enviados que todavía no empezaron a prepararse: (pedido, pedidos que tenían
+        # adelante al enviarse, número de llegada). Los números en espera se guardan ordenados,
+        # así la posición de un pedido en la cola es una búsqueda binaria
+        self._en_espera = {}
+        self._llegadas = []
+        self._secuencia = count()
+        self._cargar_pedidos_existentes()
+
+    def _al_cambiar_menu(self, instantanea):
+        """Observador del menú: usa las categorías de la versión nueva."""
+        self._categorias = instantanea.categorias
+
+    def _cargar_pedidos_existentes(self):
+        """Aprende de los historiales con marcas de tiempo y arma la cola actual."""
+        for mesa_id, mesa_data in self.sistema_mesas.mesas.items():
+            mesa = mesa_data[0]
+            for i in range(1, mesa.get('capacidad', 0) + 1):
+                cliente = mesa.get(f"cliente_{i}")
+                if cliente and cliente.get('nombre'):
+                    for pedido in cliente.get('pedidos', []):
+                        historial = pedido.get('historial_estados', [])
+                        if not historial or 'ts' not in historial[-1]:
+                            continue
+                        ultimo = historial[-1].get('clave')
+                        if ultimo in ('listo', 'entregado'):
+                            self._aprender(pedido)
+                        elif ultimo == 'enviado':
+                            self._poner_en_espera((mesa_id, pedido.get('id')), pedido, None)
+
+    def _ultima_entrada(self, pedido, clave):
+        """Obtiene la última transición del historial con la clave indicada (con marca de tiempo)."""
+        for entrada in reversed(pedido.get('historial_estados', [])):
+            if entrada.get('clave') == clave and 'ts' in entrada:
+                return entrada
+        return None
+
+    def _ultimo_ts(self, pedido, clave):
+        """Obtiene la marca de tiempo de la última transición con la clave indicada."""
+        entrada = self._ultima_entrada(pedido, clave)
+        return entrada['ts'] if entrada else None
+
+    def _aprender(self, pedido):
+        """Actualiza los promedios con un pedido que acaba de quedar listo."""
+        listo = self._ultima_entrada(pedido, 'listo')
+        if listo is None:
+            return
+
+        inicio = self._ultima_entrada(pedido, 'en_preparacion') or self._ultima_entrada(pedido, 'enviado')
+        if inicio is None:
+            return
+        coccion = duracion_entre(inicio, listo)
+        if coccion < 0:
+            return
+        plato = pedido.get('nombre', 'Desconocido')
+        categoria = self._categorias.get(pedido.get('plato_id'))
+        self.coccion_por_plato.setdefault(plato, PromedioMovil(self.alfa)).agregar(coccion)
+        if categoria:
+            self.coccion_por_categoria.setdefault(categoria, PromedioMovil(self.alfa)).agregar(coccion)
+
+    def _poner_en_espera(self, clave, pedido, cola_al_envio):
+        self.quitar(*clave)
+        llegada = next(self._secuencia)
+        self._en_espera[clave] = (pedido, cola_al_envio, llegada)
+        self._llegadas.append(llegada)
+
+    def quitar(self, mesa_id, pedido_o_id):
+        """Saca un pedido de la cola de espera; devuelve cuántos tenía adelante al enviarse (o None)."""
+        pedido_id = pedido_o_id.get('id') if isinstance(pedido_o_id, dict) else pedido_o_id
+        registro = self._en_espera.pop((mesa_id, pedido_id), None)
+        if registro is None:
+            return None
+        indice = bisect.bisect_left(self._llegadas, registro[2])
+        del self._llegadas[indice]
+        return registro[1]
+
+    def quitar_mesa(self, mesa_id):
+        """Saca de la cola de espera todos los pedidos de una mesa (pago o reinicio)."""
+        for clave in [clave for clave in self._en_espera if clave[0] == mesa_id]:
+            self.quitar(*clave)
+
+    def observar_transicion(self, mesa_id, pedido, estado):
+        """Actualiza la cola y los promedios con un cambio de estado."""
+        clave = (mesa_id, pedido.get('id'))
+        if estado == 'enviado':
+            self._poner_en_espera(clave, pedido, len(self._en_espera) - (clave in self._en_espera))
+            return
+
+        cola_al_envio = self.quitar(mesa_id, pedido)
+        if estado == 'en_preparacion' and cola_al_envio is not None:
+            enviado = self._ultima_entrada(pedido, 'enviado')
+            preparacion = self._ultima_entrada(pedido, 'en_preparacion')
+            if enviado is not None and preparacion is not None:
+                espera = duracion_entre(enviado, preparacion)
+                if espera >= 0:
+                    self.espera_por_pedido.agregar(espera / (cola_al_envio + 1))
+        elif estado == 'listo':
+            self._aprender(pedido)
+
+    def coccion_estimada(self, pedido):
+        """Estima los segundos de cocción del pedido (plato, luego categoría, luego tiempo objetivo)."""
+        promedio = self.coccion_por_plato.get(pedido.get('nombre', 'Desconocido'))
+        if promedio and promedio.valor is not None:
+            return promedio.valor
+        categoria = self._categorias.get(pedido.get('plato_id'))
+        promedio = self.coccion_por_categoria.get(categoria)
+        if promedio and promedio.valor is not None:
+            return promedio.valor
+        return OBJETIVOS_PREPARACION.get(categoria, OBJETIVO_POR_DEFECTO) * 60
+
+    def estimar(self, mesa_id, pedido, ahora=None):
+        """Estima la hora en que el pedido estará listo, o None si no está en cocina."""
+        if not pedido.get('en_cocina', False) or pedido.get('entregado', False):
+            return None
+        historial = pedido.get('historial_estados', [])
+        estado = historial[-1].get('clave') if historial else None
+        if estado in ('listo', 'cancelado'):
+            return None
+
+        ahora = ahora or time.time()
+        coccion = self.coccion_estimada(pedido)
+        registro = self._en_espera.get((mesa_id, pedido.get('id')))
+
+        if estado == 'en_preparacion':
+            listo = max(ahora, self._ultimo_ts(pedido, 'en_preparacion') + coccion)
+        elif registro is not None:
+            espera = self.espera_por_pedido.valor or 0
+            adelante = bisect.bisect_left(self._llegadas, registro[2])
+            listo = max(ahora, self._ultimo_ts(pedido, 'enviado') + espera * (adelante + 1)) + coccion
+        else:
+            # Pedido sin historial con marcas de tiempo: se estima desde ahora con la cola completa
+            listo = ahora + (self.espera_por_pedido.valor or 0) * (len(self._en_espera) + 1) + coccion
+
+        return {
+            'listo_estimado': datetime.fromtimestamp(listo).strftime("%H:%M hs"),
+            'minutos_restantes': max(0, round((listo - ahora) / 60))
+        }
@@ -0,0 +1,203 @@
+import json
+import logging
+import os
+import struct
+import threading
+from datetime import datetime
+from .sistema_mesas import HISTORIAL_DIR
+
+logger = logging.getLogger(__name__)
+
+HISTORIAL_JSONL = os.path.join(HISTORIAL_DIR, 'historial.jsonl')
+# Formato anterior: un único arreglo JSON con todos los tickets
+HISTORIAL_JSON_LEGADO = os.path.join(HISTORIAL_DIR, 'historial.json')
+
+# Cada entrada del índice: posición de la línea en el .jsonl, la fecha más reciente hasta ese ticket
+# (no decreciente, para la búsqueda binaria) y la fecha del propio ticket (timestamps)
+REGISTRO_INDICE = struct.Struct('<qdd')
+# Índice del formato anterior (sin la fecha propia de cada ticket): se reemplaza al iniciar
+SUFIJO_INDICE_LEGADO = '.idx'
+REGISTROS_POR_LECTURA = 4096
+
+def timestamp_ticket(ticket):
+    """Timestamp de la fecha del ticket, o None si no tiene una fecha válida."""
+    try:
+        return datetime.strptime(ticket['fecha'], '%Y-%m-%d %H:%M:%S').timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+class HistorialPagos:
+    """Historial de tickets en JSON Lines (solo se agregan líneas) con un índice de posiciones.
+
+    No guarda tickets en memoria: se leen del disco cuando se piden, y el índice (de tamaño fijo
+    por ticket) permite saltar directo a un rango de fechas.
+    """
+
+    def __init__(self, archivo=HISTORIAL_JSONL, archivo_legado=HISTORIAL_JSON_LEGADO):
+        self.archivo = archivo
+        self.archivo_indice = os.path.splitext(archivo)[0] + '-v2.idx'
+        self.archivo_legado = archivo_legado
+        self._lock = threading.Lock()
+        self._ultimo_ts = 0.0
+
+        os.makedirs(os.path.dirname(self.archivo), exist_ok=True)
+        if os.path.exists(self.archivo_legado) and not os.path.exists(self.archivo):
+            self._migrar_legado()
+        if not self._indice_valido():
+            self.reconstruir_indice()
+        indice_legado = os.path.splitext(archivo)[0] + SUFIJO_INDICE_LEGADO
+        if os.path.exists(indice_legado):
+            os.remove(indice_legado)
+        cantidad = len(self)
+        if cantidad:
+            with open(self.archivo_indice, 'rb') as f_indice:
+                self._ultimo_ts = self._leer_registro(f_indice, cantidad - 1)[1]
+
+    def __len__(self):
+        try:
+            return os.path.getsize(self.archivo_indice) // REGISTRO_INDICE.size
+        except OSError:
+            return 0
+
+    def _leer_registro(self, f_indice, numero):
+        f_indice.seek(numero * REGISTRO_INDICE.size)
+        return REGISTRO_INDICE.unpack(f_indice.read(REGISTRO_INDICE.size))
+
+    def _indice_valido(self):
+        """El índice existe y su última entrada apunta a la última línea completa del historial."""
+        if not os.path.exists(self.archivo_indice):
+            return False
+        tamano_indice = os.path.getsize(self.archivo_indice)
+        tamano_datos = os.path.getsize(self.archivo) if os.path.exists(self.archivo) else 0
+        if tamano_indice % REGISTRO_INDICE.size:
+            return False
+        if tamano_indice == 0:
+            return tamano_datos == 0
+        with open(self.archivo_indice, 'rb') as f_indice:
+            posicion = self._leer_registro(f_indice, tamano_indice // REGISTRO_INDICE.size - 1)[0]
+        if posicion >= tamano_datos:
+            return False
+        with open(self.archivo, 'rb') as f:
+            f.seek(posicion)
+            linea = f.readline()
+            return linea.endswith(b'\n') and f.tell() == tamano_datos
+
+    def reconstruir_indice(self):
+        """Vuelve a generar el índice recorriendo el historial línea por línea.
+
+        Si la última línea quedó incompleta (corte durante una escritura) se descarta.
+        """
+        ultimo_ts = 0.0
+        cantidad = 0
+        with self._lock:
+            if not os.path.exists(self.archivo):
+                open(self.archivo, 'wb').close()
+            temporal = self.archivo_indice + '.temp'
+            with open(self.archivo, 'r+b') as f, open(temporal, 'wb') as f_indice:
+                posicion = 0
+                for linea in iter(f.readline, b''):
+                    if not linea.endswith(b'\n'):
+                        logger.warning("Línea incompleta al final del historial, se descarta")
+                        f.truncate(posicion)
+                        break
+                    try:
+                        ticket = json.loads(linea)
+                    except ValueError:
+                        logger.warning("Línea inválida en el historial (posición %s), se omite", posicion)
+                    else:
+                        ts = timestamp_ticket(ticket)
+                        ultimo_ts = max(ultimo_ts, ts or ultimo_ts)
+                        f_indice.write(REGISTRO_INDICE.pack(posicion, ultimo_ts, ultimo_ts if ts is None else ts))
+                        cantidad += 1
+                    posicion += len(linea)
+            os.replace(temporal, self.archivo_indice)
+            self._ultimo_ts = ultimo_ts
+        logger.info("Índice del historial reconstruido: %s tickets", cantidad)
+
+    def _migrar_legado(self):
+        """Convierte historial.json (arreglo único) al formato JSON Lines, ordenado por fecha."""
+        try:
+            with open(self.archivo_legado, 'r', encoding='utf-8') as f:
+                tickets = json.load(f)
+            tickets.sort(key=lambda t: timestamp_ticket(t) or 0)
+            temporal = self.archivo + '.temp'
+            with open(temporal, 'w', encoding='utf-8') as f:
+                for ticket in tickets:
+                    f.write(json.dumps(ticket, ensure_ascii=False) + '\n')
+            os.replace(temporal, self.archivo)
+            os.replace(self.archivo_legado, self.archivo_legado + '.migrado')
+            logger.info("Historial migrado a JSON Lines: %s tickets", len(tickets))
+        except Exception as e:
+            logger.error("Error al migrar historial.json: %s", e)
+
+    def agregar(self, ticket):
+        """Agrega un ticket al final del historial y devuelve su número (posición)."""
+        linea = (json.dumps(ticket, ensure_ascii=False) + '\n').encode('utf-8')
+        with self._lock:
+            # Primero la línea y después el índice: si se corta en el medio, el índice queda
+            # inválido y se reconstruye al iniciar
+            with open(self.archivo, 'ab') as f:
+                posicion = f.seek(0, os.SEEK_END)
+                f.write(linea)
+            # La fecha más reciente se mantiene no decreciente aunque llegue un ticket con fecha
+            # anterior (un reintento de la cola de tareas); la del ticket se guarda aparte
+            ts = timestamp_ticket(ticket)
+            self._ultimo_ts = max(self._ultimo_ts, ts or self._ultimo_ts)
+            with open(self.archivo_indice, 'ab') as f_indice:
+                numero = f_indice.seek(0, os.SEEK_END) // REGISTRO_INDICE.size
+                f_indice.write(REGISTRO_INDICE.pack(posicion, self._ultimo_ts, self._ultimo_ts if ts is None else ts))
+        return numero
+
+    def contiene_clave(self, ticket):
+        """Indica si ya hay un ticket con la clave de pago de `ticket` (solo revisa los de su fecha en adelante)."""
+        clave = ticket.get('clave')
+        if not clave:
+            return False
+        return any(t.get('clave') == clave for t in self.iterar(desde=timestamp_ticket(ticket)))
+
+    def obtener(self, numero):
+        """Devuelve el ticket número `numero` (0 es el más antiguo), o None si no existe."""
+        if not 0 <= numero < len(self):
+            return None
+        with open(self.archivo_indice, 'rb') as f_indice, open(self.archivo, 'rb') as f:
+            f.seek(self._leer_registro(f_indice, numero)[0])
+            return json.loads(f.readline())
+
+    def _primer_numero_desde(self, f_indice, cantidad, ts):
+        """Búsqueda binaria sobre el índice en disco: primer ticket cuya fecha más reciente es >= ts.
+
+        Ningún ticket anterior a ese tiene fecha >= ts.
+        """
+        inferior, superior = 0, cantidad
+        while inferior < superior:
+            medio = (inferior + superior) // 2
+            if self._leer_registro(f_indice, medio)[1] < ts:
+                inferior = medio + 1
+            else:
+                superior = medio
+        return inferior
+
+    def iterar(self, desde=None, hasta=None):
+        """Recorre los tickets con fecha en [desde, hasta) (timestamps), del más antiguo al más nuevo.
+
+        Lee el archivo de a un ticket, así que la memoria no depende del largo del historial.
+        Los tickets agregados durante el recorrido no se incluyen. Un ticket que se agregó tarde
+        (con fecha anterior a otros ya guardados) aparece en su propio día: por eso, pasado
+        `hasta`, se sigue leyendo el índice (no el historial) hasta el final.
+        """
+        cantidad = len(self)
+        if not cantidad:
+            return
+        with open(self.archivo_indice, 'rb') as f_indice, open(self.archivo, 'rb') as f:
+            numero = self._primer_numero_desde(f_indice, cantidad, desde) if desde is not None else 0
+            if numero >= cantidad:
+                return
+            f_indice.seek(numero * REGISTRO_INDICE.size)
+            while numero < cantidad:
+                bloque = f_indice.read(min(REGISTROS_POR_LECTURA, cantidad - numero) * REGISTRO_INDICE.size)
+                for posicion, _, ts in REGISTRO_INDICE.iter_unpack(bloque):
+                    numero += 1
+                    if (hasta is not None and ts >= hasta) or (desde is not None and ts < desde):
+                        continue
+                    f.seek(posicion)
+                    yield json.loads(f.readline())
@@ -0,0 +1,177 @@
+import threading
+import weakref
+
+# Límites (en segundos) de los histogramas de latencia
+BUCKETS_LATENCIA = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Límites (en cantidad de elementos) de los histogramas de recorridos
+BUCKETS_RECORRIDO = (10, 100, 1000, 10000, 100000, 1000000)
+# Acumuladores registrados a partir de los que se pliegan los de hilos terminados (aunque nadie exporte)
+MINIMO_PLEGADO = 64
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _formatear_etiquetas(etiquetas, extra=None):
+    pares = list(etiquetas) + ([extra] if extra else [])
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{clave}="{_escapar(valor)}"' for clave, valor in pares) + '}'
+
+def _formatear_numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) and not valor.is_integer() else str(int(valor))
+
+class _Acumulador:
+    """Valores de un hilo: solo ese hilo los escribe, así que no hace falta bloquear."""
+
+    __slots__ = ('valores', 'histogramas', '__weakref__')
+
+    def __init__(self):
+        self.valores = {}
+        self.histogramas = {}
+
+    def sumar(self, otro):
+        # `otro` puede ser de un hilo vivo que agrega claves mientras tanto: se suma una copia
+        for clave, valor in _copiar_items(otro.valores):
+            self.valores[clave] = self.valores.get(clave, 0) + valor
+        for clave, cubetas in _copiar_items(otro.histogramas):
+            propio = self.histogramas.setdefault(clave, [0] * len(cubetas))
+            for i, valor in enumerate(list(cubetas)):
+                propio[i] += valor
+
+def _copiar_items(diccionario):
+    """Copia los pares de un diccionario que otro hilo puede estar modificando."""
+    while True:
+        try:
+            return list(diccionario.items())
+        except RuntimeError:
+            # Cambió de tamaño durante la copia: se vuelve a intentar
+            continue
+
+class RegistroMetricas:
+    """Métricas en formato Prometheus acumuladas por hilo y combinadas solo al exportar."""
+
+    def __init__(self):
+        self._definiciones = {}
+        self._local = threading.local()
+        # (hilo, acumulador) de cada hilo que registró algo; el lock solo se usa al aparecer un hilo nuevo o al exportar
+        self._acumuladores = []
+        self._retirados = _Acumulador()
+        self._limite_plegado = MINIMO_PLEGADO
+        self._lock = threading.Lock()
+
+    def definir(self, nombre, tipo, ayuda, buckets=None):
+        """Declara una métrica ('counter', 'gauge' o 'histogram')."""
+        self._definiciones[nombre] = (tipo, ayuda, tuple(buckets or ()))
+
+    def _acumulador(self):
+        acumulador = getattr(self._local, 'acumulador', None)
+        if acumulador is None:
+            acumulador = self._local.acumulador = _Acumulador()
+            with self._lock:
+                self._acumuladores.append((weakref.ref(threading.current_thread()), acumulador))
+                # Con un hilo por pedido la lista crecería sin límite si nadie lee /metrics: al duplicarse
+                # desde el último plegado se suman los hilos terminados, así el costo queda amortizado
+                if len(self._acumuladores) >= self._limite_plegado:
+                    self._plegar_terminados()
+        return acumulador
+
+    def _plegar_terminados(self):
+        """Pasa los acumuladores de hilos terminados al acumulador fijo (con el lock tomado)."""
+        vivos = []
+        for referencia, acumulador in self._acumuladores:
+            hilo = referencia()
+            if hilo is None or not hilo.is_alive():
+                self._retirados.sumar(acumulador)
+            else:
+                vivos.append((referencia, acumulador))
+        self._acumuladores = vivos
+        self._limite_plegado = max(MINIMO_PLEGADO, 2 * len(vivos))
+        return vivos
+
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        """Suma a un contador o a un gauge (un valor negativo lo resta)."""
+        valores = self._acumulador().valores
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        valores[clave] = valores.get(clave, 0) + valor
+
+    def observar(self, nombre, valor, **etiquetas):
+        """Registra una observación en un histograma."""
+        buckets = self._definiciones[nombre][2]
+        histogramas = self._acumulador().histogramas
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        cubetas = histogramas.get(clave)
+        if cubetas is None:
+            # Una cubeta por límite, más el total (+Inf), la suma y la cantidad
+            cubetas = histogramas[clave] = [0] * (len(buckets) + 3)
+        for i, limite in enumerate(buckets):
+            if valor <= limite:
+                cubetas[i] += 1
+                break
+        else:
+            cubetas[len(buckets)] += 1
+        cubetas[-2] += valor
+        cubetas[-1] += 1
+
+    def _combinar(self):
+        """Suma los acumuladores de todos los hilos; los de hilos terminados se pasan a un acumulador fijo."""
+        total = _Acumulador()
+        with self._lock:
+            vivos = self._plegar_terminados()
+            total.sumar(self._retirados)
+        for _, acumulador in vivos:
+            total.sumar(acumulador)
+        return total
+
+    def exportar(self):
+        """Devuelve todas las métricas en el formato de texto de Prometheus."""
+        total = self._combinar()
+        lineas = []
+        for nombre, (tipo, ayuda, buckets) in sorted(self._definiciones.items()):
+            lineas.append(f'# HELP {nombre} {ayuda}')
+            lineas.append(f'# TYPE {nombre} {tipo}')
+            if tipo == 'histogram':
+                for (metrica, etiquetas), cubetas in sorted(total.histogramas.items()):
+                    if metrica != nombre:
+                        continue
+                    acumulado = 0
+                    for limite, cantidad in zip(buckets + (float('inf'),), cubetas):
+                        acumulado += cantidad
+                        lineas.append(f'{nombre}_bucket{_formatear_etiquetas(etiquetas, ("le", _formatear_numero(limite)))} {acumulado}')
+                    lineas.append(f'{nombre}_sum{_formatear_etiquetas(etiquetas)} {_formatear_numero(cubetas[-2])}')
+                    lineas.append(f'{nombre}_count{_formatear_etiquetas(etiquetas)} {cubetas[-1]}')
+            else:
+                for (metrica, etiquetas), valor in sorted(total.valores.items()):
+                    if metrica == nombre:
+                        lineas.append(f'{nombre}{_formatear_etiquetas(etiquetas)} {_formatear_numero(valor)}')
+        return '\n'.join(lineas) + '\n'
+
+    def observar_recorrido(self, iterador, elementos):
+        """Registra cuántos elementos recorrió una búsqueda o listado completo."""
+        self.observar('definity_recorrido_elementos', elementos, iterador=iterador)
+
+registro_metricas = RegistroMetricas()
+registro_metricas.definir('definity_http_request_duration_seconds', 'histogram',
+                          'Latencia de los pedidos HTTP por ruta y método.', BUCKETS_LATENCIA)
+registro_metricas.definir('definity_http_requests_total', 'counter',
+                          'Pedidos HTTP atendidos por ruta, método y código de estado.')
+registro_metricas.definir('definity_http_requests_in_flight', 'gauge',
+                          'Pedidos HTTP en curso por ruta.')
+registro_metricas.definir('definity_http_response_bytes_total', 'counter',
+                          'Bytes enviados en las respuestas HTTP por ruta.')
+registro_metricas.definir('definity_guardar_mesas_duration_seconds', 'histogram',
+                          'Duración de guardar_mesas.', BUCKETS_LATENCIA)
+registro_metricas.definir('definity_guardar_mesas_bytes_total', 'counter',
+                          'Bytes escritos en mesas.json por guardar_mesas.')
+registro_metricas.definir('definity_guardar_mesas_errores_total', 'counter',
+                          'Guardados de mesas.json que fallaron.')
+registro_metricas.definir('definity_cola_tareas_pendientes', 'gauge',
+                          'Tareas en segundo plano encoladas, en ejecución o esperando reintento.')
+registro_metricas.definir('definity_cola_tareas_total', 'counter',
+                          'Ejecuciones de tareas en segundo plano por tipo y resultado (hecha, reintento, fallida).')
+registro_metricas.definir('definity_cola_tareas_atascadas', 'gauge',
+                          'Tareas que superaron los intentos normales y se siguen reintentando.')
+registro_metricas.definir('definity_recorrido_elementos', 'histogram',
+                          'Elementos recorridos por los listados y búsquedas que revisan todas las mesas.',
+                          BUCKETS_RECORRIDO)
@@ -0,0 +1,144 @@
+import json
+import logging
+import math
+import os
+import threading
+from .sistema_mesas import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+INVENTARIO_JSON = os.path.join(DATA_DIR, 'inventario.json')
+
+# Stock con el que arranca cada ingrediente si no hay inventario guardado
+STOCK_INICIAL = 50
+
+class SistemaInventario:
+    """Stock de ingredientes que descuenta los pedidos enviados a cocina y actualiza la disponibilidad del menú."""
+
+    def __init__(self, sistema_mesas, archivo=INVENTARIO_JSON):
+        """Arma las recetas y el índice inverso desde el menú y carga el stock."""
+        self.sistema_mesas = sistema_mesas
+        self.archivo = archivo
+        self.recetas = {}
+        self.platos_por_ingrediente = {}
+        self.nombres = {}
+        # Platos sin stock suficiente; se informan al sistema de mesas sin tocar el menú
+        self.agotados = set()
+        self._lock_guardado = threading.Lock()
+        self._construir_recetas(sistema_mesas.instantanea_menu().menu)
+        self.stock = self._cargar_stock()
+        self._actualizar_disponibilidad(self.recetas)
+        sistema_mesas.agregar_observador_menu(self._al_cambiar_menu)
+
+    def _construir_recetas(self, menu):
+        """Deriva la receta de cada plato (una porción de cada ingrediente) y el índice ingrediente -> platos."""
+        recetas = {}
+        platos_por_ingrediente = {}
+        nombres = {}
+        for etapa in menu.get('platos', {}).values():
+            for platos in etapa.values():
+                for plato in platos:
+                    plato_id = plato.get('id')
+                    nombres[plato_id] = plato['nombre']
+                    recetas[plato_id] = {ingrediente: 1 for ingrediente in plato.get('ingredientes', [])}
+                    for ingrediente in recetas[plato_id]:
+                        platos_por_ingrediente.setdefault(ingrediente, set()).add(plato_id)
+        self.recetas = recetas
+        self.platos_por_ingrediente = platos_por_ingrediente
+        self.nombres = nombres
+
+    def _al_cambiar_menu(self, instantanea):
+        """Observador del menú: rearma las recetas y recalcula la disponibilidad de todos los platos."""
+        self._construir_recetas(instantanea.menu)
+        for ingrediente in self.platos_por_ingrediente:
+            self.stock.setdefault(ingrediente, STOCK_INICIAL)
+        self.agotados &= set(self.recetas)
+        self._actualizar_disponibilidad(self.recetas)
+        self.sistema_mesas.fijar_agotados(self.agotados)
+
+    def _cargar_stock(self):
+        """Carga el stock guardado; los ingredientes nuevos arrancan con el stock inicial."""
+        stock = {}
+        try:
+            if os.path.exists(self.archivo):
+                with open(self.archivo, 'r', encoding='utf-8') as f:
+                    stock = json.load(f)
+        except Exception as e:
+            logger.error("Error al cargar inventario: %s", e)
+        for ingrediente in self.platos_por_ingrediente:
+            stock.setdefault(ingrediente, STOCK_INICIAL)
+        return stock
+
+    def guardar_stock(self):
+        """Guarda el stock en el archivo JSON (escritura atómica)."""
+        archivo_temp = self.archivo + ".temp"
+        try:
+            with self._lock_guardado:
+                with open(archivo_temp, 'w', encoding='utf-8') as f_temp:
+                    json.dump(self.stock, f_temp, indent=2, ensure_ascii=False)
+                os.replace(archivo_temp, self.archivo)
+        except Exception as e:
+            logger.error("Error al guardar inventario: %s", e)
+            return False
+        return True
+
+    def _actualizar_disponibilidad(self, platos_afectados):
+        """Recalcula si hay stock solo para los platos indicados."""
+        cambios = False
+        for plato_id in platos_afectados:
+            receta = self.recetas.get(plato_id, {})
+            disponible = all(self.stock.get(ingrediente, 0) >= cantidad for ingrediente, cantidad in receta.items())
+            if (plato_id not in self.agotados) != disponible:
+                if disponible:
+                    self.agotados.discard(plato_id)
+                else:
+                    self.agotados.add(plato_id)
+                cambios = True
+        if cambios:
+            self.sistema_mesas.fijar_agotados(self.agotados)
+        return cambios
+
+    def _aplicar(self, pedido, signo):
+        """Suma o resta del stock los ingredientes del pedido y actualiza los platos afectados."""
+        receta = self.recetas.get(pedido.get('plato_id'))
+        if not receta:
+            return False
+        porciones = pedido.get('cantidad', 1)
+        afectados = set()
+        for ingrediente, cantidad in receta.items():
+            self.stock[ingrediente] = self.stock.get(ingrediente, 0) + signo * cantidad * porciones
+            afectados |= self.platos_por_ingrediente[ingrediente]
+        self._actualizar_disponibilidad(afectados)
+        return self.guardar_stock()
+
+    def descontar(self, pedido):
+        """Descuenta del stock los ingredientes de un pedido enviado a cocina."""
+        return self._aplicar(pedido, -1)
+
+    def restaurar(self, pedido):
+        """Devuelve al stock los ingredientes de un pedido cancelado."""
+        return self._aplicar(pedido, 1)
+
+    def reponer(self, ingrediente, cantidad):
+        """Suma stock a un ingrediente y devuelve el stock resultante."""
+        if ingrediente not in self.platos_por_ingrediente:
+            raise ValueError(f"Ingrediente desconocido: {ingrediente}")
+        # bool es un int para Python; NaN e Infinity no son JSON válido y dejarían el stock inutilizable
+        if not isinstance(cantidad, (int, float)) or isinstance(cantidad, bool) or not math.isfinite(cantidad):
+            raise ValueError("La cantidad a reponer debe ser un número finito")
+        if cantidad <= 0:
+            raise ValueError("La cantidad a reponer debe ser mayor a cero")
+        self.stock[ingrediente] = self.stock.get(ingrediente, 0) + cantidad
+        self._actualizar_disponibilidad(self.platos_por_ingrediente[ingrediente])
+        self.guardar_stock()
+        return self.stock[ingrediente]
+
+    def obtener_stock(self):
+        """Obtiene el stock de cada ingrediente y los platos que lo usan."""
+        return {
+            ingrediente: {
+                'stock': self.stock.get(ingrediente, 0),
+                'platos': sorted(self.nombres[p] for p in platos)
+            }
+            for ingrediente, platos in sorted(self.platos_por_ingrediente.items())
+        }
@@ -0,0 +1,101 @@
+import threading
+import time
+from datetime import datetime
+
+class LotesCocina:
+    """Agrupa los pedidos activos de cocina por plato entre todas las mesas."""
+
+    def __init__(self, sistema_mesas):
+        """Inicializa los grupos con los pedidos que ya están en cocina."""
+        self.sistema_mesas = sistema_mesas
+        # plato_id -> {(mesa_id, pedido_id): (pedido, enviado)} en orden de envío
+        self.grupos = {}
+        # Las transiciones (POST/PUT) modifican los grupos mientras GET /api/cocina/lotes los recorre
+        self._lock = threading.Lock()
+        self._cargar_pedidos_activos()
+
+    def _cargar_pedidos_activos(self):
+        """Agrega los pedidos que estaban en cocina al iniciar el sistema."""
+        for mesa_id, mesa_data in self.sistema_mesas.mesas.items():
+            mesa = mesa_data[0]
+            for i in range(1, mesa.get('capacidad', 0) + 1):
+                cliente = mesa.get(f"cliente_{i}")
+                if cliente and cliente.get('nombre'):
+                    for pedido in cliente.get('pedidos', []):
+                        if self._en_preparacion(pedido):
+                            envios = [h['ts'] for h in pedido.get('historial_estados', [])
+                                      if h.get('clave') == 'enviado' and 'ts' in h]
+                            self.agregar(mesa_id, pedido, envios[-1] if envios else None)
+
+    def _en_preparacion(self, pedido):
+        """Indica si el pedido todavía debe prepararse."""
+        return (pedido.get('en_cocina', False)
+                and not pedido.get('entregado', False)
+                and pedido.get('estado_cocina') not in ('✅ LISTO PARA ENTREGAR', '🔴 CANCELADO'))
+
+    def agregar(self, mesa_id, pedido, enviado=None):
+        """Agrega un pedido al grupo de su plato."""
+        plato_id = str(pedido.get('plato_id'))
+        with self._lock:
+            grupo = self.grupos.setdefault(plato_id, {})
+            grupo[(mesa_id, pedido.get('id'))] = (pedido, enviado or time.time())
+
+    def quitar(self, mesa_id, pedido):
+        """Saca un pedido de su grupo."""
+        plato_id = str(pedido.get('plato_id'))
+        with self._lock:
+            grupo = self.grupos.get(plato_id)
+            if grupo is None:
+                return
+            grupo.pop((mesa_id, pedido.get('id')), None)
+            if not grupo:
+                del self.grupos[plato_id]
+
+    def quitar_mesa(self, mesa_id):
+        """Saca de los grupos todos los pedidos de una mesa (pago o reinicio)."""
+        with self._lock:
+            for plato_id in list(self.grupos):
+                grupo = self.grupos[plato_id]
+                for clave in [clave for clave in grupo if clave[0] == mesa_id]:
+                    del grupo[clave]
+                if not grupo:
+                    del self.grupos[plato_id]
+
+    def pedidos_del_lote(self, plato_id):
+        """Devuelve [(mesa_id, pedido)] del lote de un plato, en orden de envío."""
+        with self._lock:
+            return [(mesa_id, pedido) for (mesa_id, _), (pedido, _) in self.grupos.get(str(plato_id), {}).items()]
+
+    def obtener_lotes(self):
+        """Obtiene los lotes con su cantidad total, el envío más antiguo y el detalle por mesa."""
+        with self._lock:
+            copia = [(plato_id, list(grupo.items())) for plato_id, grupo in self.grupos.items()]
+
+        lotes = []
+        for plato_id, grupo in copia:
+            por_mesa = {}
+            pedidos = []
+            for (mesa_id, pedido_id), (pedido, _) in grupo:
+                por_mesa[mesa_id] = por_mesa.get(mesa_id, 0) + pedido.get('cantidad', 1)
+                pedidos.append({
+                    'id': pedido_id,
+                    'mesa_id': mesa_id,
+                    'cantidad': pedido.get('cantidad', 1),
+                    'estado_cocina': pedido.get('estado_cocina'),
+                    'notas': pedido.get('notas', [])
+                })
+
+            primero = grupo[0][1]
+            mas_antiguo = min(enviado for _, (_, enviado) in grupo)
+            lotes.append((-sum(por_mesa.values()), mas_antiguo, {
+                'plato_id': plato_id,
+                'nombre': primero[0].get('nombre', 'Desconocido'),
+                'cantidad': sum(por_mesa.values()),
+                'enviado_mas_antiguo': datetime.fromtimestamp(mas_antiguo).strftime("%H:%M hs"),
+                'mesas': por_mesa,
+                'pedidos': pedidos
+            }))
+
+        # Primero los lotes más grandes y, a igual cantidad, los que esperan hace más tiempo
+        lotes.sort(key=lambda lote: lote[:2])
+        return [lote for _, _, lote in lotes]
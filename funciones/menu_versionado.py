@@ -0,0 +1,97 @@
+from .estaciones_cocina import construir_rutas_estaciones
+from .metricas_cocina import categorias_por_plato, etapas_por_plato
+
+def es_id_numerico(plato_id):
+    """Indica si el id de un plato es numérico (bool es un int para Python, pero no es un id válido)."""
+    return isinstance(plato_id, int) and not isinstance(plato_id, bool)
+
+class InstantaneaMenu:
+    """Una versión cargada del menú con sus índices derivados.
+
+    No se modifica una vez armada: un cambio en el menú arma una instantánea nueva y la
+    reemplaza entera, así que quien ya tiene una referencia sigue viendo la misma versión.
+    """
+
+    def __init__(self, menu, version):
+        self.menu = menu
+        self.version = version
+        self.estacion_por_plato = construir_rutas_estaciones(menu)
+        self.categorias = categorias_por_plato(menu)
+        self.etapas = etapas_por_plato(menu)
+        # Plato por id (como texto: en menu.json los ids pueden ser números o textos)
+        self.platos_por_id = {}
+        # Lista numerada de todos los platos, en el orden en que se muestra el menú
+        self.indexado = []
+        # Posiciones [inicio, fin) de cada (etapa, categoría) dentro de indexado
+        self.rangos = {}
+        for etapa in sorted(menu['platos'].keys()):
+            for categoria, platos in sorted(menu['platos'][etapa].items()):
+                inicio = len(self.indexado)
+                for plato in platos:
+                    self.platos_por_id[str(plato.get('id'))] = plato
+                    self.indexado.append({'etapa': etapa, 'categoria': categoria, 'plato': plato,
+                                          'index': len(self.indexado) + 1})
+                self.rangos[(etapa, categoria)] = (inicio, len(self.indexado))
+        # Próximo id numérico a asignar: se guarda en menu.json para no reusar el de un plato eliminado
+        self.siguiente_id = max([menu.get('siguiente_id', 1)]
+                                + [plato_id + 1 for plato_id in self.categorias if es_id_numerico(plato_id)])
+
+    def derivar(self, menu, version, etapa, categoria):
+        """Instantánea de `menu`, que solo difiere de esta en la categoría (etapa, categoria).
+
+        Reusa los índices del resto del menú: rearma las entradas de esa categoría y, si cambió
+        la cantidad de platos, renumera las que vienen después.
+        """
+        nueva = InstantaneaMenu.__new__(InstantaneaMenu)
+        nueva.menu = menu
+        nueva.version = version
+        nueva.siguiente_id = menu.get('siguiente_id', self.siguiente_id)
+        anteriores = self.menu['platos'].get(etapa, {}).get(categoria, [])
+        existe = categoria in menu['platos'].get(etapa, {})
+        platos = menu['platos'][etapa][categoria] if existe else []
+
+        ids_anteriores = [plato.get('id') for plato in anteriores]
+        nueva.platos_por_id = dict(self.platos_por_id)
+        for plato_id in ids_anteriores:
+            nueva.platos_por_id.pop(str(plato_id), None)
+        for plato in platos:
+            nueva.platos_por_id[str(plato.get('id'))] = plato
+        if [plato.get('id') for plato in platos] == ids_anteriores:
+            nueva.estacion_por_plato = self.estacion_por_plato
+            nueva.categorias = self.categorias
+            nueva.etapas = self.etapas
+        else:
+            parcial = {'platos': {etapa: {categoria: platos}}}
+            for nombre, construir in (('estacion_por_plato', construir_rutas_estaciones),
+                                      ('categorias', categorias_por_plato),
+                                      ('etapas', etapas_por_plato)):
+                mapa = dict(getattr(self, nombre))
+                for plato_id in ids_anteriores:
+                    mapa.pop(plato_id, None)
+                mapa.update(construir(parcial))
+                setattr(nueva, nombre, mapa)
+
+        clave = (etapa, categoria)
+        if clave in self.rangos:
+            inicio, fin = self.rangos[clave]
+        else:
+            siguientes = [rango for otra, rango in self.rangos.items() if otra > clave]
+            inicio = fin = min(siguientes)[0] if siguientes else len(self.indexado)
+        segmento = [{'etapa': etapa, 'categoria': categoria, 'plato': plato, 'index': inicio + i + 1}
+                    for i, plato in enumerate(platos)]
+        desplazamiento = len(segmento) - (fin - inicio)
+        resto = self.indexado[fin:]
+        if desplazamiento:
+            resto = [dict(item, index=item['index'] + desplazamiento) for item in resto]
+        nueva.indexado = self.indexado[:inicio] + segmento + resto
+
+        nueva.rangos = {}
+        for otra, (desde, hasta) in self.rangos.items():
+            if otra > clave:
+                desde, hasta = desde + desplazamiento, hasta + desplazamiento
+            nueva.rangos[otra] = (desde, hasta)
+        if existe:
+            nueva.rangos[clave] = (inicio, inicio + len(segmento))
+        else:
+            nueva.rangos.pop(clave, None)
+        return nueva
@@ -0,0 +1,155 @@
+import bisect
+import math
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+# Ciclo de vida de un pedido, en orden
+ESTADOS_CICLO = ['creado', 'enviado', 'en_preparacion', 'listo', 'entregado']
+
+DIMENSIONES = ('plato', 'categoria', 'hora')
+
+# Identifica este proceso: el reloj monótono solo se puede comparar entre marcas del mismo proceso
+PROCESO = uuid.uuid4().hex[:12]
+
+def marcar_transicion(pedido, estado, etiqueta=None):
+    """Agrega al historial del pedido un cambio de estado con su marca de tiempo (epoch).
+
+    Guarda además el reloj monótono del proceso, que no salta si se ajusta la hora del sistema.
+    """
+    ahora = time.time()
+    if 'historial_estados' not in pedido:
+        pedido['historial_estados'] = []
+    pedido['historial_estados'].append({
+        'estado': etiqueta or estado,
+        'clave': estado,
+        'hora': datetime.fromtimestamp(ahora).strftime("%H:%M hs"),
+        'ts': ahora,
+        'mono': time.monotonic(),
+        'proceso': PROCESO
+    })
+    return ahora
+
+def duracion_entre(anterior, siguiente):
+    """Segundos entre dos entradas del historial: con el reloj monótono si son del mismo proceso."""
+    if anterior.get('proceso') == siguiente.get('proceso') and 'mono' in anterior and 'mono' in siguiente:
+        return siguiente['mono'] - anterior['mono']
+    # Entradas de otro proceso (antes de un reinicio): solo queda la hora del sistema
+    return siguiente['ts'] - anterior['ts']
+
+def categorias_por_plato(menu):
+    """Mapea el id de cada plato del menú a su categoría."""
+    categorias = {}
+    for etapa in menu.get('platos', {}).values():
+        for categoria, platos in etapa.items():
+            for plato in platos:
+                categorias[plato.get('id')] = categoria
+    return categorias
+
+def etapas_por_plato(menu):
+    """Mapea el id de cada plato del menú a su etapa (entrada, principal, postre, bebida)."""
+    etapas = {}
+    for etapa, categorias in menu.get('platos', {}).items():
+        for platos in categorias.values():
+            for plato in platos:
+                etapas[plato.get('id')] = etapa
+    return etapas
+
+def _percentil(muestras_ordenadas, p):
+    """Calcula el percentil p (0-100) por el método del rango más cercano."""
+    if not muestras_ordenadas:
+        return None
+    indice = max(0, math.ceil(p / 100 * len(muestras_ordenadas)) - 1)
+    return muestras_ordenadas[indice]
+
+class VentanaOrdenada:
+    """Últimas `maximo` muestras, guardadas también ordenadas: un percentil es un acceso por índice."""
+
+    def __init__(self, maximo):
+        self.llegadas = deque()
+        self.ordenadas = []
+        self.maximo = maximo
+
+    def __len__(self):
+        return len(self.ordenadas)
+
+    def agregar(self, muestra):
+        """Agrega una muestra y, si la ventana está llena, descarta la más antigua (O(log n) + desplazamiento)."""
+        if len(self.llegadas) == self.maximo:
+            del self.ordenadas[bisect.bisect_left(self.ordenadas, self.llegadas.popleft())]
+        self.llegadas.append(muestra)
+        bisect.insort(self.ordenadas, muestra)
+
+class MetricasCocina:
+    """Métricas de latencia de cocina: tiempo que pasa cada pedido en cada estado."""
+
+    def __init__(self, sistema_mesas, max_muestras=2000):
+        """Inicializa las muestras y las completa con los pedidos que ya están en las mesas."""
+        self.sistema_mesas = sistema_mesas
+        self.max_muestras = max_muestras
+        self.muestras = {dimension: {} for dimension in DIMENSIONES}
+        self._categorias = sistema_mesas.instantanea_menu().categorias
+        sistema_mesas.agregar_observador_menu(self._al_cambiar_menu)
+        self._cargar_pedidos_existentes()
+
+    def _al_cambiar_menu(self, instantanea):
+        """Observador del menú: usa las categorías de la versión nueva."""
+        self._categorias = instantanea.categorias
+
+    def _cargar_pedidos_existentes(self):
+        """Registra las transiciones de los pedidos que ya tienen historial con marcas de tiempo."""
+        for mesa_data in self.sistema_mesas.mesas.values():
+            mesa = mesa_data[0]
+            for i in range(1, mesa.get('capacidad', 0) + 1):
+                cliente = mesa.get(f"cliente_{i}")
+                if cliente and cliente.get('nombre'):
+                    for pedido in cliente.get('pedidos', []):
+                        historial = [h for h in pedido.get('historial_estados', []) if 'ts' in h]
+                        for anterior, siguiente in zip(historial, historial[1:]):
+                            self._registrar_muestra(pedido, anterior, siguiente)
+
+    def _registrar_muestra(self, pedido, anterior, siguiente):
+        """Guarda la duración del estado 'anterior' en cada dimensión."""
+        duracion = duracion_entre(anterior, siguiente)
+        if duracion < 0:
+            return
+        estado = anterior.get('clave', anterior.get('estado'))
+        valores = {
+            'plato': pedido.get('nombre', 'Desconocido'),
+            'categoria': self._categorias.get(pedido.get('plato_id'), 'sin categoría'),
+            'hora': datetime.fromtimestamp(anterior['ts']).strftime("%H:00")
+        }
+        for dimension, valor in valores.items():
+            por_estado = self.muestras[dimension].setdefault(valor, {})
+            if estado not in por_estado:
+                por_estado[estado] = VentanaOrdenada(self.max_muestras)
+            por_estado[estado].agregar(duracion)
+
+    def observar_transicion(self, pedido):
+        """Registra la duración del estado que el pedido acaba de abandonar."""
+        historial = pedido.get('historial_estados', [])
+        if len(historial) < 2:
+            return
+        anterior, siguiente = historial[-2], historial[-1]
+        if 'ts' in anterior and 'ts' in siguiente:
+            self._registrar_muestra(pedido, anterior, siguiente)
+
+    def percentiles(self, dimension='plato'):
+        """Obtiene p50/p95/p99 (en segundos) del tiempo en cada estado, agrupado por dimensión."""
+        if dimension not in DIMENSIONES:
+            raise ValueError(f"Dimensión inválida: {dimension}")
+
+        resultado = {}
+        for valor, por_estado in sorted(self.muestras[dimension].items()):
+            resultado[valor] = {}
+            orden = sorted(por_estado, key=lambda e: ESTADOS_CICLO.index(e) if e in ESTADOS_CICLO else len(ESTADOS_CICLO))
+            for estado in orden:
+                ordenadas = por_estado[estado].ordenadas
+                resultado[valor][estado] = {
+                    'p50': round(_percentil(ordenadas, 50), 1),
+                    'p95': round(_percentil(ordenadas, 95), 1),
+                    'p99': round(_percentil(ordenadas, 99), 1),
+                    'muestras': len(ordenadas)
+                }
+        return resultado
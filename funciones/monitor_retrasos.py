@@ -0,0 +1,192 @@
+import heapq
+import logging
+import threading
+import time
+from itertools import count
+
+logger = logging.getLogger(__name__)
+
+# Tiempo objetivo de preparación (en minutos) por categoría del menú
+OBJETIVOS_PREPARACION = {
+    'ensaladas': 10,
+    'dips': 8,
+    'sopas': 10,
+    'fritos': 12,
+    'otros': 12,
+    'carnes rojas': 25,
+    'pollo': 20,
+    'pescados': 22,
+    'pastas': 18,
+    'vegetarianos/veganos': 18,
+    'tartas': 8,
+    'chocolate': 8,
+    'cremas': 8,
+    'helados': 5,
+    'refrescos': 5,
+    'cafés': 5,
+    'tés': 5,
+    'chocolates': 6
+}
+OBJETIVO_POR_DEFECTO = 15
+
+# Múltiplos del tiempo objetivo que disparan una notificación
+UMBRALES_RETRASO = [1.0, 1.5, 2.0]
+
+def pedido_en_mesa(sistema_mesas, mesa_id, pedido):
+    """Verifica que el pedido no haya sido quitado de la mesa (pago o reinicio)."""
+    mesa_data = sistema_mesas.mesas.get(mesa_id)
+    if not mesa_data:
+        return False
+    mesa = mesa_data[0]
+    for i in range(1, mesa.get('capacidad', 0) + 1):
+        cliente = mesa.get(f"cliente_{i}")
+        if cliente and any(p is pedido for p in cliente.get('pedidos', [])):
+            return True
+    return False
+
+class MonitorRetrasos:
+    """Controla los pedidos activos en cocina contra su tiempo objetivo y avisa los retrasos."""
+
+    def __init__(self, sistema_mesas, notificaciones, objetivos=None, intervalo=30, intervalo_actualizacion=60):
+        """Inicializa el monitor y programa los pedidos que ya están en cocina."""
+        self.sistema_mesas = sistema_mesas
+        self.notificaciones = notificaciones
+        self.objetivos = objetivos if objetivos is not None else OBJETIVOS_PREPARACION
+        self.intervalo = intervalo
+        self.intervalo_actualizacion = intervalo_actualizacion
+        self._categorias = sistema_mesas.instantanea_menu().categorias
+        sistema_mesas.agregar_observador_menu(self._al_cambiar_menu)
+
+        # Montículo ordenado por vencimiento: (vence, secuencia, (mesa_id, pedido_id))
+        self._vencimientos = []
+        self._secuencia = count()
+        self._seguimiento = {}
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+
+        self._cargar_pedidos_activos()
+
+    def _al_cambiar_menu(self, instantanea):
+        """Observador del menú: usa las categorías de la versión nueva."""
+        self._categorias = instantanea.categorias
+
+    def _cargar_pedidos_activos(self):
+        """Programa los pedidos que estaban en cocina al iniciar el sistema."""
+        for mesa_id, mesa_data in self.sistema_mesas.mesas.items():
+            mesa = mesa_data[0]
+            for i in range(1, mesa.get('capacidad', 0) + 1):
+                cliente = mesa.get(f"cliente_{i}")
+                if cliente and cliente.get('nombre'):
+                    for pedido in cliente.get('pedidos', []):
+                        if self._esta_activo(pedido):
+                            envios = [h['ts'] for h in pedido.get('historial_estados', [])
+                                      if h.get('clave') == 'enviado' and 'ts' in h]
+                            self.programar(mesa_id, pedido, envios[-1] if envios else None)
+
+    def objetivo_minutos(self, pedido):
+        """Obtiene el tiempo objetivo de preparación del pedido según su categoría."""
+        categoria = self._categorias.get(pedido.get('plato_id'))
+        return self.objetivos.get(categoria, OBJETIVO_POR_DEFECTO)
+
+    def _esta_activo(self, pedido):
+        """Indica si el pedido sigue esperando en cocina."""
+        return (pedido.get('en_cocina', False)
+                and not pedido.get('entregado', False)
+                and pedido.get('estado_cocina') not in ('✅ LISTO PARA ENTREGAR', '🔴 CANCELADO'))
+
+    def programar(self, mesa_id, pedido, inicio=None):
+        """Empieza a seguir un pedido enviado a cocina."""
+        inicio = inicio or time.time()
+        objetivo = self.objetivo_minutos(pedido)
+        clave = (mesa_id, pedido.get('id'))
+        with self._lock:
+            self._seguimiento[clave] = {
+                'pedido': pedido,
+                'inicio': inicio,
+                'objetivo': objetivo,
+                'umbral': 0
+            }
+            heapq.heappush(self._vencimientos, (inicio + objetivo * UMBRALES_RETRASO[0] * 60, next(self._secuencia), clave))
+
+    def descartar(self, mesa_id, pedido):
+        """Deja de seguir un pedido (su entrada del montículo se ignora al vencer)."""
+        with self._lock:
+            self._seguimiento.pop((mesa_id, pedido.get('id')), None)
+
+    def quitar_mesa(self, mesa_id):
+        """Deja de seguir todos los pedidos de una mesa (pago o reinicio)."""
+        with self._lock:
+            for clave in [clave for clave in self._seguimiento if clave[0] == mesa_id]:
+                del self._seguimiento[clave]
+
+    def revisar(self, ahora=None):
+        """Evalúa solo los pedidos vencidos, actualiza su retraso y avisa los umbrales superados."""
+        ahora = ahora or time.time()
+        hubo_cambios = False
+
+        with self._lock:
+            while self._vencimientos and self._vencimientos[0][0] <= ahora:
+                _, _, clave = heapq.heappop(self._vencimientos)
+                seguimiento = self._seguimiento.get(clave)
+                if not seguimiento:
+                    continue
+
+                mesa_id = clave[0]
+                pedido = seguimiento['pedido']
+                if not self._esta_activo(pedido) or not pedido_en_mesa(self.sistema_mesas, mesa_id, pedido):
+                    del self._seguimiento[clave]
+                    continue
+
+                transcurrido = (ahora - seguimiento['inicio']) / 60
+                objetivo = seguimiento['objetivo']
+                pedido['retraso_minutos'] = max(0, int(transcurrido - objetivo))
+                hubo_cambios = True
+
+                umbral_previo = seguimiento['umbral']
+                while seguimiento['umbral'] < len(UMBRALES_RETRASO) and transcurrido >= objetivo * UMBRALES_RETRASO[seguimiento['umbral']]:
+                    seguimiento['umbral'] += 1
+                if seguimiento['umbral'] > umbral_previo:
+                    self.notificaciones.registrar_notificacion(
+                        mesa_id,
+                        f"⏰ {pedido.get('nombre', 'Pedido')} demorado {pedido['retraso_minutos']} min (objetivo: {objetivo} min)",
+                        tipo="retraso"
+                    )
+
+                # Mientras esté demorado se vuelve a revisar periódicamente para actualizar el retraso
+                proximo = ahora + self.intervalo_actualizacion
+                if seguimiento['umbral'] < len(UMBRALES_RETRASO):
+                    proximo = min(proximo, seguimiento['inicio'] + objetivo * UMBRALES_RETRASO[seguimiento['umbral']] * 60)
+                heapq.heappush(self._vencimientos, (proximo, next(self._secuencia), clave))
+
+        if hubo_cambios:
+            try:
+                self.sistema_mesas.guardar_mesas()
+            except Exception as e:
+                logger.error("Error al guardar retrasos de cocina: %s", e)
+        return hubo_cambios
+
+    def _ejecutar(self):
+        """Bucle del hilo de fondo."""
+        while not self._detener.wait(self.intervalo):
+            try:
+                # Modifica las mesas: con el mismo lock que los pedidos HTTP que las modifican
+                with self.sistema_mesas.lock_mesas:
+                    self.revisar()
+            except Exception as e:
+                logger.error("Error al revisar retrasos de cocina: %s", e)
+
+    def iniciar(self):
+        """Inicia el hilo de fondo que revisa los retrasos."""
+        if self._hilo and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._ejecutar, name="monitor-retrasos", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        """Detiene el hilo de fondo."""
+        self._detener.set()
+        if self._hilo:
+            self._hilo.join()
+            self._hilo = None
@@ -0,0 +1,135 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from .sistema_mesas import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+PERFILES_DIR = os.path.normpath(os.path.join(DATA_DIR, 'perfiles'))
+
+INTERVALO_POR_DEFECTO = 0.01   # segundos entre muestras
+DURACION_MAXIMA = 300          # segundos que puede durar una ventana de muestreo
+PROFUNDIDAD_MAXIMA = 128       # marcos por pila
+TOP_FUNCIONES = 15
+
+def _etiqueta_marco(marco):
+    """'modulo:funcion' del marco (los __init__.py se nombran por su paquete)."""
+    codigo = marco.f_code
+    ruta, archivo = os.path.split(codigo.co_filename)
+    modulo = os.path.splitext(archivo)[0]
+    if modulo == '__init__':
+        modulo = os.path.basename(ruta)
+    return f"{modulo}:{codigo.co_name}"
+
+class PerfiladorMuestreo:
+    """Perfilador estadístico: muestrea las pilas de los hilos que están atendiendo pedidos HTTP.
+
+    No instrumenta el código: un hilo aparte lee sys._current_frames() cada `intervalo` segundos
+    durante una ventana acotada y cuenta las pilas, con la ruta atendida como raíz.
+    """
+
+    def __init__(self, directorio=PERFILES_DIR):
+        self.directorio = directorio
+        # ident del hilo -> ruta que está atendiendo (lo actualizan los propios hilos de Flask)
+        self._rutas_activas = {}
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._detener = threading.Event()
+        self._estado = {'activo': False}
+
+    def registrar_hilo(self, ruta):
+        """Marca el hilo actual como atendiendo `ruta` (se llama al empezar cada pedido)."""
+        self._rutas_activas[threading.get_ident()] = ruta
+
+    def liberar_hilo(self):
+        """El hilo actual terminó su pedido."""
+        self._rutas_activas.pop(threading.get_ident(), None)
+
+    def iniciar(self, duracion, intervalo=INTERVALO_POR_DEFECTO):
+        """Empieza una ventana de muestreo. Devuelve (bool, estado|mensaje)."""
+        if not 0 < duracion <= DURACION_MAXIMA:
+            raise ValueError(f"La duración debe estar entre 0 y {DURACION_MAXIMA} segundos")
+        if not 0.001 <= intervalo <= 1:
+            raise ValueError("El intervalo debe estar entre 1 y 1000 ms")
+        with self._lock:
+            if self._estado.get('activo'):
+                return False, "Ya hay una ventana de muestreo en curso"
+            self._detener.clear()
+            self._estado = {
+                'activo': True,
+                'inicio': datetime.now().isoformat(timespec='seconds'),
+                'duracion_segundos': duracion,
+                'intervalo_ms': round(intervalo * 1000, 3),
+                'muestras': 0
+            }
+            self._hilo = threading.Thread(target=self._muestrear, args=(duracion, intervalo),
+                                          name='perfilador', daemon=True)
+            self._hilo.start()
+            return True, dict(self._estado)
+
+    def detener(self):
+        """Corta la ventana en curso; el archivo se escribe igual con lo muestreado."""
+        self._detener.set()
+        if self._hilo:
+            self._hilo.join(timeout=5)
+
+    def estado(self):
+        """Estado de la ventana en curso o resultado de la última."""
+        with self._lock:
+            return dict(self._estado)
+
+    def _muestrear(self, duracion, intervalo):
+        pilas = Counter()
+        por_ruta = Counter()
+        propias = Counter()
+        muestras = 0
+        propio = threading.get_ident()
+        fin = time.monotonic() + duracion
+        try:
+            while not self._detener.is_set() and time.monotonic() < fin:
+                marcos = sys._current_frames()
+                for ident, ruta in list(self._rutas_activas.items()):
+                    marco = marcos.get(ident)
+                    if marco is None or ident == propio:
+                        continue
+                    pila = []
+                    while marco is not None and len(pila) < PROFUNDIDAD_MAXIMA:
+                        pila.append(_etiqueta_marco(marco))
+                        marco = marco.f_back
+                    pila.append(ruta)
+                    pila.reverse()
+                    pilas[';'.join(pila)] += 1
+                    por_ruta[ruta] += 1
+                    propias[pila[-1]] += 1
+                    muestras += 1
+                del marcos
+                with self._lock:
+                    self._estado['muestras'] = muestras
+                self._detener.wait(intervalo)
+            archivo = self._escribir(pilas)
+        except Exception as e:
+            logger.exception("Error al muestrear pilas: %s", e)
+            archivo = None
+        with self._lock:
+            self._estado.update({
+                'activo': False,
+                'fin': datetime.now().isoformat(timespec='seconds'),
+                'muestras': muestras,
+                'archivo': archivo,
+                'por_ruta': dict(por_ruta.most_common()),
+                'funciones': [{'funcion': funcion, 'muestras': cantidad}
+                              for funcion, cantidad in propias.most_common(TOP_FUNCIONES)]
+            })
+
+    def _escribir(self, pilas):
+        """Escribe las pilas en formato 'collapsed' (una por línea con su cantidad), listo para flamegraph."""
+        os.makedirs(self.directorio, exist_ok=True)
+        archivo = os.path.join(self.directorio, f"perfil_{datetime.now().strftime('%Y%m%d_%H%M%S')}.folded")
+        with open(archivo, 'w', encoding='utf-8') as f:
+            for pila, cantidad in sorted(pilas.items()):
+                f.write(f"{pila} {cantidad}\n")
+        return archivo
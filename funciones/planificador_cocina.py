@@ -0,0 +1,151 @@
+import bisect
+import math
+import time
+from itertools import count
+
+# Política por defecto: todos los términos se expresan en segundos equivalentes de antigüedad
+POLITICA_POR_DEFECTO = {
+    # Orden de los pasos dentro de una mesa
+    'orden_etapas': {'bebida': 0, 'entrada': 0, 'principal': 1, 'postre': 2},
+    # Segundos que se posterga cada paso respecto del anterior de la misma mesa
+    'segundos_por_etapa': 600,
+    # Fracción del tiempo de preparación que se adelanta (los platos lentos empiezan antes)
+    'peso_preparacion': 0.5,
+    # Segundos que se posterga un pedido por cada pedido de la misma mesa que ya está en la cola
+    'segundos_por_pedido_mesa': 90
+}
+
+def _es_numero(valor):
+    # bool es un int para Python: True no es un parámetro válido
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool) and math.isfinite(valor)
+
+def validar_politica(cambios):
+    """Valida los cambios de política (claves conocidas, números finitos no negativos) y devuelve una copia."""
+    if not isinstance(cambios, dict):
+        raise ValueError("La política debe ser un objeto con los parámetros a cambiar")
+    desconocidas = [k for k in cambios if k not in POLITICA_POR_DEFECTO]
+    if desconocidas:
+        raise ValueError(f"Parámetros de política inválidos: {', '.join(desconocidas)}")
+    validados = {}
+    for clave, valor in cambios.items():
+        if clave == 'orden_etapas':
+            if not isinstance(valor, dict) or not all(isinstance(etapa, str) and _es_numero(paso) and paso >= 0
+                                                      for etapa, paso in valor.items()):
+                raise ValueError("'orden_etapas' debe asociar cada etapa a un número no negativo")
+            valor = dict(valor)
+        elif not _es_numero(valor) or valor < 0:
+            raise ValueError(f"'{clave}' debe ser un número no negativo")
+        validados[clave] = valor
+    return validados
+
+class PlanificadorCocina:
+    """Cola de prioridad de la cocina según paso del menú, antigüedad, equidad entre mesas y tiempo de preparación."""
+
+    def __init__(self, sistema_mesas, estimador_eta=None, politica=None):
+        """Inicializa la cola y encola los pedidos que ya están en cocina."""
+        self.sistema_mesas = sistema_mesas
+        self.estimador_eta = estimador_eta
+        self.politica = dict(POLITICA_POR_DEFECTO)
+        self.politica.update(validar_politica(politica or {}))
+        self._etapas = sistema_mesas.instantanea_menu().etapas
+        sistema_mesas.agregar_observador_menu(self._al_cambiar_menu)
+
+        # Lista ordenada de (prioridad, secuencia, clave); las bajas se resuelven en forma diferida
+        self._cola = []
+        self._secuencia = count()
+        self._entradas = {}
+        self._pedidos_por_mesa = {}
+
+        self._cargar_pedidos_activos()
+
+    def _al_cambiar_menu(self, instantanea):
+        """Observador del menú: usa las etapas de la versión nueva."""
+        self._etapas = instantanea.etapas
+
+    def _cargar_pedidos_activos(self):
+        """Encola los pedidos que estaban en cocina al iniciar el sistema."""
+        for mesa_id, mesa_data in self.sistema_mesas.mesas.items():
+            mesa = mesa_data[0]
+            for i in range(1, mesa.get('capacidad', 0) + 1):
+                cliente = mesa.get(f"cliente_{i}")
+                if cliente and cliente.get('nombre'):
+                    for pedido in cliente.get('pedidos', []):
+                        if self._en_cola(pedido):
+                            envios = [h['ts'] for h in pedido.get('historial_estados', [])
+                                      if h.get('clave') == 'enviado' and 'ts' in h]
+                            self.encolar(mesa_id, pedido, envios[-1] if envios else None)
+
+    def _en_cola(self, pedido):
+        """Indica si el pedido todavía debe prepararse."""
+        return (pedido.get('en_cocina', False)
+                and not pedido.get('entregado', False)
+                and pedido.get('estado_cocina') not in ('✅ LISTO PARA ENTREGAR', '🔴 CANCELADO'))
+
+    def _calcular_prioridad(self, mesa_id, pedido, enviado, politica, pedidos_por_mesa):
+        """Calcula la prioridad del pedido (menor valor, antes se prepara)."""
+        etapa = self._etapas.get(pedido.get('plato_id'), 'principal')
+        paso = politica['orden_etapas'].get(etapa, 1)
+        preparacion = self.estimador_eta.coccion_estimada(pedido) if self.estimador_eta else 0
+        en_cola_mesa = pedidos_por_mesa.get(mesa_id, 0)
+        return (enviado
+                + paso * politica['segundos_por_etapa']
+                - preparacion * politica['peso_preparacion']
+                + en_cola_mesa * politica['segundos_por_pedido_mesa'])
+
+    def encolar(self, mesa_id, pedido, enviado=None):
+        """Agrega un pedido a la cola de cocina."""
+        clave = (mesa_id, pedido.get('id'))
+        if clave in self._entradas:
+            self.quitar(mesa_id, pedido)
+        enviado = enviado or time.time()
+        prioridad = self._calcular_prioridad(mesa_id, pedido, enviado, self.politica, self._pedidos_por_mesa)
+        entrada = (prioridad, next(self._secuencia), clave)
+        bisect.insort(self._cola, entrada)
+        self._entradas[clave] = (entrada, pedido, enviado)
+        self._pedidos_por_mesa[mesa_id] = self._pedidos_por_mesa.get(mesa_id, 0) + 1
+
+    def quitar(self, mesa_id, pedido):
+        """Saca un pedido de la cola."""
+        self._quitar_clave((mesa_id, pedido.get('id')))
+
+    def quitar_mesa(self, mesa_id):
+        """Saca de la cola todos los pedidos de una mesa (pago o reinicio)."""
+        for clave in [clave for clave in self._entradas if clave[0] == mesa_id]:
+            self._quitar_clave(clave)
+
+    def _quitar_clave(self, clave):
+        registro = self._entradas.pop(clave, None)
+        if not registro:
+            return
+        indice = bisect.bisect_left(self._cola, registro[0])
+        if indice < len(self._cola) and self._cola[indice] == registro[0]:
+            del self._cola[indice]
+        mesa_id = clave[0]
+        self._pedidos_por_mesa[mesa_id] -= 1
+        if not self._pedidos_por_mesa[mesa_id]:
+            del self._pedidos_por_mesa[mesa_id]
+
+    def posiciones(self):
+        """Devuelve la posición (desde 1) de cada pedido en la cola, por (mesa_id, pedido_id)."""
+        return {clave: posicion for posicion, (_, _, clave) in enumerate(self._cola, 1)}
+
+    def configurar_politica(self, cambios):
+        """Actualiza la política y recalcula la prioridad de los pedidos en cola.
+
+        La cola nueva se arma aparte y reemplaza a la anterior solo si se pudo armar entera.
+        """
+        politica = dict(self.politica)
+        politica.update(validar_politica(cambios))
+
+        pendientes = sorted(self._entradas.items(), key=lambda item: item[1][2])
+        cola, entradas, pedidos_por_mesa = [], {}, {}
+        for clave, (_, pedido, enviado) in pendientes:
+            mesa_id = clave[0]
+            entrada = (self._calcular_prioridad(mesa_id, pedido, enviado, politica, pedidos_por_mesa),
+                       next(self._secuencia), clave)
+            bisect.insort(cola, entrada)
+            entradas[clave] = (entrada, pedido, enviado)
+            pedidos_por_mesa[mesa_id] = pedidos_por_mesa.get(mesa_id, 0) + 1
+
+        self.politica, self._cola, self._entradas, self._pedidos_por_mesa = politica, cola, entradas, pedidos_por_mesa
+        return self.politica
@@ -0,0 +1,136 @@
+import atexit
+import contextvars
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime
+
+# Configuración por variables de entorno
+NIVEL_POR_DEFECTO = os.environ.get('DEFINITY_LOG_NIVEL', 'INFO').upper()
+ARCHIVO_REGISTRO = os.environ.get('DEFINITY_LOG_ARCHIVO')
+# De cada N eventos DEBUG con el mismo mensaje se emite uno
+MUESTREO_DEBUG = max(1, int(os.environ.get('DEFINITY_LOG_MUESTREO', '100')))
+
+# Loggers que se envían a la cola: los de cada módulo de funciones/ cuelgan de 'funciones'
+LOGGERS_RAIZ = ('funciones', 'app', '__main__')
+
+# Contexto del pedido en curso (por hilo / tarea): route, mesa_id, pedido_id...
+_contexto = contextvars.ContextVar('definity_contexto_registro', default={})
+
+_listener = None
+_manejador = None
+
+def fijar_contexto(**campos):
+    """Agrega campos al contexto actual y devuelve el token para restaurarlo."""
+    return _contexto.set({**_contexto.get(), **{k: v for k, v in campos.items() if v is not None}})
+
+def restaurar_contexto(token):
+    """Vuelve al contexto anterior a fijar_contexto."""
+    _contexto.reset(token)
+
+class FiltroContexto(logging.Filter):
+    """Copia el contexto del pedido en curso en cada evento (se ejecuta en el hilo que registra)."""
+
+    def filter(self, record):
+        for campo, valor in _contexto.get().items():
+            if not hasattr(record, campo):
+                setattr(record, campo, valor)
+        return True
+
+class FiltroMuestreo(logging.Filter):
+    """Deja pasar uno de cada `tasa` eventos DEBUG por logger y mensaje; los demás niveles pasan siempre."""
+
+    def __init__(self, tasa=MUESTREO_DEBUG):
+        super().__init__()
+        self.tasa = tasa
+        self._contadores = {}
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.tasa <= 1:
+            return True
+        clave = (record.name, record.msg)
+        contador = self._contadores.get(clave)
+        if contador is None:
+            contador = self._contadores.setdefault(clave, itertools.count())
+        # next() sobre itertools.count es atómico, no hace falta lock
+        if next(contador) % self.tasa:
+            return False
+        record.muestreo = self.tasa
+        return True
+
+class FormateadorJSON(logging.Formatter):
+    """Una línea JSON por evento, con el contexto del pedido y los campos extra."""
+
+    _ATRIBUTOS_BASE = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+    def format(self, record):
+        evento = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensaje': record.getMessage(),
+            'hilo': record.threadName
+        }
+        for clave, valor in vars(record).items():
+            if clave not in self._ATRIBUTOS_BASE and not clave.startswith('_'):
+                evento[clave] = valor
+        if record.exc_info:
+            evento['excepcion'] = self.formatException(record.exc_info)
+        return json.dumps(evento, ensure_ascii=False, default=str)
+
+class _QueueHandlerSinCopia(logging.handlers.QueueHandler):
+    """QueueHandler que conserva los campos extra del evento (el original los aplana en el mensaje)."""
+
+    def prepare(self, record):
+        # Se resuelven el mensaje y la excepción en el hilo que registra, para no serializar objetos vivos
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.excepcion = record.exc_text
+            record.exc_info = None
+        return record
+
+def configurar_registro(nivel=NIVEL_POR_DEFECTO, archivo=ARCHIVO_REGISTRO, muestreo=MUESTREO_DEBUG):
+    """Envía los loggers de funciones/ y de la app a una cola; un hilo aparte escribe el JSON.
+
+    Es idempotente: las llamadas siguientes solo cambian el nivel.
+    """
+    global _listener, _manejador
+    for nombre in LOGGERS_RAIZ:
+        logging.getLogger(nombre).setLevel(nivel)
+    if _listener is not None:
+        return
+
+    destino = logging.FileHandler(archivo, encoding='utf-8') if archivo else logging.StreamHandler(sys.stderr)
+    destino.setFormatter(FormateadorJSON())
+
+    cola = queue.SimpleQueue()
+    _manejador = _QueueHandlerSinCopia(cola)
+    _manejador.addFilter(FiltroMuestreo(muestreo))
+    _manejador.addFilter(FiltroContexto())
+    for nombre in LOGGERS_RAIZ:
+        logger = logging.getLogger(nombre)
+        logger.addHandler(_manejador)
+        logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(cola, destino, respect_handler_level=True)
+    _listener.start()
+    atexit.register(detener_registro)
+
+def detener_registro():
+    """Vacía la cola y detiene el hilo escritor."""
+    global _listener, _manejador
+    if _listener is None:
+        return
+    _listener.stop()
+    for nombre in LOGGERS_RAIZ:
+        logger = logging.getLogger(nombre)
+        logger.removeHandler(_manejador)
+        logger.propagate = True
+    _listener = None
+    _manejador = None
@@ -0,0 +1,173 @@
+import json
+import logging
+import os
+import struct
+import threading
+import zlib
+from datetime import datetime
+from .sistema_mesas import HISTORIAL_DIR
+
+logger = logging.getLogger(__name__)
+
+# Cada registro: largo del contenido, CRC32 del contenido y el contenido (JSON en UTF-8)
+CABECERA = struct.Struct('<II')
+TAMANO_MAXIMO_REGISTRO = 1024 * 1024
+
+class RegistroEventos:
+    """Registro diario de eventos de solo agregado (eventos_AAAA-MM-DD.log).
+
+    Cada evento se escribe como un registro enmarcado (largo + CRC32 + JSON) con una sola
+    escritura al final del archivo, así que agregar cuesta lo mismo a cualquier hora del día.
+    Si el proceso se corta a mitad de una escritura, el registro incompleto del final se
+    detecta por el largo y se descarta; un registro dañado en el medio (CRC) se saltea.
+    """
+
+    def __init__(self, directorio=HISTORIAL_DIR):
+        self.directorio = directorio
+        self._lock = threading.Lock()
+        # Días cuyo archivo ya se revisó en este proceso (se vuelve a revisar si falla una escritura)
+        self._revisados = set()
+        # Claves de los eventos de cada día revisado: un evento con clave ya registrada no se repite
+        self._claves = {}
+        os.makedirs(directorio, exist_ok=True)
+
+    def archivo_dia(self, fecha):
+        return os.path.join(self.directorio, f"eventos_{fecha}.log")
+
+    def agregar(self, tipo, datos=None, fecha=None):
+        """Agrega un evento al registro del día de `fecha` ('YYYY-MM-DD HH:MM:SS', por defecto ahora).
+
+        Si `datos` trae una 'clave' que ya está en el registro del día (la cola de tareas repite una
+        tarea cortada), el evento no se vuelve a escribir.
+        """
+        fecha = fecha or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        evento = {'fecha': fecha, 'tipo': tipo, **(datos or {})}
+        contenido = json.dumps(evento, ensure_ascii=False).encode('utf-8')
+        registro = CABECERA.pack(len(contenido), zlib.crc32(contenido)) + contenido
+        dia = fecha[:10]
+        clave = evento.get('clave')
+        with self._lock:
+            if dia not in self._revisados:
+                self._recortar_final(dia)
+                self._revisados.add(dia)
+            if clave is not None and clave in self._claves[dia]:
+                return evento
+            try:
+                with open(self.archivo_dia(dia), 'ab') as f:
+                    f.write(registro)
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError:
+                # La escritura pudo quedar a medias: el próximo agregado vuelve a revisar el final
+                self._revisados.discard(dia)
+                raise
+            if clave is not None:
+                self._claves[dia].add(clave)
+        return evento
+
+    def _recortar_final(self, dia):
+        """Descarta un registro incompleto al final del archivo (corte durante una escritura).
+
+        Solo se recorta un registro que se corta en el fin del archivo; un registro dañado en el
+        medio se saltea al leer y no se borra nada de lo que viene después.
+        """
+        archivo = self.archivo_dia(dia)
+        claves = self._claves[dia] = set()
+        if not os.path.exists(archivo):
+            return
+        for inicio, fin, evento in self._recorrer(archivo):
+            if evento is None:
+                logger.warning("Registro de eventos %s: se descartan %s bytes finales incompletos", dia, fin - inicio)
+                with open(archivo, 'r+b') as f:
+                    f.truncate(inicio)
+            elif evento.get('clave') is not None:
+                claves.add(evento['clave'])
+
+    def _recorrer(self, archivo):
+        """Genera (inicio, fin, evento) por cada registro válido, salteando los dañados.
+
+        Si el último registro se corta en el fin del archivo genera (inicio, fin, None).
+        """
+        with open(archivo, 'rb') as f:
+            tamano = os.fstat(f.fileno()).st_size
+            posicion = 0
+            while posicion < tamano:
+                evento, fin = self._leer_registro(f, posicion)
+                if evento is not None:
+                    yield posicion, fin, evento
+                    posicion = fin
+                    continue
+                siguiente = self._siguiente_valido(f, posicion + 1)
+                if siguiente is None:
+                    if fin > tamano:
+                        yield posicion, tamano, None
+                    else:
+                        logger.warning("Registro de eventos %s: registro dañado al final (byte %s)", archivo, posicion)
+                    return
+                logger.warning("Registro de eventos %s: se saltean %s bytes dañados (byte %s)", archivo, siguiente - posicion, posicion)
+                posicion = siguiente
+
+    def _leer_registro(self, f, posicion):
+        """Lee el registro que empieza en `posicion`: (evento o None si no es válido, posición final)."""
+        f.seek(posicion)
+        cabecera = f.read(CABECERA.size)
+        if len(cabecera) < CABECERA.size:
+            return None, posicion + CABECERA.size
+        largo, crc = CABECERA.unpack(cabecera)
+        if largo > TAMANO_MAXIMO_REGISTRO:
+            # Un largo imposible es un registro dañado, no uno cortado
+            return None, posicion + CABECERA.size
+        return self._decodificar(f.read(largo), largo, crc), posicion + CABECERA.size + largo
+
+    def _siguiente_valido(self, f, desde):
+        """Busca el primer registro válido a partir de `desde` (el contenido empieza con '{')."""
+        f.seek(desde)
+        datos = f.read()
+        indice = datos.find(b'{', CABECERA.size)
+        while indice != -1:
+            inicio = indice - CABECERA.size
+            largo, crc = CABECERA.unpack_from(datos, inicio)
+            if largo <= TAMANO_MAXIMO_REGISTRO and self._decodificar(datos[indice:indice + largo], largo, crc) is not None:
+                return desde + inicio
+            indice = datos.find(b'{', indice + 1)
+        return None
+
+    @staticmethod
+    def _decodificar(contenido, largo, crc):
+        if len(contenido) < largo or zlib.crc32(contenido) != crc:
+            return None
+        try:
+            evento = json.loads(contenido)
+        except ValueError:
+            return None
+        return evento if isinstance(evento, dict) else None
+
+    def leer_dia(self, fecha):
+        """Recorre los eventos de un día ('YYYY-MM-DD') en orden, leyendo de a un registro."""
+        archivo = self.archivo_dia(fecha)
+        if not os.path.exists(archivo):
+            return
+        for _, _, evento in self._recorrer(archivo):
+            if evento is not None:
+                yield evento
+
+    def resumen_dia(self, fecha):
+        """Agrega los eventos del día: cantidad por tipo, importes y eventos por mesa."""
+        resumen = {'fecha': fecha, 'eventos': 0, 'por_tipo': {}, 'por_mesa': {}}
+        claves = set()
+        for evento in self.leer_dia(fecha):
+            # Un evento repetido (misma clave, escrito por otro proceso) se cuenta una sola vez
+            clave = evento.get('clave')
+            if clave is not None:
+                if clave in claves:
+                    continue
+                claves.add(clave)
+            resumen['eventos'] += 1
+            tipo = resumen['por_tipo'].setdefault(evento['tipo'], {'cantidad': 0, 'total': 0})
+            tipo['cantidad'] += 1
+            tipo['total'] += evento.get('total', 0) or 0
+            mesa = evento.get('mesa')
+            if mesa:
+                por_mesa = resumen['por_mesa'].setdefault(mesa, {})
+                por_mesa[evento['tipo']] = por_mesa.get(evento['tipo'], 0) + 1
+        return resumen
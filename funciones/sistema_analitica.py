@@ -0,0 +1,183 @@
+import bisect
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+class SistemaAnalitica:
+    """Analítica de ventas basada en agregados diarios del historial de pagos."""
+
+    def __init__(self, sistema_mesas, tickets=None):
+        """Inicializa los agregados a partir de los tickets ya registrados."""
+        self.sistema_mesas = sistema_mesas
+        self.agregados_por_dia = {}
+        self.dias_ordenados = []
+        for ticket in tickets or []:
+            self.registrar_ticket(ticket)
+
+    def _nuevo_agregado_dia(self):
+        """Crea la estructura vacía de agregados de un día."""
+        return {
+            'total': 0,
+            'tickets': 0,
+            'total_por_hora': [0] * 24,
+            'tickets_por_hora': [0] * 24,
+            'platos': {},
+            'metodos_pago': {}
+        }
+
+    def registrar_ticket(self, ticket):
+        """Actualiza los agregados con un ticket nuevo (costo proporcional a sus líneas)."""
+        try:
+            fecha = datetime.strptime(ticket['fecha'], '%Y-%m-%d %H:%M:%S')
+        except (KeyError, TypeError, ValueError):
+            logger.warning("Ticket sin fecha válida, no se agrega a la analítica")
+            return False
+
+        dia = fecha.strftime('%Y-%m-%d')
+        agregado = self.agregados_por_dia.get(dia)
+        if agregado is None:
+            agregado = self._nuevo_agregado_dia()
+            self.agregados_por_dia[dia] = agregado
+            bisect.insort(self.dias_ordenados, dia)
+
+        total = ticket.get('total', 0) or 0
+        agregado['total'] += total
+        agregado['tickets'] += 1
+        agregado['total_por_hora'][fecha.hour] += total
+        agregado['tickets_por_hora'][fecha.hour] += 1
+
+        metodo = str(ticket.get('metodo_pago', 'desconocido')).lower()
+        if metodo not in agregado['metodos_pago']:
+            agregado['metodos_pago'][metodo] = {'tickets': 0, 'total': 0}
+        agregado['metodos_pago'][metodo]['tickets'] += 1
+        agregado['metodos_pago'][metodo]['total'] += total
+
+        for pedido in ticket.get('pedidos', []):
+            nombre = pedido.get('nombre', 'Desconocido')
+            cantidad = pedido.get('cantidad', 1)
+            if nombre not in agregado['platos']:
+                agregado['platos'][nombre] = {'cantidad': 0, 'total': 0}
+            agregado['platos'][nombre]['cantidad'] += cantidad
+            agregado['platos'][nombre]['total'] += pedido.get('subtotal', pedido.get('precio', 0) * cantidad)
+        return True
+
+    def _dias_en_rango(self, desde=None, hasta=None):
+        """Devuelve los agregados de los días comprendidos en el rango (fechas 'YYYY-MM-DD')."""
+        inicio = bisect.bisect_left(self.dias_ordenados, desde) if desde else 0
+        fin = bisect.bisect_right(self.dias_ordenados, hasta) if hasta else len(self.dias_ordenados)
+        return [(dia, self.agregados_por_dia[dia]) for dia in self.dias_ordenados[inicio:fin]]
+
+    def _categorias_por_plato(self):
+        """Mapea el nombre de cada plato del menú a su etapa y categoría."""
+        categorias = {}
+        for etapa, categorias_etapa in self.sistema_mesas.menu.get('platos', {}).items():
+            for categoria, platos in categorias_etapa.items():
+                for plato in platos:
+                    categorias[plato['nombre']] = (etapa, categoria)
+        return categorias
+
+    def ingresos_por_dia(self, desde=None, hasta=None):
+        """Obtiene la facturación y cantidad de tickets por día."""
+        return [
+            {'fecha': dia, 'total': agregado['total'], 'tickets': agregado['tickets']}
+            for dia, agregado in self._dias_en_rango(desde, hasta)
+        ]
+
+    def ingresos_por_hora(self, desde=None, hasta=None):
+        """Obtiene la facturación acumulada por hora del día."""
+        totales = [0] * 24
+        tickets = [0] * 24
+        for _, agregado in self._dias_en_rango(desde, hasta):
+            for hora in range(24):
+                totales[hora] += agregado['total_por_hora'][hora]
+                tickets[hora] += agregado['tickets_por_hora'][hora]
+        return [
+            {'hora': f"{hora:02d}:00", 'total': totales[hora], 'tickets': tickets[hora]}
+            for hora in range(24) if tickets[hora]
+        ]
+
+    def ventas_por_plato(self, desde=None, hasta=None):
+        """Obtiene unidades vendidas y facturación por plato, de mayor a menor."""
+        acumulado = {}
+        for _, agregado in self._dias_en_rango(desde, hasta):
+            for nombre, ventas in agregado['platos'].items():
+                if nombre not in acumulado:
+                    acumulado[nombre] = {'cantidad': 0, 'total': 0}
+                acumulado[nombre]['cantidad'] += ventas['cantidad']
+                acumulado[nombre]['total'] += ventas['total']
+
+        categorias = self._categorias_por_plato()
+        resultado = []
+        for nombre, ventas in acumulado.items():
+            etapa, categoria = categorias.get(nombre, ('sin etapa', 'sin categoría'))
+            resultado.append({
+                'nombre': nombre,
+                'etapa': etapa,
+                'categoria': categoria,
+                'cantidad': ventas['cantidad'],
+                'total': ventas['total']
+            })
+        return sorted(resultado, key=lambda p: p['total'], reverse=True)
+
+    def ventas_por_categoria(self, desde=None, hasta=None):
+        """Obtiene unidades vendidas y facturación por categoría del menú."""
+        acumulado = {}
+        for plato in self.ventas_por_plato(desde, hasta):
+            clave = (plato['etapa'], plato['categoria'])
+            if clave not in acumulado:
+                acumulado[clave] = {'cantidad': 0, 'total': 0}
+            acumulado[clave]['cantidad'] += plato['cantidad']
+            acumulado[clave]['total'] += plato['total']
+        resultado = [
+            {'etapa': etapa, 'categoria': categoria, 'cantidad': ventas['cantidad'], 'total': ventas['total']}
+            for (etapa, categoria), ventas in acumulado.items()
+        ]
+        return sorted(resultado, key=lambda c: c['total'], reverse=True)
+
+    def ticket_promedio(self, desde=None, hasta=None):
+        """Obtiene el importe promedio por ticket."""
+        total = 0
+        tickets = 0
+        for _, agregado in self._dias_en_rango(desde, hasta):
+            total += agregado['total']
+            tickets += agregado['tickets']
+        return {
+            'tickets': tickets,
+            'total': total,
+            'promedio': round(total / tickets, 2) if tickets else 0
+        }
+
+    def mix_metodos_pago(self, desde=None, hasta=None):
+        """Obtiene la distribución de tickets y facturación por método de pago."""
+        acumulado = {}
+        total_general = 0
+        for _, agregado in self._dias_en_rango(desde, hasta):
+            for metodo, ventas in agregado['metodos_pago'].items():
+                if metodo not in acumulado:
+                    acumulado[metodo] = {'tickets': 0, 'total': 0}
+                acumulado[metodo]['tickets'] += ventas['tickets']
+                acumulado[metodo]['total'] += ventas['total']
+                total_general += ventas['total']
+        return [
+            {
+                'metodo_pago': metodo,
+                'tickets': ventas['tickets'],
+                'total': ventas['total'],
+                'porcentaje': round(ventas['total'] * 100 / total_general, 2) if total_general else 0
+            }
+            for metodo, ventas in sorted(acumulado.items())
+        ]
+
+    def resumen(self, desde=None, hasta=None):
+        """Obtiene todos los indicadores de ventas del rango en una sola consulta."""
+        return {
+            'desde': desde,
+            'hasta': hasta,
+            'ticket_promedio': self.ticket_promedio(desde, hasta),
+            'ingresos_por_dia': self.ingresos_por_dia(desde, hasta),
+            'ingresos_por_hora': self.ingresos_por_hora(desde, hasta),
+            'ventas_por_categoria': self.ventas_por_categoria(desde, hasta),
+            'ventas_por_plato': self.ventas_por_plato(desde, hasta),
+            'metodos_pago': self.mix_metodos_pago(desde, hasta)
+        }
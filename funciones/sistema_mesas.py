@@ -1,19 +1,53 @@
 import json
+import logging
 import os
+import threading
+import time
+from contextvars import ContextVar
 from datetime import datetime
+from .estaciones_cocina import ESTACION_POR_DEFECTO
+from .menu_versionado import InstantaneaMenu, es_id_numerico
+from .instrumentacion import registro_metricas
+
+logger = logging.getLogger(__name__)
 
 # Configuración de rutas
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(SCRIPT_DIR, '../data')
+# DEFINITY_DATA_DIR permite usar otro directorio de datos (benchmarks, pruebas con datos generados)
+DATA_DIR = os.environ.get('DEFINITY_DATA_DIR', os.path.join(SCRIPT_DIR, '../data'))
 HISTORIAL_DIR = os.path.join(DATA_DIR, 'historial_pagos')
+TICKETS_DIR = os.path.join(DATA_DIR, 'tickets')
 MESAS_JSON = os.path.join(DATA_DIR, 'mesas.json')
 MESAS_TEMP_JSON = MESAS_JSON + ".temp" # Archivo temporal
 MENU_JSON = os.path.join(DATA_DIR, 'menu.json')
+MENU_TEMP_JSON = MENU_JSON + ".temp"
+
+ESTADOS_MESA = ('libre', 'ocupada', 'reservada')
+
+# Segundos entre revisiones de menu.json (mtime y tamaño) para recargarlo si cambió
+INTERVALO_REVISION_MENU = 1.0
 
 class SistemaMesas:
     def __init__(self):
         self.mesas = {}
-        self.menu = {}
+        self._instantanea_menu = None
+        # Instantánea fijada para el pedido HTTP en curso (la misma durante todo el pedido)
+        self._instantanea_fijada = ContextVar('instantanea_menu', default=None)
+        self._proxima_revision_menu = 0.0
+        # (mtime_ns, tamaño) de menu.json cuando se leyó o escribió, para detectar cambios sin releerlo
+        self._firma_cargada = None
+        self._firma_fallida = None
+        # Reentrante: una modificación puede recargar antes el archivo si cambió a mano
+        self._lock_menu = threading.RLock()
+        # Platos sin stock (los marca el inventario); no modifica la instantánea
+        self._agotados = frozenset()
+        self._menu_disponible = None
+        self._observadores_estado = []
+        self._observadores_retiro = []
+        self._observadores_menu = []
+        # El acceso a las mesas es de a uno: lo toman los pedidos HTTP que las leen o modifican y los
+        # hilos de fondo durante todo su trabajo, y guardar_mesas escribe mesas.json con él tomado
+        self.lock_mesas = threading.RLock()
         self.cargar_mesas()
         self.cargar_menu()
         
@@ -26,20 +60,104 @@ class SistemaMesas:
             else:
                 self.inicializar_mesas()
         except Exception as e:
-            print(f"Error al cargar mesas: {str(e)}")
+            logger.error("Error al cargar mesas: %s", e)
             self.inicializar_mesas()
 
-    def cargar_menu(self):
-        """Carga el menú desde el archivo JSON"""
-        try:
-            if os.path.exists(MENU_JSON):
-                with open(MENU_JSON, 'r', encoding='utf-8') as f:
-                    self.menu = json.load(f)
-            else:
+    def cargar_menu(self, solo_si_cambio=False):
+        """Carga el menú desde el archivo JSON y publica una instantánea nueva.
+
+        Si el archivo no se puede leer al recargar, se sigue usando la instantánea anterior.
+        """
+        with self._lock_menu:
+            firma = self._firma_menu()
+            if solo_si_cambio and firma in (self._firma_cargada, self._firma_fallida):
+                return
+            try:
+                if os.path.exists(MENU_JSON):
+                    with open(MENU_JSON, 'r', encoding='utf-8') as f:
+                        menu = json.load(f)
+                    self._publicar_menu(menu, firma)
+                else:
+                    self.inicializar_menu()
+            except Exception as e:
+                if self._instantanea_menu is not None:
+                    if firma != self._firma_fallida:
+                        logger.error("Error al recargar menú, se mantiene la versión %s: %s",
+                                     self._instantanea_menu.version, e)
+                    self._firma_fallida = firma
+                    return
+                logger.error("Error al cargar menú: %s", e)
                 self.inicializar_menu()
-        except Exception as e:
-            print(f"Error al cargar menú: {str(e)}")
-            self.inicializar_menu()
+            instantanea = self._instantanea_menu
+        for observador in self._observadores_menu:
+            observador(instantanea)
+
+    def _firma_menu(self):
+        """(mtime_ns, tamaño) de menu.json, o None si no existe."""
+        try:
+            estado = os.stat(MENU_JSON)
+            return (estado.st_mtime_ns, estado.st_size)
+        except OSError:
+            return None
+
+    def _publicar_menu(self, menu, firma):
+        """Reemplaza la instantánea vigente; la versión nunca retrocede."""
+        anterior = self._instantanea_menu
+        version = menu.get('version', 1)
+        if anterior is not None and version <= anterior.version:
+            version = anterior.version + 1
+        self._instantanea_menu = InstantaneaMenu(menu, version)
+        self._firma_cargada = firma
+        self._firma_fallida = None
+        self.invalidar_menu_disponible()
+        if anterior is not None:
+            logger.info("Menú recargado: versión %s", version)
+
+    def _revisar_menu(self):
+        """Recarga menu.json si cambió su firma (se revisa como mucho cada INTERVALO_REVISION_MENU)."""
+        ahora = time.monotonic()
+        if ahora < self._proxima_revision_menu:
+            return
+        self._proxima_revision_menu = ahora + INTERVALO_REVISION_MENU
+        firma = self._firma_menu()
+        if firma is not None and firma not in (self._firma_cargada, self._firma_fallida):
+            self.cargar_menu(solo_si_cambio=True)
+
+    def instantanea_menu(self):
+        """Instantánea del menú: la fijada para el pedido en curso o la última publicada."""
+        fijada = self._instantanea_fijada.get()
+        if fijada is not None:
+            return fijada
+        self._revisar_menu()
+        return self._instantanea_menu
+
+    def fijar_instantanea_menu(self):
+        """Fija la instantánea vigente para el contexto actual; devuelve el token para liberarla."""
+        return self._instantanea_fijada.set(self.instantanea_menu())
+
+    def liberar_instantanea_menu(self, token):
+        """Vuelve a la instantánea que había antes de fijar_instantanea_menu."""
+        self._instantanea_fijada.reset(token)
+
+    def agregar_observador_menu(self, observador):
+        """Registra una función observador(instantanea) que se llama cada vez que se recarga el menú."""
+        self._observadores_menu.append(observador)
+
+    @property
+    def menu(self):
+        return self.instantanea_menu().menu
+
+    @property
+    def estacion_por_plato(self):
+        return self.instantanea_menu().estacion_por_plato
+
+    def obtener_estacion(self, pedido):
+        """Obtiene la estación que prepara un pedido según el plato del menú."""
+        return self.estacion_por_plato.get(pedido.get('plato_id'), ESTACION_POR_DEFECTO)
+
+    def es_bebida(self, pedido):
+        """Indica si el pedido se prepara en la barra."""
+        return self.obtener_estacion(pedido) == 'barra'
 
     def inicializar_mesas(self):
         """Inicializa las mesas con valores predeterminados"""
@@ -80,22 +198,30 @@ class SistemaMesas:
     def guardar_mesas(self):
         """Guarda las mesas en el archivo JSON"""
         try:
-            with open(MESAS_TEMP_JSON, 'w', encoding='utf-8') as f_temp:
-                json.dump(self.mesas, f_temp, indent=2, ensure_ascii=False)
-            os.replace(MESAS_TEMP_JSON, MESAS_JSON)
+            inicio = time.perf_counter()
+            # Con el lock tomado: nadie cambia las mesas mientras se copian y un solo hilo usa el archivo temporal
+            with self.lock_mesas:
+                contenido = json.dumps(self.mesas, indent=2, ensure_ascii=False)
+                with open(MESAS_TEMP_JSON, 'w', encoding='utf-8') as f_temp:
+                    f_temp.write(contenido)
+                    escritos = f_temp.tell()
+                os.replace(MESAS_TEMP_JSON, MESAS_JSON)
+            registro_metricas.observar('definity_guardar_mesas_duration_seconds', time.perf_counter() - inicio)
+            registro_metricas.incrementar('definity_guardar_mesas_bytes_total', escritos)
         except Exception as e:
-            print(f"⚠️ Error al guardar mesas (escritura atómica): {e}")
+            logger.error("Error al guardar mesas (escritura atómica): %s", e)
+            registro_metricas.incrementar('definity_guardar_mesas_errores_total')
             if os.path.exists(MESAS_TEMP_JSON):
                 try:
                     os.remove(MESAS_TEMP_JSON)
                 except OSError as e_remove:
-                    print(f"⚠️ Error al eliminar archivo temporal fallido: {e_remove}")
+                    logger.error("Error al eliminar archivo temporal fallido: %s", e_remove)
             return False
         return True
 
     def inicializar_menu(self):
         """Inicializa el menú con valores predeterminados"""
-        self.menu = {
+        menu = {
             'platos': {
                 'entrada': {
                     'entradas': [
@@ -132,18 +258,66 @@ class SistemaMesas:
                 }
             }
         }
+        self._publicar_menu(menu, None)
         self.guardar_menu()
 
-    def guardar_menu(self):
-        """Guarda el menú en el archivo JSON"""
+    def guardar_menu(self, menu=None):
+        """Guarda el menú (por defecto, el de la instantánea vigente) en el archivo JSON (escritura atómica)."""
         try:
-            with open(MENU_JSON, 'w', encoding='utf-8') as f:
-                json.dump(self.menu, f, indent=2, ensure_ascii=False)
+            with self._lock_menu:
+                with open(MENU_TEMP_JSON, 'w', encoding='utf-8') as f_temp:
+                    json.dump(menu if menu is not None else self._instantanea_menu.menu, f_temp, indent=2, ensure_ascii=False)
+                    f_temp.flush()
+                    os.fsync(f_temp.fileno())
+                os.replace(MENU_TEMP_JSON, MENU_JSON)
+                self._firma_cargada = self._firma_menu()
         except Exception as e:
-            print(f"⚠️ Error al guardar menú: {e}")
+            logger.error("Error al guardar menú (escritura atómica): %s", e)
+            if os.path.exists(MENU_TEMP_JSON):
+                try:
+                    os.remove(MENU_TEMP_JSON)
+                except OSError as e_remove:
+                    logger.error("Error al eliminar archivo temporal fallido: %s", e_remove)
             return False
         return True
 
+    def modificar_categoria_menu(self, etapa, categoria, modificar):
+        """Aplica un cambio a una sola categoría del menú, lo guarda y publica la versión siguiente.
+
+        modificar(platos_actuales, instantanea) devuelve la nueva lista de platos (None elimina la
+        categoría) y se ejecuta con el menú bloqueado. Los platos actuales no se modifican: se
+        devuelven copias. Solo se rearman los índices de esa categoría. Devuelve la instantánea nueva.
+        """
+        with self._lock_menu:
+            # Si el archivo se editó a mano y todavía no se recargó, el cambio se aplica sobre esa versión
+            self.cargar_menu(solo_si_cambio=True)
+            actual = self._instantanea_menu
+            categorias = dict(actual.menu['platos'].get(etapa, {}))
+            platos = modificar(list(categorias.get(categoria, [])), actual)
+            if platos is None:
+                categorias.pop(categoria, None)
+            else:
+                categorias[categoria] = platos
+            menu = dict(actual.menu, platos=dict(actual.menu['platos']))
+            if categorias:
+                menu['platos'][etapa] = categorias
+            else:
+                menu['platos'].pop(etapa, None)
+            menu['version'] = actual.version + 1
+            # El contador va en la misma escritura: un id dado de alta no se vuelve a asignar aunque se elimine el plato
+            menu['siguiente_id'] = max([actual.siguiente_id] + [plato['id'] + 1 for plato in platos or []
+                                                                if es_id_numerico(plato.get('id'))])
+            if not self.guardar_menu(menu):
+                raise OSError("No se pudo guardar el menú")
+            self._instantanea_menu = actual.derivar(menu, menu['version'], etapa, categoria)
+            self._firma_fallida = None
+            self.invalidar_menu_disponible()
+            instantanea = self._instantanea_menu
+            for observador in self._observadores_menu:
+                observador(instantanea)
+        logger.info("Menú modificado (%s / %s): versión %s", etapa, categoria, instantanea.version)
+        return instantanea
+
     def obtener_mesa_por_url(self, url):
         """Obtiene una mesa por su URL QR"""
         for mesa_id, mesa_data in self.mesas.items():
@@ -169,19 +343,49 @@ class SistemaMesas:
             cliente_key = f'cliente_{i}'
             if not mesa[cliente_key]['nombre']:
                 mesa[cliente_key]['nombre'] = nombre
-                mesa['estado'] = 'ocupada'
+                self.cambiar_estado_mesa(mesa_id, 'ocupada')
                 self.guardar_mesas()
                 return cliente_key
                 
         return None
         
+    def cambiar_estado_mesa(self, mesa_id, nuevo_estado):
+        """Cambia el estado de una mesa y avisa a los observadores registrados."""
+        if nuevo_estado not in ESTADOS_MESA:
+            raise ValueError(f"Estado de mesa inválido: {nuevo_estado}")
+        mesa = self.mesas[mesa_id][0]
+        anterior = mesa.get('estado')
+        mesa['estado'] = nuevo_estado
+        if anterior != nuevo_estado:
+            for observador in self._observadores_estado:
+                observador(mesa_id, anterior, nuevo_estado)
+            # Una mesa que se libera (pago total o reinicio) ya no tiene pedidos
+            if nuevo_estado == 'libre':
+                self.retirar_pedidos(mesa_id)
+        return anterior
+
+    def agregar_observador_estado(self, observador):
+        """Registra una función observador(mesa_id, anterior, nuevo) para los cambios de estado."""
+        self._observadores_estado.append(observador)
+
+    def retirar_pedidos(self, mesa_id, pedidos=None):
+        """Avisa que pedidos dejan la mesa sin pasar por la cocina (pago o reinicio); None es toda la mesa."""
+        for observador in self._observadores_retiro:
+            observador(mesa_id, pedidos)
+
+    def agregar_observador_retiro(self, observador):
+        """Registra una función observador(mesa_id, pedidos) para los pedidos que dejan una mesa."""
+        self._observadores_retiro.append(observador)
+
     def reiniciar_mesa(self, mesa_id):
         """Reinicia una mesa a su estado inicial"""
         if mesa_id not in self.mesas:
             return False
             
         mesa = self.mesas[mesa_id][0]
-        mesa['estado'] = 'libre'
+        # Si ya estaba libre no hubo cambio de estado que avise el retiro de sus pedidos
+        if self.cambiar_estado_mesa(mesa_id, 'libre') == 'libre':
+            self.retirar_pedidos(mesa_id)
         
         for i in range(1, mesa['capacidad'] + 1):
             cliente_key = f'cliente_{i}'
@@ -201,18 +405,19 @@ class SistemaMesas:
             mesa_id = str(mesa_id)
             mesa_data = self.mesas.get(mesa_id)
             if not mesa_data:
-                print(f"⚠️ Error: Mesa {mesa_id} no encontrada")
+                logger.warning("Mesa %s no encontrada", mesa_id)
                 return None
             return mesa_data
         except Exception as e:
-            print(f"⚠️ Error al obtener mesa {mesa_id}: {str(e)}")
+            logger.error("Error al obtener mesa %s: %s", mesa_id, e)
             return None
 
     def limpiar_mesa(self, mesa_id):
         """Reinicia el estado de una mesa después de pagar."""
-        mesa = self.obtener_mesa(mesa_id)
-        if mesa:
-            mesa['estado'] = 'libre'
+        mesa_data = self.obtener_mesa(mesa_id)
+        if mesa_data:
+            mesa = mesa_data[0]
+            self.cambiar_estado_mesa(str(mesa_id), 'libre')
             for i in range(1, mesa['capacidad'] + 1):
                 cliente_key = f"cliente_{i}"
                 mesa[cliente_key]['nombre'] = ""
@@ -222,27 +427,59 @@ class SistemaMesas:
             self.guardar_mesas()
 
     def mostrar_menu_completo(self):
-        """Muestra el menú completo y devuelve la lista de todos los platos."""
-        etapas = sorted(self.menu['platos'].keys())
-        todos_platos = []
-        contador_global = 1
+        """Muestra el menú completo y devuelve la lista de todos los platos (la de la instantánea vigente)."""
+        todos_platos = self.obtener_menu_indexado()
 
         print("\n=== MENÚ COMPLETO ===")
 
-        for etapa in etapas:
-            print(f"\n--- {etapa.upper()} ---")
-            for categoria, platos in sorted(self.menu['platos'][etapa].items()):
-                print(f"\n  {categoria.capitalize()}:")
-                for plato in platos:
-                    todos_platos.append({'etapa': etapa, 'categoria': categoria, 'plato': plato, 'index': contador_global})
-                    dietas = ", ".join(plato.get('dietas', []))
-                    print(f"  {contador_global}. {plato['nombre']} - ${plato['precio']}")
-                    print(f"      {plato.get('descripcion', '')}")
-                    if dietas:
-                        print(f"      🏷️ {dietas}")
-                    contador_global += 1
+        etapa_actual = categoria_actual = None
+        for item in todos_platos:
+            if item['etapa'] != etapa_actual:
+                etapa_actual, categoria_actual = item['etapa'], None
+                print(f"\n--- {etapa_actual.upper()} ---")
+            if item['categoria'] != categoria_actual:
+                categoria_actual = item['categoria']
+                print(f"\n  {categoria_actual.capitalize()}:")
+            plato = item['plato']
+            dietas = ", ".join(plato.get('dietas', []))
+            print(f"  {item['index']}. {plato['nombre']} - ${plato['precio']}")
+            print(f"      {plato.get('descripcion', '')}")
+            if dietas:
+                print(f"      🏷️ {dietas}")
         return todos_platos
 
+    def obtener_menu_indexado(self):
+        """Devuelve la lista numerada de todos los platos (igual a mostrar_menu_completo, sin imprimir)."""
+        return self.instantanea_menu().indexado
+
+    def obtener_plato(self, plato_id):
+        """Devuelve el plato con ese id (número o texto), o None si no está en el menú."""
+        return self.instantanea_menu().platos_por_id.get(str(plato_id))
+
+    def obtener_menu_disponible(self):
+        """Devuelve la lista numerada solo con los platos disponibles (vista en caché por instantánea)."""
+        instantanea = self.instantanea_menu()
+        cache = self._menu_disponible
+        if cache is None or cache[0] is not instantanea:
+            cache = (instantanea, [item for item in instantanea.indexado if self.plato_disponible(item['plato'])])
+            # Solo se guarda la vista de la instantánea vigente (no la de un pedido que quedó con una anterior)
+            if instantanea is self._instantanea_menu:
+                self._menu_disponible = cache
+        return cache[1]
+
+    def invalidar_menu_disponible(self):
+        """Descarta la vista en caché de platos disponibles (cambió la disponibilidad)."""
+        self._menu_disponible = None
+
+    def plato_disponible(self, plato):
+        """El plato está habilitado en el menú y tiene stock."""
+        return plato.get('disponible', True) and plato.get('id') not in self._agotados
+
+    def fijar_agotados(self, plato_ids):
+        """Reemplaza el conjunto de platos sin stock."""
+        self._agotados = frozenset(plato_ids)
+        self.invalidar_menu_disponible()
+
     def _normalizar_categoria(self, categoria):
         """Normaliza el nombre de la categoría para comparación."""
         return categoria.lower().replace('/', ' ').strip()
@@ -253,7 +490,7 @@ class SistemaMesas:
         for etapa in self.menu['platos'].values():
             for cat in etapa.keys():
                 cat_normalizada = self._normalizar_categoria(cat)
-                print(f"Normalizando categoría del menú: '{cat}' -> '{cat_normalizada}'")
+                logger.debug("Normalizando categoría del menú: '%s' -> '%s'", cat, cat_normalizada)
                 categorias.add(cat_normalizada)
         return sorted(list(categorias))
 
@@ -261,12 +498,12 @@ class SistemaMesas:
         """Obtiene todos los platos de una categoría específica."""
         platos_categoria = []
         categoria_normalizada = self._normalizar_categoria(categoria)
-        print(f"Buscando platos para categoría normalizada: '{categoria_normalizada}'")
+        logger.debug("Buscando platos para categoría normalizada: '%s'", categoria_normalizada)
         
         for etapa in self.menu['platos'].values():
             for cat_nombre, platos in etapa.items():
                 cat_nombre_normalizado = self._normalizar_categoria(cat_nombre)
-                print(f"Comparando con categoría del menú: '{cat_nombre}' -> '{cat_nombre_normalizado}'")
+                logger.debug("Comparando con categoría del menú: '%s' -> '%s'", cat_nombre, cat_nombre_normalizado)
                 if cat_nombre_normalizado == categoria_normalizada:
                     platos_categoria.extend(platos)
         
@@ -307,19 +544,19 @@ class SistemaMesas:
     def ocupar_mesa(self, mesa_id, clientes):
         """Ocupa una mesa con los clientes especificados."""
         if mesa_id not in self.mesas:
-            print(f"⚠️ Error: Mesa {mesa_id} no encontrada")
+            logger.warning("Mesa %s no encontrada", mesa_id)
             return False
 
         mesa = self.mesas[mesa_id][0]
         
         # Verificar si la mesa está libre
         if mesa['estado'] != 'libre':
-            print(f"⚠️ Error: Mesa {mesa_id} ya está ocupada")
+            logger.warning("Mesa %s ya está ocupada", mesa_id)
             return False
 
         # Verificar si hay suficiente capacidad
         if len(clientes) > mesa['capacidad']:
-            print(f"⚠️ Error: La mesa {mesa_id} no tiene suficiente capacidad para {len(clientes)} clientes")
+            logger.warning("La mesa %s no tiene suficiente capacidad para %s clientes", mesa_id, len(clientes))
             return False
 
         # Registrar cada cliente
@@ -331,7 +568,7 @@ class SistemaMesas:
             }
 
         # Marcar la mesa como ocupada
-        mesa['estado'] = 'ocupada'
+        self.cambiar_estado_mesa(mesa_id, 'ocupada')
         mesa['comentarios_camarero'] = []
         mesa['notificaciones'] = []
 
@@ -341,21 +578,21 @@ class SistemaMesas:
     def agregar_cliente_mesa(self, mesa_id, nombre_cliente):
         """Agrega un nuevo cliente a una mesa existente si hay espacio disponible."""
         if mesa_id not in self.mesas:
-            print(f"⚠️ Error: Mesa {mesa_id} no encontrada")
+            logger.warning("Mesa %s no encontrada", mesa_id)
             return False
 
         mesa = self.mesas[mesa_id][0]
         
         # Verificar si la mesa está ocupada
         if mesa['estado'] != 'ocupada':
-            print(f"⚠️ Error: Mesa {mesa_id} no está ocupada")
+            logger.warning("Mesa %s no está ocupada", mesa_id)
             return False
 
         # Verificar si el cliente ya existe en la mesa
         for i in range(1, mesa['capacidad'] + 1):
             cliente_key = f"cliente_{i}"
             if mesa[cliente_key].get('nombre') == nombre_cliente:
-                print(f"⚠️ Error: El cliente {nombre_cliente} ya está en la mesa")
+                logger.warning("El cliente %s ya está en la mesa", nombre_cliente)
                 return False
 
         # Buscar un espacio libre
@@ -368,5 +605,5 @@ class SistemaMesas:
                 }
                 return self.guardar_mesas()
 
-        print(f"⚠️ Error: No hay espacio disponible en la mesa {mesa_id}")
+        logger.warning("No hay espacio disponible en la mesa %s", mesa_id)
         return False
\ No newline at end of file
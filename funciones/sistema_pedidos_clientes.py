@@ -1,19 +1,24 @@
 from datetime import datetime
 import os
 import json
-from .sistema_mesas import SistemaMesas
+from .sistema_mesas import SistemaMesas, HISTORIAL_DIR
 from .sistema_pedidos_cocina import SistemaPedidosCocina
+from .metricas_cocina import marcar_transicion
 from .sistema_pedidos_mozos import SistemaPedidosMozos
 from .base_visualizacion import BaseVisualizador
-
-HISTORIAL_DIR = os.path.join("data", "historial_pagos")
+from .archivo_tickets import ArchivoTickets
+from .cierre_caja import cierre_caja_compartido
 
 class SistemaPedidosClientes(BaseVisualizador):
     """Sistema de gestión de pedidos para los clientes del restaurante."""
 
-    def __init__(self, sistema_mesas):
+    def __init__(self, sistema_mesas, sistema_cocina=None, archivo_tickets=None, cierre_caja=None):
         """Inicializa el sistema con dependencias necesarias."""
         super().__init__(sistema_mesas)
+        self.sistema_cocina = sistema_cocina
+        # Con __len__, un archivo vacío es falso: se compara con None
+        self.archivo_tickets = archivo_tickets if archivo_tickets is not None else ArchivoTickets()
+        self.cierre_caja = cierre_caja or cierre_caja_compartido(sistema_mesas)
         self.estados_pedido = {
             'pendiente': '🟡 Pendiente',
             'en_preparacion': '👨‍🍳 En preparación',
@@ -51,12 +56,12 @@ class SistemaPedidosClientes(BaseVisualizador):
             print(f"\n⚠️ Error: Cliente {cliente_key} no encontrado en la mesa {mesa_id}.")
             return
 
-        # Generar un ID único para el pedido usando timestamp y un contador por cliente
+        # Generar un ID único para el pedido usando timestamp, el número de cliente y un contador por cliente
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
         if 'contador_pedidos' not in cliente:
             cliente['contador_pedidos'] = 0
         cliente['contador_pedidos'] += 1
-        pedido_id = f"{timestamp}_{cliente['contador_pedidos']}"
+        pedido_id = f"{timestamp}_{cliente_key.split('_')[-1]}_{cliente['contador_pedidos']}"
         self._guardar_cambios()  # Guardar el incremento del contador
 
         while True:
@@ -104,6 +109,10 @@ class SistemaPedidosClientes(BaseVisualizador):
                     print("Opción inválida")
                     continue
 
+                if plato and not self.sistema_mesas.plato_disponible(plato):
+                    print(f"\n⚠️ {plato['nombre']} no está disponible en este momento")
+                    continue
+
                 if plato:
                     cantidad = 1
                     nuevo_pedido = {
@@ -112,9 +121,11 @@ class SistemaPedidosClientes(BaseVisualizador):
                         'nombre': plato['nombre'],
                         'cantidad': 1,
                         'precio': plato['precio'],
+                        'version_menu': self.sistema_mesas.instantanea_menu().version,
                         'hora': datetime.now().strftime("%H:%M hs"),
                         'en_cocina': False
                     }
+                    marcar_transicion(nuevo_pedido, 'creado', self.estados_pedido['pendiente'])
                     cliente['pedidos'].append(nuevo_pedido)
                     self._guardar_cambios()
                     print(f"\n✅ {cantidad} x {plato['nombre']} agregado(s) a tu pedido")
@@ -440,8 +451,8 @@ class SistemaPedidosClientes(BaseVisualizador):
         # Preservar los comentarios existentes
         comentarios_existentes = mesa.get('comentarios_camarero', [])
 
-        # Crear instancia temporal de SistemaPedidosCocina para acceder a los estados
-        sistema_cocina = SistemaPedidosCocina(self.sistema_mesas)
+        # Usar el sistema de cocina compartido (o una instancia temporal) para estados y métricas
+        sistema_cocina = self.sistema_cocina or SistemaPedidosCocina(self.sistema_mesas)
 
         # Verificar si hay pedidos pendientes
         pedidos_pendientes = []
@@ -462,6 +473,7 @@ class SistemaPedidosClientes(BaseVisualizador):
             pedido['en_cocina'] = True
             pedido['hora_envio'] = datetime.now().strftime("%H:%M hs")
             pedido['estado_cocina'] = sistema_cocina.estados_pedido['pendiente']
+            sistema_cocina.registrar_transicion(mesa_id, pedido, 'enviado')
             pedidos_enviados.append(f"{pedido.get('cantidad', 1)} x {pedido.get('nombre', 'Desconocido')} ({cliente_nombre})")
 
         # Restaurar los comentarios después de procesar los pedidos
@@ -494,7 +506,7 @@ class SistemaPedidosClientes(BaseVisualizador):
                         'notas': pedido.get('notas', []),
                         'estado_cocina': pedido.get('estado_cocina'),
                         'entregado': pedido.get('entregado', False),
-                        'es_bebida': 'bebida' in pedido.get('nombre', '').lower()
+                        'es_bebida': self.sistema_mesas.es_bebida(pedido)
                     }
                     pedidos.append(pedido_info)
         return pedidos
@@ -542,6 +554,11 @@ class SistemaPedidosClientes(BaseVisualizador):
                         if pedido.get('entregado', False):
                             print("⚠️ No se puede cancelar un pedido ya entregado")
                             return False
+                        # Un pedido que ya está en cocina se cancela como transición de cocina (sale de sus colas)
+                        if self.sistema_cocina and pedido.get('en_cocina', False):
+                            self.sistema_cocina.registrar_transicion(mesa_id, pedido, 'cancelado')
+                        else:
+                            self.cierre_caja.registrar_cancelacion(mesa_id, pedido)
                         pedido['estado_cocina'] = self.estados_pedido['cancelado']
                         try:
                             self.sistema_mesas.guardar_mesas()
@@ -569,50 +586,32 @@ class SistemaPedidosClientes(BaseVisualizador):
             json.dump(historial, f, ensure_ascii=False, indent=4)
 
     def _guardar_ticket(self, mesa_id, mesa, platos_agrupados, total, metodo_pago, es_grupal):
-        """Guarda el ticket de pago en un archivo."""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        archivo_ticket = os.path.join("data", "tickets", f"ticket_{mesa_id}_{timestamp}.txt")
-        
-        # Crear directorio si no existe
-        os.makedirs(os.path.dirname(archivo_ticket), exist_ok=True)
-        
-        with open(archivo_ticket, 'w', encoding='utf-8') as f:
-            f.write("=" * 40 + "\n")
-            f.write("           TICKET DE PAGO\n")
-            f.write("=" * 40 + "\n\n")
-            
-            # Información de la mesa
-            f.write(f"Mesa: {mesa['nombre']}\n")
-            f.write(f"Fecha: {datetime.now().strftime('%d/%m/%Y %H:%M')}\n")
-            f.write("-" * 40 + "\n\n")
-            
-            # Información de los clientes
-            f.write("Clientes:\n")
-            for i in range(1, mesa.get('capacidad', 0) + 1):
-                cliente_key = f"cliente_{i}"
-                cliente = mesa.get(cliente_key)
-                if cliente and cliente.get('nombre'):
-                    f.write(f"- {cliente['nombre']}\n")
-            f.write("\n")
-            
-            # Detalle de pedidos
-            f.write("DETALLE DE PEDIDOS:\n")
-            f.write("-" * 40 + "\n")
-            for nombre, datos in platos_agrupados.items():
-                if datos['cantidad'] > 1:
-                    f.write(f"{datos['cantidad']}x {nombre}\n")
-                    f.write(f"   Precio unitario: ${datos['precio_unitario']}\n")
-                    f.write(f"   Subtotal: ${datos['subtotal']}\n")
-                else:
-                    f.write(f"1x {nombre} - ${datos['precio_unitario']}\n")
-                f.write("\n")
-            
-            f.write("-" * 40 + "\n")
-            f.write(f"TOTAL A PAGAR: ${total}\n")
-            f.write(f"Método de pago: {metodo_pago}\n")
-            f.write("=" * 40 + "\n")
-            f.write("¡Gracias por su visita!\n")
-            f.write("=" * 40 + "\n")
+        """Guarda el ticket de pago en el archivo de tickets y devuelve su número."""
+        clientes = []
+        for i in range(1, mesa.get('capacidad', 0) + 1):
+            cliente = mesa.get(f"cliente_{i}")
+            if cliente and cliente.get('nombre'):
+                clientes.append(cliente['nombre'])
+
+        ticket = {
+            'mesa_id': mesa_id,
+            'mesa_nombre': mesa['nombre'],
+            'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'tipo_pago': 'grupal' if es_grupal else 'individual',
+            'metodo_pago': metodo_pago,
+            'total': total,
+            'clientes': clientes,
+            'pedidos': [{
+                'cliente': '',
+                'nombre': nombre,
+                'cantidad': datos['cantidad'],
+                'precio': datos['precio_unitario'],
+                'subtotal': datos['subtotal']
+            } for nombre, datos in platos_agrupados.items()]
+        }
+        numero = self.archivo_tickets.agregar(ticket)
+        self.cierre_caja.registrar_pago(ticket)
+        return numero
 
     def _verificar_todos_pagaron(self, mesa):
         """Verifica si todos los clientes han pagado sus pedidos."""
@@ -776,11 +775,12 @@ class SistemaPedidosClientes(BaseVisualizador):
             self._guardar_ticket(mesa_id, mesa, platos_agrupados, total, metodo_pago, tipo_pago == "2")
             
             # Limpiar solo los pedidos del cliente actual
+            self.sistema_mesas.retirar_pedidos(mesa_id, cliente.get('pedidos', []))
             cliente['pedidos'] = []
             
             # Si es pago grupal o todos los clientes han pagado, limpiar la mesa
             if tipo_pago == "2" or self._verificar_todos_pagaron(mesa):
-                mesa['estado'] = 'libre'
+                self.sistema_mesas.cambiar_estado_mesa(mesa_id, 'libre')
                 for i in range(1, mesa.get('capacidad', 0) + 1):
                     cliente_key = f"cliente_{i}"
                     if cliente_key in mesa:
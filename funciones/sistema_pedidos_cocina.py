@@ -1,5 +1,17 @@
+import logging
 from datetime import datetime
 from .base_visualizacion import BaseVisualizador
+from .metricas_cocina import MetricasCocina, marcar_transicion
+from .monitor_retrasos import MonitorRetrasos
+from .estimador_eta import EstimadorETA
+from .planificador_cocina import PlanificadorCocina
+from .lotes_cocina import LotesCocina
+from .estaciones_cocina import ColasEstaciones
+from .inventario import SistemaInventario
+from .cierre_caja import cierre_caja_compartido
+from .instrumentacion import registro_metricas
+
+logger = logging.getLogger(__name__)
 
 class ManejadorNotificaciones:
     """Clase para gestionar todas las notificaciones del sistema"""
@@ -28,34 +40,139 @@ class ManejadorNotificaciones:
     def _validar_mesa(self, mesa_id):
         """Valida que la mesa exista y devuelve la lista asociada"""
         if mesa_id not in self.sistema_mesas.mesas:
-            print(f"⚠️ Error: Mesa {mesa_id} no encontrada")
+            logger.warning("Mesa %s no encontrada", mesa_id)
             return None
         return self.sistema_mesas.mesas[mesa_id]
 
 class SistemaPedidosCocina(BaseVisualizador):
     """Sistema de gestión de pedidos para la cocina de un restaurante."""
 
-    def __init__(self, sistema_mesas):
+    def __init__(self, sistema_mesas, cierre_caja=None):
         """Inicializa el sistema con dependencias necesarias."""
         super().__init__(sistema_mesas)
         self.notificaciones = ManejadorNotificaciones(sistema_mesas)
+        self.cierre_caja = cierre_caja or cierre_caja_compartido(sistema_mesas)
+        self.metricas = MetricasCocina(sistema_mesas)
         self.estados_pedido = {
             'pendiente': '🟡 Pendiente en cocina',
             'en_preparacion': '👨‍🍳 EN PREPARACIÓN',
             'listo': '✅ LISTO PARA ENTREGAR',
             'cancelado': '🔴 CANCELADO'
         }
+        self.etiquetas_transicion = {
+            'creado': '🟡 Pendiente',
+            'enviado': self.estados_pedido['pendiente'],
+            'en_preparacion': self.estados_pedido['en_preparacion'],
+            'listo': self.estados_pedido['listo'],
+            'cancelado': self.estados_pedido['cancelado'],
+            'entregado': '🍽️ ENTREGADO'
+        }
+        self.monitor_retrasos = MonitorRetrasos(sistema_mesas, self.notificaciones)
+        self.estimador_eta = EstimadorETA(sistema_mesas)
+        self.planificador = PlanificadorCocina(sistema_mesas, self.estimador_eta)
+        self.lotes = LotesCocina(sistema_mesas)
+        self.estaciones = ColasEstaciones(sistema_mesas)
+        self.inventario = SistemaInventario(sistema_mesas)
+        sistema_mesas.agregar_observador_retiro(self._retirar_pedidos)
+
+    def _retirar_pedidos(self, mesa_id, pedidos):
+        """Saca de las colas de cocina los pedidos que dejan la mesa sin pasar por la cocina."""
+        if pedidos is None:
+            self.estimador_eta.quitar_mesa(mesa_id)
+            self.monitor_retrasos.quitar_mesa(mesa_id)
+            self.planificador.quitar_mesa(mesa_id)
+            self.lotes.quitar_mesa(mesa_id)
+            self.estaciones.quitar_mesa(mesa_id)
+            return
+        for pedido in pedidos:
+            self.estimador_eta.quitar(mesa_id, pedido)
+            self.monitor_retrasos.descartar(mesa_id, pedido)
+            self.planificador.quitar(mesa_id, pedido)
+            self.lotes.quitar(mesa_id, pedido)
+            self.estaciones.quitar(mesa_id, pedido)
+
+    def _en_preparacion(self, pedido):
+        """Indica si el pedido está en cocina sin terminar: su stock ya se descontó y todavía se puede devolver."""
+        return (pedido.get('en_cocina', False)
+                and not pedido.get('entregado', False)
+                and pedido.get('estado_cocina') not in (self.estados_pedido['listo'], self.estados_pedido['cancelado']))
+
+    def registrar_transicion(self, mesa_id, pedido, estado):
+        """Registra un cambio de estado del pedido con marca de tiempo y actualiza las métricas.
+
+        Se llama antes de cambiar pedido['estado_cocina'], así que todavía se ve el estado anterior.
+        """
+        # El stock vuelve solo la primera vez que se cancela un pedido en preparación (no si ya estaba listo o entregado)
+        devolver_stock = estado == 'cancelado' and self._en_preparacion(pedido)
+        ts = marcar_transicion(pedido, estado, self.etiquetas_transicion.get(estado))
+        self.metricas.observar_transicion(pedido)
+        self.estimador_eta.observar_transicion(mesa_id, pedido, estado)
+        if estado == 'enviado':
+            self.monitor_retrasos.programar(mesa_id, pedido, ts)
+            self.planificador.encolar(mesa_id, pedido, ts)
+            self.lotes.agregar(mesa_id, pedido, ts)
+            self.estaciones.despachar(mesa_id, pedido)
+            self.inventario.descontar(pedido)
+        elif estado in ('listo', 'cancelado', 'entregado'):
+            self.monitor_retrasos.descartar(mesa_id, pedido)
+            self.planificador.quitar(mesa_id, pedido)
+            self.lotes.quitar(mesa_id, pedido)
+            self.estaciones.quitar(mesa_id, pedido)
+            if devolver_stock:
+                self.inventario.restaurar(pedido)
+            if estado == 'cancelado':
+                self.cierre_caja.registrar_cancelacion(mesa_id, pedido)
+
+    def enviar_pedidos_mesa(self, mesa_id):
+        """Envía a cocina los pedidos pendientes de una mesa y devuelve los enviados."""
+        mesa_data = self._validar_mesa(mesa_id)
+        if not mesa_data:
+            return [], None
+
+        mesa = mesa_data[0]
+        pedidos_enviados = []
+        timestamp = datetime.now().strftime("%H:%M hs")
+
+        for i in range(1, mesa.get('capacidad', 0) + 1):
+            cliente_key = f"cliente_{i}"
+            cliente = mesa.get(cliente_key)
+            if cliente and cliente.get('nombre'):
+                for pedido in cliente.get('pedidos', []):
+                    if not pedido.get('en_cocina', False) and not pedido.get('entregado', False):
+                        pedido['en_cocina'] = True
+                        pedido['hora_envio'] = timestamp
+                        pedido['estado_cocina'] = self.estados_pedido['pendiente']
+                        self.registrar_transicion(mesa_id, pedido, 'enviado')
+                        pedidos_enviados.append({
+                            'id': pedido['id'],
+                            'cliente': cliente['nombre'],
+                            'nombre': pedido['nombre'],
+                            'cantidad': pedido['cantidad']
+                        })
+
+        if pedidos_enviados:
+            self.sistema_mesas.guardar_mesas()
+        return pedidos_enviados, timestamp
 
     def mostrar_pedidos_activos(self):
-        """Muestra los pedidos activos en cocina."""
+        """Muestra los pedidos activos en cocina, ordenados según el planificador."""
         pedidos_activos = []
+        revisados = 0
         
         for mesa_id, mesa_data in self.sistema_mesas.mesas.items():
             mesa = mesa_data[0]
             if mesa['estado'] == 'ocupada':
                 pedidos = self.procesar_pedidos_mesa(mesa_id)
+                revisados += len(pedidos)
                 pedidos_cocina = [p for p in pedidos if p.get('en_cocina', False) and not p.get('entregado', False) and not p.get('es_bebida')]
                 pedidos_activos.extend(pedidos_cocina)
+
+        # Los pedidos que ya no están en la cola (listos o cancelados) van al final
+        posiciones = self.planificador.posiciones()
+        for pedido in pedidos_activos:
+            pedido['prioridad'] = posiciones.get((pedido['mesa_id'], pedido['id']))
+        pedidos_activos.sort(key=lambda p: p['prioridad'] if p['prioridad'] is not None else len(posiciones) + 1)
+        registro_metricas.observar_recorrido('mostrar_pedidos_activos', revisados)
         
         return pedidos_activos
 
@@ -94,11 +211,14 @@ class SistemaPedidosCocina(BaseVisualizador):
             'en_cocina': pedido.get('en_cocina', False),
             'entregado': pedido.get('entregado', False),
             'retraso_minutos': pedido.get('retraso_minutos', 0),
-            'es_bebida': 'bebida' in pedido.get('nombre', '').lower()
+            'es_bebida': self.sistema_mesas.es_bebida(pedido),
+            'estacion': self.sistema_mesas.obtener_estacion(pedido)
         }
 
     def actualizar_estado_pedido(self, mesa_id, pedido_id, nuevo_estado):
         """Actualiza el estado de un pedido específico."""
+        if nuevo_estado not in self.estados_pedido:
+            raise ValueError(f"Estado inválido: {nuevo_estado}")
         mesa_data = self._validar_mesa(mesa_id)
         if not mesa_data:
             return False
@@ -110,24 +230,53 @@ class SistemaPedidosCocina(BaseVisualizador):
             if cliente and cliente.get('nombre'):
                 for pedido in cliente.get('pedidos', []):
                     if pedido.get('id') == pedido_id:
+                        # Repetir el estado actual no es una transición (no vuelve a devolver stock ni a sumar cancelaciones)
+                        if pedido.get('estado_cocina') == self.estados_pedido[nuevo_estado]:
+                            return True
                         # Registrar el historial de estados
-                        if 'historial_estados' not in pedido:
-                            pedido['historial_estados'] = []
-                        
-                        pedido['historial_estados'].append({
-                            'estado': self.estados_pedido[nuevo_estado],
-                            'hora': datetime.now().strftime("%H:%M hs")
-                        })
-                        
+                        self.registrar_transicion(mesa_id, pedido, nuevo_estado)
                         pedido['estado_cocina'] = self.estados_pedido[nuevo_estado]
-                        try:
-                            self.sistema_mesas.guardar_mesas()
-                            return True
-                        except Exception as e:
-                            print(f"⚠️ Error al guardar mesas: {e}")
-                            return False
+                        # guardar_mesas registra el error y devuelve False si no pudo escribir
+                        return self.sistema_mesas.guardar_mesas()
         return False
 
+    def actualizar_estado_lote(self, plato_id, nuevo_estado):
+        """Actualiza de una vez el estado de todos los pedidos de un plato en cocina.
+
+        Devuelve los pedidos actualizados, o None si los cambios no se pudieron guardar.
+        """
+        if nuevo_estado not in self.estados_pedido:
+            raise ValueError(f"Estado inválido: {nuevo_estado}")
+
+        actualizados = []
+        for mesa_id, pedido in self.lotes.pedidos_del_lote(plato_id):
+            if pedido.get('estado_cocina') == self.estados_pedido[nuevo_estado]:
+                continue
+            self.registrar_transicion(mesa_id, pedido, nuevo_estado)
+            pedido['estado_cocina'] = self.estados_pedido[nuevo_estado]
+            actualizados.append({'mesa_id': mesa_id, 'id': pedido.get('id')})
+
+        if actualizados and not self.sistema_mesas.guardar_mesas():
+            logger.error("No se pudo guardar el cambio de estado del lote %s", plato_id)
+            return None
+        return actualizados
+
+    def buscar_pedido(self, pedido_id):
+        """Busca un pedido por id en todas las mesas y devuelve (mesa_id, cliente, pedido), o None."""
+        revisados = 0
+        for mesa_id, mesa_data in self.sistema_mesas.mesas.items():
+            mesa = mesa_data[0]
+            for i in range(1, mesa.get('capacidad', 0) + 1):
+                cliente = mesa.get(f"cliente_{i}")
+                if cliente and cliente.get('nombre'):
+                    for posicion, pedido in enumerate(cliente.get('pedidos', []), 1):
+                        if pedido.get('id') == pedido_id:
+                            registro_metricas.observar_recorrido('buscar_pedido', revisados + posicion)
+                            return mesa_id, cliente, pedido
+                    revisados += len(cliente.get('pedidos', []))
+        registro_metricas.observar_recorrido('buscar_pedido', revisados)
+        return None
+
     def obtener_pedidos_mesa(self, mesa_id):
         """Obtiene los pedidos de una mesa específica."""
         mesa_data = self._validar_mesa(mesa_id)
@@ -154,7 +303,7 @@ class SistemaPedidosCocina(BaseVisualizador):
                             'notas': pedido.get('notas', []),
                             'estado_cocina': pedido.get('estado_cocina'),
                             'entregado': pedido.get('entregado', False),
-                            'es_bebida': 'bebida' in pedido.get('nombre', '').lower()
+                            'es_bebida': self.sistema_mesas.es_bebida(pedido)
                         }
                         pedidos.append(pedido_info)
         return pedidos
\ No newline at end of file
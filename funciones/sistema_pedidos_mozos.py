@@ -1,7 +1,20 @@
 from datetime import datetime
-import os
-import json
+import logging
+import threading
+import time
+import uuid
 from .base_visualizacion import BaseVisualizador
+from .sistema_analitica import SistemaAnalitica
+from .almacen_tickets import AlmacenColumnarTickets, DIAS_EN_MEMORIA
+from .metricas_cocina import marcar_transicion
+from .historial_pagos import HistorialPagos
+from .archivo_tickets import ArchivoTickets
+from .cola_tareas import ColaTareas
+from .registro_eventos import RegistroEventos
+from .cierre_caja import cierre_caja_compartido
+from .instrumentacion import registro_metricas
+
+logger = logging.getLogger(__name__)
 
 class ManejadorNotificaciones:
     """Clase para gestionar todas las notificaciones del sistema"""
@@ -30,7 +43,7 @@ class ManejadorNotificaciones:
     def _validar_mesa(self, mesa_id):
         """Valida que la mesa exista y devuelve la lista asociada"""
         if mesa_id not in self.sistema_mesas.mesas:
-            print(f"⚠️ Error: Mesa {mesa_id} no encontrada")
+            logger.warning("Mesa %s no encontrada", mesa_id)
             return None
         return self.sistema_mesas.mesas[mesa_id]
 
@@ -240,10 +253,20 @@ class VisualizadorPedidosMozo(BaseVisualizador):
 class SistemaPedidosMozos(BaseVisualizador):
     """Sistema de gestión de pedidos para los mozos del restaurante."""
 
-    def __init__(self, sistema_mesas):
+    def __init__(self, sistema_mesas, sistema_cocina=None, archivo_tickets=None, cola_tareas=None,
+                 registro_eventos=None, cierre_caja=None):
         """Inicializa el sistema con dependencias necesarias."""
         super().__init__(sistema_mesas)
         self.notificaciones = ManejadorNotificaciones(sistema_mesas)
+        self.sistema_cocina = sistema_cocina
+        # Con __len__, un archivo o una cola vacíos son falsos: se compara con None
+        self.archivo_tickets = archivo_tickets if archivo_tickets is not None else ArchivoTickets()
+        self.registro_eventos = registro_eventos or RegistroEventos()
+        self.cierre_caja = cierre_caja or cierre_caja_compartido(sistema_mesas)
+        # Escrituras que no necesitan terminar antes de responder (ticket, historial, registro de reinicios)
+        self.cola_tareas = cola_tareas if cola_tareas is not None else ColaTareas()
+        self.cola_tareas.registrar('guardar_ticket', self._tarea_guardar_ticket)
+        self.cola_tareas.registrar('registrar_reinicio', self._tarea_registrar_reinicio)
         self.estados_pedido = {
             'preparar': '🟢 PREPARAR AHORA',
             'normal': '🟡 NORMAL',
@@ -258,106 +281,90 @@ class SistemaPedidosMozos(BaseVisualizador):
             'realizado': '✅ Realizado'
         }
         self.pagos_pendientes = []
-        self.historial_tickets = []
-        self._cargar_historial()
-
-    def _cargar_historial(self):
-        """Carga el historial de tickets desde el archivo."""
-        try:
-            if os.path.exists('data/historial_pagos/historial.json'):
-                with open('data/historial_pagos/historial.json', 'r') as f:
-                    self.historial_tickets = json.load(f)
-        except Exception as e:
-            print(f"Error al cargar historial de tickets: {str(e)}")
-            self.historial_tickets = []
-
-    def _guardar_historial(self):
-        """Guarda el historial de tickets en el archivo."""
+        self.historial = HistorialPagos()
+        # La analítica y el almacén columnar se arman recién cuando se consultan, leyendo el historial en streaming
+        self._analitica = None
+        self._almacen_tickets = None
+        self._lock_historial = threading.Lock()
+
+    @property
+    def analitica(self):
+        if self._analitica is None:
+            with self._lock_historial:
+                if self._analitica is None:
+                    self._analitica = SistemaAnalitica(self.sistema_mesas, self.historial.iterar())
+        return self._analitica
+
+    @property
+    def almacen_tickets(self):
+        """Almacén columnar con los últimos DIAS_EN_MEMORIA días del historial."""
+        if self._almacen_tickets is None:
+            with self._lock_historial:
+                if self._almacen_tickets is None:
+                    corte = time.time() - DIAS_EN_MEMORIA * 86400
+                    primero = self.historial.obtener(0)
+                    if primero is None or self._ts_ticket(primero) >= corte:
+                        # El historial entero entra en la ventana
+                        corte = None
+                    self._almacen_tickets = AlmacenColumnarTickets(self.historial.iterar(desde=corte), desde=corte)
+        return self._almacen_tickets
+
+    @staticmethod
+    def _ts_ticket(ticket):
         try:
-            os.makedirs('data/historial_pagos', exist_ok=True)
-            with open('data/historial_pagos/historial.json', 'w') as f:
-                json.dump(self.historial_tickets, f, indent=4)
-        except Exception as e:
-            print(f"Error al guardar historial de tickets: {str(e)}")
+            return datetime.strptime(ticket['fecha'], '%Y-%m-%d %H:%M:%S').timestamp()
+        except (KeyError, TypeError, ValueError):
+            return float('-inf')
+
+    def reporte_lineas(self, agrupar, medida='subtotal', desde=None, hasta=None):
+        """Agrupa las líneas de ticket con fecha en [desde, hasta) y suma la medida.
+
+        Usa el almacén en memoria si cubre el rango; si no, suma leyendo el historial por bloques.
+        Devuelve (datos, filas en memoria o None si se leyó el historial).
+        """
+        almacen = self.almacen_tickets
+        if almacen.cubre(desde):
+            return almacen.sumar_por(agrupar, medida, desde, hasta), len(almacen)
+        tickets = self.historial.iterar(desde=desde, hasta=hasta)
+        return AlmacenColumnarTickets.sumar_por_bloques(tickets, agrupar, medida, desde, hasta), None
+
+    def _registrar_en_historial(self, ticket):
+        """Agrega el ticket al historial y a las vistas que ya estén armadas."""
+        # Con el lock, una vista que se está armando no puede leer el ticket y además recibirlo acá
+        with self._lock_historial:
+            if self.historial.contiene_clave(ticket):
+                return
+            self.historial.agregar(ticket)
+            if self._analitica is not None:
+                self._analitica.registrar_ticket(ticket)
+            if self._almacen_tickets is not None:
+                self._almacen_tickets.agregar_ticket(ticket)
 
     def guardar_ticket(self, ticket):
-        """Guarda un ticket en formato texto en el directorio de tickets."""
+        """Numera el ticket, lo guarda en el archivo de tickets y lo agrega al historial."""
         try:
-            # Crear directorio si no existe
-            os.makedirs('data/tickets', exist_ok=True)
-            
-            # Generar nombre de archivo único usando timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M")
-            mesa_id = ticket['mesa_id']
-            filename = f"ticket_{mesa_id}_{timestamp}.txt"
-            
-            # Crear el contenido del ticket
-            contenido = [
-                "=" * 40,
-                "           TICKET DE PAGO",
-                "=" * 40,
-                f"\nMesa: {ticket['mesa_nombre']}",
-                f"Fecha: {datetime.strptime(ticket['fecha'], '%Y-%m-%d %H:%M:%S').strftime('%d/%m/%Y %H:%M')}",
-                "-" * 40,
-                "\nClientes:"
-            ]
-            
-            # Agregar clientes
-            clientes = set()
-            for pedido in ticket['pedidos']:
-                clientes.add(pedido['cliente'])
-            for cliente in sorted(clientes):
-                contenido.append(f"- {cliente}")
-            
-            # Agregar detalle de pedidos
-            contenido.extend([
-                "\nDETALLE DE PEDIDOS:",
-                "-" * 40
-            ])
-            
-            # Agrupar pedidos por cliente
-            pedidos_por_cliente = {}
-            for pedido in ticket['pedidos']:
-                cliente = pedido['cliente']
-                if cliente not in pedidos_por_cliente:
-                    pedidos_por_cliente[cliente] = []
-                pedidos_por_cliente[cliente].append(pedido)
-            
-            # Agregar pedidos al ticket
-            for cliente, pedidos in pedidos_por_cliente.items():
-                for pedido in pedidos:
-                    if pedido['cantidad'] > 1:
-                        contenido.extend([
-                            f"{pedido['cantidad']}x {pedido['nombre']}",
-                            f"   Precio unitario: ${pedido['precio']}",
-                            f"   Subtotal: ${pedido['subtotal']}\n"
-                        ])
-                    else:
-                        contenido.append(f"{pedido['cantidad']}x {pedido['nombre']} - ${pedido['precio']}\n")
-            
-            # Agregar total y método de pago
-            contenido.extend([
-                "-" * 40,
-                f"TOTAL A PAGAR: ${ticket['total']}",
-                f"Método de pago: {ticket['metodo_pago'].capitalize()}",
-                "=" * 40,
-                "¡Gracias por su visita!",
-                "=" * 40
-            ])
-            
-            # Guardar el ticket
-            with open(f'data/tickets/{filename}', 'w', encoding='utf-8') as f:
-                f.write('\n'.join(contenido))
-            
-            # También agregar al historial
-            self.historial_tickets.append(ticket)
-            self._guardar_historial()
-            
+            self._tarea_guardar_ticket(ticket)
             return True
         except Exception as e:
-            print(f"Error al guardar ticket: {str(e)}")
+            logger.error("Error al guardar ticket: %s", e)
             return False
 
+    def _tarea_guardar_ticket(self, ticket):
+        """Tarea de la cola: archiva el ticket y lo agrega al historial (los errores provocan reintentos).
+
+        Si el proceso se cortó durante la tarea, la cola la repite con el ticket del diario (sin número):
+        el archivo y el historial reconocen la clave del pago y no lo vuelven a agregar.
+        """
+        # En un reintento el ticket puede tener número ya asignado: no se vuelve a archivar
+        if not ticket.get('numero'):
+            self.archivo_tickets.agregar(ticket)
+        self._registrar_en_historial(ticket)
+
+    def _tarea_registrar_reinicio(self, registro):
+        """Tarea de la cola: agrega el reinicio de una mesa al registro de eventos del día."""
+        datos = {clave: valor for clave, valor in registro.items() if clave not in ('fecha', 'tipo')}
+        self.registro_eventos.agregar(registro.get('tipo', 'reinicio'), datos, fecha=registro['fecha'])
+
     def confirmar_pago(self, mesa_id, cliente, tipo_pago, metodo_pago, total):
         """Confirma un pago y guarda el ticket."""
         try:
@@ -380,6 +387,8 @@ class SistemaPedidosMozos(BaseVisualizador):
 
             # Crear el ticket
             ticket = {
+                # Clave del pago: el archivo y el historial la usan para no repetir el ticket si la tarea se repite
+                'clave': uuid.uuid4().hex,
                 'mesa_id': mesa_id,
                 'mesa_nombre': mesa['nombre'],
                 'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
@@ -409,9 +418,9 @@ class SistemaPedidosMozos(BaseVisualizador):
                                 'subtotal': pedido['precio'] * pedido['cantidad']
                             })
 
-            # Guardar el ticket
-            if not self.guardar_ticket(ticket):
-                return False, "Error al guardar el ticket"
+            # El ticket se archiva en segundo plano: el pago queda confirmado al quedar en el diario de la cola
+            self.cola_tareas.encolar('guardar_ticket', ticket)
+            self.cierre_caja.registrar_pago(ticket)
 
             # Eliminar el pago de la lista de pendientes
             self.pagos_pendientes = [
@@ -427,6 +436,7 @@ class SistemaPedidosMozos(BaseVisualizador):
                     cliente_data = mesa.get(cliente_key)
                     if cliente_data and cliente_data.get('nombre') == cliente:
                         # Limpiar pedidos del cliente
+                        self.sistema_mesas.retirar_pedidos(mesa_id, cliente_data.get('pedidos', []))
                         mesa[cliente_key] = {
                             'nombre': '',
                             'pedidos': [],
@@ -435,7 +445,7 @@ class SistemaPedidosMozos(BaseVisualizador):
                         break
             else:
                 # Limpiar toda la mesa
-                mesa['estado'] = 'libre'
+                self.sistema_mesas.cambiar_estado_mesa(mesa_id, 'libre')
                 mesa['comentarios_camarero'] = []
                 mesa['notificaciones'] = []
                 
@@ -460,7 +470,7 @@ class SistemaPedidosMozos(BaseVisualizador):
             return True, "Pago confirmado exitosamente"
 
         except Exception as e:
-            print(f"Error al confirmar pago: {str(e)}")
+            logger.error("Error al confirmar pago: %s", e)
             return False, str(e)
 
     def mostrar_pedidos_pendientes(self):
@@ -480,7 +490,7 @@ class SistemaPedidosMozos(BaseVisualizador):
         try:
             mesa_data = self._validar_mesa(mesa_id)
             if not mesa_data:
-                print(f"⚠️ Error: Mesa {mesa_id} no encontrada")
+                logger.warning("Mesa %s no encontrada", mesa_id)
                 return False
 
             mesa = mesa_data[0]
@@ -493,28 +503,32 @@ class SistemaPedidosMozos(BaseVisualizador):
                     for pedido in cliente.get('pedidos', []):
                         if pedido.get('id') == pedido_id:
                             if pedido.get('entregado', False):
-                                print(f"⚠️ Error: El pedido {pedido_id} ya está marcado como entregado")
+                                logger.warning("El pedido %s ya está marcado como entregado", pedido_id)
                                 return False
                             pedido['entregado'] = True
                             pedido['hora_entrega'] = datetime.now().strftime("%H:%M hs")
+                            if self.sistema_cocina:
+                                self.sistema_cocina.registrar_transicion(mesa_id, pedido, 'entregado')
+                            else:
+                                marcar_transicion(pedido, 'entregado', self.estados_pedido['entregado'])
                             pedido_encontrado = True
                             break
                     if pedido_encontrado:
                         break
             
             if not pedido_encontrado:
-                print(f"⚠️ Error: Pedido {pedido_id} no encontrado en la mesa {mesa_id}")
+                logger.warning("Pedido %s no encontrado en la mesa %s", pedido_id, mesa_id)
                 return False
                 
             try:
                 self.sistema_mesas.guardar_mesas()
                 return True
             except Exception as e:
-                print(f"⚠️ Error al guardar mesas: {e}")
+                logger.error("Error al guardar mesas: %s", e)
                 return False
                 
         except Exception as e:
-            print(f"⚠️ Error inesperado al marcar pedido como entregado: {e}")
+            logger.error("Error inesperado al marcar pedido como entregado: %s", e)
             return False
 
     def obtener_pedidos_mesa(self, mesa_id):
@@ -543,7 +557,7 @@ class SistemaPedidosMozos(BaseVisualizador):
                             'notas': pedido.get('notas', []),
                             'estado_cocina': pedido.get('estado_cocina'),
                             'entregado': pedido.get('entregado', False),
-                            'es_bebida': 'bebida' in pedido.get('nombre', '').lower()
+                            'es_bebida': self.sistema_mesas.es_bebida(pedido)
                         }
                         pedidos.append(pedido_info)
         return pedidos
@@ -625,7 +639,7 @@ class SistemaPedidosMozos(BaseVisualizador):
                         self.sistema_mesas.guardar_mesas()
                         return True
                     except Exception as e:
-                        print(f"⚠️ Error al guardar mesas (marcar_comentario_realizado): {e}")
+                        logger.error("Error al guardar mesas (marcar_comentario_realizado): %s", e)
                         return False
         return False
 
@@ -669,12 +683,14 @@ class SistemaPedidosMozos(BaseVisualizador):
     def _obtener_pedidos_listos_para_entregar(self):
         """Obtiene todos los pedidos marcados como 'listo' y no entregados."""
         pedidos_listos = []
+        revisados = 0
         for mesa_id, mesa_data in self.sistema_mesas.mesas.items():
             mesa = mesa_data[0]
             if mesa['estado'] == 'ocupada':
                 for i in range(1, mesa['capacidad'] + 1):
                     cliente_key = f"cliente_{i}"
                     if mesa[cliente_key]['nombre']:
+                        revisados += len(mesa[cliente_key]['pedidos'])
                         for pedido in mesa[cliente_key]['pedidos']:
                             if pedido.get('estado_cocina') == '✅ LISTO PARA ENTREGAR' and not pedido.get('entregado'):
                                 pedidos_listos.append({
@@ -684,6 +700,7 @@ class SistemaPedidosMozos(BaseVisualizador):
                                     'nombre': pedido['nombre'],
                                     'id': pedido['id']
                                 })
+        registro_metricas.observar_recorrido('pedidos_listos_para_entregar', revisados)
         return pedidos_listos
 
     def procesar_pedidos_mesa(self, mesa_id):
@@ -717,11 +734,31 @@ class SistemaPedidosMozos(BaseVisualizador):
                         'estado_cocina': pedido.get('estado_cocina'),
                         'retraso_minutos': pedido.get('retraso_minutos'),
                         'entregado': pedido.get('entregado', False),
-                        'es_bebida': 'bebida' in pedido['nombre'].lower()
+                        'es_bebida': self.sistema_mesas.es_bebida(pedido)
                     }
                     pedidos_procesados.append(pedido_procesado)
         return pedidos_procesados
 
+    def registrar_reinicio(self, mesa):
+        """Registra el reinicio de una mesa en el registro de eventos del día y en el cierre de caja."""
+        self.cola_tareas.encolar('registrar_reinicio', {
+            # El registro de eventos no repite un reinicio con la misma clave (tarea repetida)
+            "clave": uuid.uuid4().hex,
+            "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "mesa": mesa['nombre'],
+            "total": 0,
+            "tipo": "reinicio",
+            "detalle": "Mesa reiniciada por el camarero"
+        })
+        self.cierre_caja.registrar_reinicio(mesa['nombre'])
+
+    def cerrar_caja(self):
+        """Cierra el turno (reporte Z) y lo anota en el registro de eventos del día."""
+        reporte = self.cierre_caja.cerrar()
+        self.registro_eventos.agregar('cierre', {'numero': reporte['numero'], 'tickets': reporte['tickets'],
+                                                 'total': reporte['total']})
+        return reporte
+
     def reiniciar_mesa(self, mesa_id):
         """Reinicia una mesa específica, registrando el evento en el historial."""
         mesa_data = self._validar_mesa(mesa_id)
@@ -729,34 +766,9 @@ class SistemaPedidosMozos(BaseVisualizador):
             return False
 
         mesa = mesa_data[0]
-        
-        # Registrar en el historial
-        historial_dir = "data/historial_pagos"
-        if not os.path.exists(historial_dir):
-            os.makedirs(historial_dir)
-
-        fecha_actual = datetime.now().strftime("%Y-%m-%d")
-        archivo_historial = os.path.join(historial_dir, f"pagos_{fecha_actual}.json")
-        
-        registro = {
-            "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "mesa": mesa['nombre'],
-            "total": 0,
-            "tipo": "reinicio",
-            "detalle": "Mesa reiniciada por el camarero"
-        }
 
         try:
-            if os.path.exists(archivo_historial):
-                with open(archivo_historial, 'r', encoding='utf-8') as f:
-                    historial = json.load(f)
-            else:
-                historial = []
-
-            historial.append(registro)
-
-            with open(archivo_historial, 'w', encoding='utf-8') as f:
-                json.dump(historial, f, indent=4, ensure_ascii=False)
+            self.registrar_reinicio(mesa)
 
             # Limpiar la mesa
             for i in range(1, mesa.get('capacidad', 0) + 1):
@@ -765,7 +777,7 @@ class SistemaPedidosMozos(BaseVisualizador):
                     mesa[cliente_key] = {'nombre': '', 'pedidos': []}
             
             # Cambiar el estado de la mesa a 'libre'
-            mesa['estado'] = 'libre'
+            self.sistema_mesas.cambiar_estado_mesa(mesa_id, 'libre')
             
             self.sistema_mesas.guardar_mesas()
             print(f"\n✅ Mesa {mesa['nombre']} reiniciada exitosamente")
@@ -836,6 +848,9 @@ if __name__ == "__main__":
         def guardar_mesas(self):
             print("Simulando guardado de mesas...")
 
+        def es_bebida(self, pedido):
+            return pedido.get('es_bebida', False)
+
     sistema_mesas_simulado = SistemaMesasSimulado()
     sistema_mozos = SistemaPedidosMozos(sistema_mesas_simulado)
     sistema_mozos.mostrar_menu()
\ No newline at end of file
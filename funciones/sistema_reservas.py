@@ -0,0 +1,294 @@
+import bisect
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from itertools import count
+from .sistema_mesas import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+RESERVAS_JSON = os.path.join(DATA_DIR, 'reservas.json')
+FORMATO_FECHA = "%Y-%m-%d %H:%M"
+
+DURACION_POR_DEFECTO = 120  # minutos que dura una reserva
+ANTICIPACION_RESERVA = 30   # minutos antes del inicio en que la mesa pasa a 'reservada'
+TOLERANCIA_RESERVA = 20     # minutos después del inicio en que se libera la mesa si nadie llegó
+
+class AgendaMesa:
+    """Intervalos reservados de una mesa, sin solapamientos y ordenados por inicio."""
+
+    def __init__(self):
+        self.inicios = []
+        self.intervalos = []
+
+    def conflicto(self, inicio, fin):
+        """Devuelve el id de la reserva que se solapa con [inicio, fin), o None."""
+        # Como los intervalos no se solapan entre sí, alcanza con mirar los dos vecinos
+        i = bisect.bisect_left(self.inicios, inicio)
+        if i > 0 and self.intervalos[i - 1][1] > inicio:
+            return self.intervalos[i - 1][2]
+        if i < len(self.intervalos) and self.intervalos[i][0] < fin:
+            return self.intervalos[i][2]
+        return None
+
+    def agregar(self, inicio, fin, reserva_id):
+        """Agrega un intervalo (debe verificarse antes que no haya conflicto)."""
+        i = bisect.bisect_left(self.inicios, inicio)
+        self.inicios.insert(i, inicio)
+        self.intervalos.insert(i, (inicio, fin, reserva_id))
+
+    def quitar(self, inicio, reserva_id):
+        """Quita el intervalo de una reserva."""
+        i = bisect.bisect_left(self.inicios, inicio)
+        while i < len(self.intervalos) and self.intervalos[i][0] == inicio:
+            if self.intervalos[i][2] == reserva_id:
+                del self.inicios[i]
+                del self.intervalos[i]
+                return True
+            i += 1
+        return False
+
+class SistemaReservas:
+    """Reservas de mesas por franja horaria, con cambio automático de estado de las mesas."""
+
+    def __init__(self, sistema_mesas, archivo=RESERVAS_JSON, intervalo=60):
+        """Carga las reservas y arma las agendas y los índices por capacidad."""
+        self.sistema_mesas = sistema_mesas
+        self.archivo = archivo
+        self.intervalo = intervalo
+        self.reservas = {}
+        self.agendas = {}
+        self.mesas_por_capacidad = {}
+        self.capacidades = []
+        self._reserva_en_curso = {}
+
+        # Montículo de eventos: (momento, secuencia, reserva_id, acción)
+        self._eventos = []
+        self._secuencia = count()
+        self._lock = threading.RLock()
+        self._detener = threading.Event()
+        self._hilo = None
+
+        self._indexar_mesas()
+        self._cargar_reservas()
+
+    def _indexar_mesas(self):
+        """Agrupa las mesas por capacidad para no recorrerlas todas en cada búsqueda."""
+        for mesa_id, mesa_data in self.sistema_mesas.mesas.items():
+            capacidad = mesa_data[0].get('capacidad', 0)
+            self.mesas_por_capacidad.setdefault(capacidad, []).append(mesa_id)
+            self.agendas[mesa_id] = AgendaMesa()
+        self.capacidades = sorted(self.mesas_por_capacidad)
+
+    def _cargar_reservas(self):
+        """Carga las reservas guardadas y vuelve a programar las vigentes."""
+        try:
+            if os.path.exists(self.archivo):
+                with open(self.archivo, 'r', encoding='utf-8') as f:
+                    self.reservas = json.load(f)
+        except Exception as e:
+            logger.error("Error al cargar reservas: %s", e)
+            self.reservas = {}
+
+        for reserva in self.reservas.values():
+            if reserva['estado'] in ('confirmada', 'en_curso') and reserva['mesa_id'] in self.agendas:
+                self.agendas[reserva['mesa_id']].agregar(reserva['inicio_ts'], reserva['fin_ts'], reserva['id'])
+                if reserva['estado'] == 'en_curso':
+                    self._reserva_en_curso[reserva['mesa_id']] = reserva['id']
+                    self._programar(reserva['inicio_ts'] + TOLERANCIA_RESERVA * 60, reserva['id'], 'vencer')
+                else:
+                    self._programar(reserva['inicio_ts'] - ANTICIPACION_RESERVA * 60, reserva['id'], 'reservar')
+
+    def guardar_reservas(self):
+        """Guarda las reservas en el archivo JSON (escritura atómica)."""
+        archivo_temp = self.archivo + ".temp"
+        try:
+            with open(archivo_temp, 'w', encoding='utf-8') as f_temp:
+                json.dump(self.reservas, f_temp, indent=2, ensure_ascii=False)
+            os.replace(archivo_temp, self.archivo)
+        except Exception as e:
+            logger.error("Error al guardar reservas: %s", e)
+            return False
+        return True
+
+    def _programar(self, momento, reserva_id, accion):
+        heapq.heappush(self._eventos, (momento, next(self._secuencia), reserva_id, accion))
+
+    def _parsear_fecha(self, fecha):
+        """Convierte 'YYYY-MM-DD HH:MM' a timestamp."""
+        try:
+            return datetime.strptime(fecha, FORMATO_FECHA).timestamp()
+        except (TypeError, ValueError):
+            raise ValueError(f"Fecha inválida: {fecha} (formato esperado: YYYY-MM-DD HH:MM)")
+
+    def _validar_entero_positivo(self, valor, nombre):
+        # bool es un int para Python: True no es una cantidad válida
+        if not isinstance(valor, int) or isinstance(valor, bool) or valor < 1:
+            raise ValueError(f"'{nombre}' debe ser un número entero positivo")
+
+    def crear_reserva(self, mesa_id, nombre, personas, inicio, duracion=DURACION_POR_DEFECTO):
+        """Crea una reserva si la mesa tiene capacidad y la franja está libre."""
+        self._validar_entero_positivo(personas, 'personas')
+        self._validar_entero_positivo(duracion, 'duracion_minutos')
+        mesa_data = self.sistema_mesas.obtener_mesa(mesa_id)
+        if not mesa_data:
+            return False, "Mesa no encontrada"
+        if not nombre:
+            return False, "Se requiere el nombre de la reserva"
+        if personas > mesa_data[0].get('capacidad', 0):
+            return False, f"La mesa {mesa_id} no tiene capacidad para {personas} personas"
+
+        inicio_ts = self._parsear_fecha(inicio)
+        fin_ts = inicio_ts + duracion * 60
+        if fin_ts <= time.time():
+            return False, "No se puede reservar en el pasado"
+
+        with self._lock:
+            conflicto = self.agendas[mesa_id].conflicto(inicio_ts, fin_ts)
+            if conflicto:
+                return False, f"La mesa {mesa_id} ya está reservada en ese horario (reserva {conflicto})"
+
+            reserva_id = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{len(self.reservas) + 1}"
+            reserva = {
+                'id': reserva_id,
+                'mesa_id': mesa_id,
+                'nombre': nombre,
+                'personas': personas,
+                'inicio': datetime.fromtimestamp(inicio_ts).strftime(FORMATO_FECHA),
+                'fin': datetime.fromtimestamp(fin_ts).strftime(FORMATO_FECHA),
+                'inicio_ts': inicio_ts,
+                'fin_ts': fin_ts,
+                'estado': 'confirmada'
+            }
+            self.reservas[reserva_id] = reserva
+            self.agendas[mesa_id].agregar(inicio_ts, fin_ts, reserva_id)
+            self._programar(inicio_ts - ANTICIPACION_RESERVA * 60, reserva_id, 'reservar')
+            self.guardar_reservas()
+        return True, reserva
+
+    def cancelar_reserva(self, reserva_id):
+        """Cancela una reserva y libera la mesa si ya estaba marcada como reservada."""
+        with self._lock:
+            reserva = self.reservas.get(reserva_id)
+            if not reserva or reserva['estado'] not in ('confirmada', 'en_curso'):
+                return False
+            self._finalizar(reserva, 'cancelada')
+            self.guardar_reservas()
+        self.sistema_mesas.guardar_mesas()
+        return True
+
+    def _finalizar(self, reserva, estado):
+        """Saca la reserva de la agenda y, si la mesa la estaba esperando, la libera."""
+        mesa_id = reserva['mesa_id']
+        reserva['estado'] = estado
+        self.agendas[mesa_id].quitar(reserva['inicio_ts'], reserva['id'])
+        if self._reserva_en_curso.get(mesa_id) == reserva['id']:
+            del self._reserva_en_curso[mesa_id]
+            if estado != 'cumplida' and self.sistema_mesas.mesas[mesa_id][0].get('estado') == 'reservada':
+                self.sistema_mesas.cambiar_estado_mesa(mesa_id, 'libre')
+
+    def registrar_llegada(self, reserva_id, nombre=None):
+        """Sienta a quien reservó y da la reserva por cumplida (el check-in lo hace el mozo).
+
+        Un cliente que escanea el QR de una mesa reservada no la ocupa: solo esta llegada cumple la reserva.
+        """
+        with self._lock:
+            reserva = self.reservas.get(reserva_id)
+            if not reserva or reserva['estado'] not in ('confirmada', 'en_curso'):
+                return False, "Reserva no encontrada o ya finalizada"
+            mesa_id = reserva['mesa_id']
+            if self.sistema_mesas.mesas[mesa_id][0].get('estado') == 'ocupada':
+                return False, f"La mesa {mesa_id} todavía está ocupada"
+
+            cliente_key = self.sistema_mesas.registrar_cliente(mesa_id, nombre or reserva['nombre'])
+            if not cliente_key:
+                return False, f"No se pudo registrar la llegada en la mesa {mesa_id}"
+            self._finalizar(reserva, 'cumplida')
+            self.guardar_reservas()
+        return True, {'reserva': reserva, 'mesa_id': mesa_id, 'cliente_key': cliente_key}
+
+    def revisar(self, ahora=None):
+        """Procesa los eventos vencidos: marca mesas como reservadas y libera las no ocupadas."""
+        ahora = ahora or time.time()
+        hubo_cambios = False
+        with self._lock:
+            while self._eventos and self._eventos[0][0] <= ahora:
+                _, _, reserva_id, accion = heapq.heappop(self._eventos)
+                reserva = self.reservas.get(reserva_id)
+                if not reserva:
+                    continue
+                mesa_id = reserva['mesa_id']
+
+                if accion == 'reservar' and reserva['estado'] == 'confirmada':
+                    if self.sistema_mesas.mesas[mesa_id][0].get('estado') == 'libre':
+                        self.sistema_mesas.cambiar_estado_mesa(mesa_id, 'reservada')
+                    reserva['estado'] = 'en_curso'
+                    self._reserva_en_curso[mesa_id] = reserva_id
+                    self._programar(reserva['inicio_ts'] + TOLERANCIA_RESERVA * 60, reserva_id, 'vencer')
+                    hubo_cambios = True
+                elif accion == 'vencer' and reserva['estado'] == 'en_curso':
+                    self._finalizar(reserva, 'vencida')
+                    hubo_cambios = True
+
+            if hubo_cambios:
+                self.guardar_reservas()
+        if hubo_cambios:
+            self.sistema_mesas.guardar_mesas()
+        return hubo_cambios
+
+    def buscar_disponibilidad(self, personas, inicio, duracion=DURACION_POR_DEFECTO):
+        """Busca mesas con capacidad suficiente y sin reservas en la franja, de la más chica a la más grande."""
+        self._validar_entero_positivo(personas, 'personas')
+        self._validar_entero_positivo(duracion, 'duracion_minutos')
+        inicio_ts = self._parsear_fecha(inicio)
+        fin_ts = inicio_ts + duracion * 60
+        # Si la franja empieza pronto, la mesa además tiene que estar libre ahora
+        verificar_estado = inicio_ts - ANTICIPACION_RESERVA * 60 <= time.time()
+
+        disponibles = []
+        with self._lock:
+            for capacidad in self.capacidades[bisect.bisect_left(self.capacidades, personas):]:
+                for mesa_id in self.mesas_por_capacidad[capacidad]:
+                    if self.agendas[mesa_id].conflicto(inicio_ts, fin_ts):
+                        continue
+                    mesa = self.sistema_mesas.mesas[mesa_id][0]
+                    if verificar_estado and mesa.get('estado') != 'libre':
+                        continue
+                    disponibles.append({'mesa_id': mesa_id, 'nombre': mesa.get('nombre'), 'capacidad': capacidad})
+        return disponibles
+
+    def obtener_reservas(self, fecha=None):
+        """Obtiene las reservas (opcionalmente de un día 'YYYY-MM-DD'), ordenadas por inicio."""
+        # Con el lock: los POST agregan reservas y el hilo de fondo cambia su estado mientras tanto
+        with self._lock:
+            reservas = [dict(r) for r in self.reservas.values() if not fecha or r['inicio'].startswith(fecha)]
+        return sorted(reservas, key=lambda r: r['inicio_ts'])
+
+    def _ejecutar(self):
+        """Bucle del hilo de fondo."""
+        while not self._detener.wait(self.intervalo):
+            try:
+                # Modifica las mesas: con el mismo lock que los pedidos HTTP que las modifican
+                with self.sistema_mesas.lock_mesas:
+                    self.revisar()
+            except Exception as e:
+                logger.error("Error al revisar reservas: %s", e)
+
+    def iniciar(self):
+        """Inicia el hilo de fondo que actualiza el estado de las mesas reservadas."""
+        if self._hilo and self._hilo.is_alive():
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._ejecutar, name="reservas", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        """Detiene el hilo de fondo."""
+        self._detener.set()
+        if self._hilo:
+            self._hilo.join()
+            self._hilo = None